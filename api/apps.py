@@ -6,4 +6,6 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        from . import signals
\ No newline at end of file
+        from . import signals
+        from .metrics import instrument_serializers
+        instrument_serializers()
\ No newline at end of file
@@ -0,0 +1,132 @@
+import json
+import math
+import statistics
+import time
+from pathlib import Path
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from .cache import bump_catalog_version
+from .models import ItemVariant
+
+# p95 latency may grow this much over the baseline before a scenario fails
+DEFAULT_TOLERANCE = 0.25
+# ... or this many milliseconds, whichever is more; a few ms of jitter is 25% of a fast scenario
+MIN_SLACK_MS = 5
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+
+class _Rollback(Exception):
+  pass
+
+
+def scale_label(variant_count):
+  """
+  The nearest of SCALES (on a log scale) to the current number of variants.
+  """
+  count = max(variant_count, 1)
+  return min(SCALES, key=lambda label: abs(math.log10(SCALES[label]) - math.log10(count)))
+
+
+def percentile(values, fraction):
+  ordered = sorted(values)
+  index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+  return ordered[index]
+
+
+def default_scenarios():
+  """
+  (name, method, path, body). The bulk stock update restocks the first 50 variants.
+  """
+  variant_ids = list(ItemVariant.objects.order_by('pk').values_list('pk', flat=True)[:50])
+  return [
+    ('items_list', 'get', '/api/items/', None),
+    ('items_list_price_desc', 'get', '/api/items/?ordering=-price&page_size=50', None),
+    ('items_filter_name', 'get', '/api/items/?name=item 1', None),
+    ('items_filter_attributes', 'get', '/api/items/?color__exact=Blue&tip_size__exact=0.5', None),
+    ('items_search', 'get', '/api/items/search/?q=item 12', None),
+    ('items_summary', 'get', '/api/items/summary/?mode=aggregate&path=category_name,brand_name', None),
+    ('transactions_list', 'get', '/api/transactions/?page_size=50', None),
+    ('transactions_compact', 'get', '/api/transactions/?view=compact&page_size=50', None),
+    ('stock_update', 'post', '/api/stock/update/', {
+      'type': 'restock',
+      'line_items': [{'item': pk, 'quantity_change': 1} for pk in variant_ids],
+    }),
+  ]
+
+
+def run_scenario(client, method, path, body, runs, warmup):
+  """
+  Times `runs` requests (after `warmup` untimed ones). Writes are rolled back so
+  the dataset stays the same between runs, and the catalog cache is invalidated
+  before each request so the database path is what gets measured.
+  Returns the latencies and query counts.
+  """
+  latencies, queries = [], []
+  for index in range(warmup + runs):
+    bump_catalog_version()
+    with CaptureQueriesContext(connection) as captured:
+      started = time.perf_counter()
+      if method == 'get':
+        response = client.get(path)
+      else:
+        try:
+          with transaction.atomic():
+            response = client.post(path, body, content_type='application/json')
+            raise _Rollback
+        except _Rollback:
+          pass
+      elapsed = time.perf_counter() - started
+    if response.status_code >= 400:
+      raise RuntimeError(f"{method.upper()} {path} returned {response.status_code}")
+    if index >= warmup:
+      latencies.append(elapsed * 1000)
+      queries.append(len(captured))
+  return latencies, queries
+
+
+def run_benchmarks(runs=20, warmup=2, scenarios=None, only=None):
+  client = Client(HTTP_HOST='localhost')
+  results = {}
+  for name, method, path, body in scenarios or default_scenarios():
+    if only and name not in only:
+      continue
+    latencies, queries = run_scenario(client, method, path, body, runs, warmup)
+    results[name] = {
+      'p50_ms': round(statistics.median(latencies), 2),
+      'p95_ms': round(percentile(latencies, 0.95), 2),
+      'p99_ms': round(percentile(latencies, 0.99), 2),
+      'queries': max(queries),
+    }
+  return results
+
+
+def load_baselines(path):
+  path = Path(path)
+  return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_baselines(path, scale, results):
+  baselines = load_baselines(path)
+  baselines[scale] = results
+  path = Path(path)
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+  """
+  Messages for every scenario whose p95 latency or query count got worse than its baseline.
+  """
+  problems = []
+  for name, result in results.items():
+    expected = baseline.get(name)
+    if not expected:
+      continue
+    if result['queries'] > expected['queries']:
+      problems.append(f"{name}: {result['queries']} queries (baseline {expected['queries']})")
+    limit = max(expected['p95_ms'] * (1 + tolerance), expected['p95_ms'] + MIN_SLACK_MS)
+    if result['p95_ms'] > limit:
+      problems.append(f"{name}: p95 {result['p95_ms']}ms (baseline {expected['p95_ms']}ms, limit {limit:.2f}ms)")
+  return problems
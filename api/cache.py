@@ -0,0 +1,104 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+from .routers import read_alias, replica_lag
+
+# Which entry of settings.CACHES holds the catalog responses. The default is
+# local memory, which is per process: point this at a shared cache (e.g. Redis)
+# when running several workers, or a bump in one worker won't reach the others.
+CATALOG_CACHE_ALIAS = getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')
+# Seconds a cached response is kept; the version bump is what invalidates it
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+VERSION_KEY = 'catalog:version'
+
+
+def _cache():
+  return caches[CATALOG_CACHE_ALIAS]
+
+
+def _fresh_version():
+  # Seeded from the clock so a cache restart never hands out an old version (and old ETags) again
+  return int(time.time() * 1000)
+
+
+def get_catalog_version():
+  cache = _cache()
+  version = cache.get(VERSION_KEY)
+  if version is None:
+    cache.add(VERSION_KEY, _fresh_version(), timeout=None)
+    version = cache.get(VERSION_KEY)
+  return version
+
+
+def bump_catalog_version():
+  cache = _cache()
+  try:
+    return cache.incr(VERSION_KEY)
+  except ValueError:
+    # Key was missing or evicted
+    version = _fresh_version()
+    cache.set(VERSION_KEY, version, timeout=None)
+    return version
+
+
+def catalog_changed():
+  """
+  Call whenever items, variants, brands, categories or stock change.
+  The bump waits for the surrounding transaction to commit, so readers never
+  cache a version of the catalog that gets rolled back.
+  """
+  transaction.on_commit(bump_catalog_version)
+
+
+def catalog_etag(version):
+  return f'"c{version}"'
+
+
+class CatalogCacheMixin:
+  """
+  Caches list/retrieve response data under the current catalog version and
+  tags it with an ETag. A conditional GET carrying the current ETag gets a
+  304 without touching the database.
+  """
+  cached_actions = ('list', 'retrieve')
+
+  def list(self, request, *args, **kwargs):
+    return self.cached_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+  def retrieve(self, request, *args, **kwargs):
+    return self.cached_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
+
+  def cached_response(self, request, render):
+    version = get_catalog_version()
+    etag = catalog_etag(version)
+
+    # 1. The client already has this version
+    if etag in request.headers.get('If-None-Match', ''):
+      return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    # 2. Another request already rendered this URL for this version
+    key = self.cache_key(request, version)
+    data = _cache().get(key)
+    if data is not None:
+      return Response(data, headers={'ETag': etag, 'X-Cache': 'HIT'})
+
+    # 3. Render it and keep it for the next poll, under the version read before
+    # rendering. A replica that's still replaying WAL may not have the writes
+    # behind that version, so its responses are only stored and tagged once it
+    # has caught up (replica_lag 0, within REPLICA_MAX_LAG_BYTES of the primary).
+    response = render()
+    alias = read_alias.get()
+    if response.status_code == status.HTTP_200_OK and (alias is None or replica_lag(alias) == 0.0):
+      _cache().set(key, response.data, timeout=CATALOG_CACHE_TIMEOUT)
+      response['ETag'] = etag
+      response['X-Cache'] = 'MISS'
+    return response
+
+  def cache_key(self, request, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"catalog:{version}:{self.basename}:{path}"
@@ -0,0 +1,172 @@
+import itertools
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.db import connection, transaction
+from django.utils import timezone
+from .cache import catalog_changed
+from .listings import refresh_listings
+from .models import Brand, Category, Item, ItemVariant, Transaction, TransactionItem
+from .partitions import ensure_partitions
+from .search import refresh_search_vectors
+
+# Values used for the attribute keys of the default categories. Any other
+# schema key gets generated values ("<key>-1", "<key>-2", ...).
+ATTRIBUTE_VALUES = {
+  'color': ['Black', 'Blue', 'Red', 'Green', 'Pink', 'Purple', 'Orange', 'Brown', 'Turquoise', 'Gray'],
+  'tip_size': ['0.28', '0.38', '0.4', '0.5', '0.7', '1.0'],
+}
+GENERATED_VALUES = 8
+
+INSERT_BATCH_SIZE = 5000
+
+
+class DatasetGenerator:
+  """
+  Bulk-inserts a synthetic catalog and transaction history for load testing.
+
+  Attributes follow each Category.attribute_schema, so generated variants pass
+  the same validation as real ones. Everything is written with bulk_create in
+  batches; transaction timestamps are spread over `days` with one UPDATE per batch
+  (lines get the same timestamps, their partition key).
+  Stock quantities aren't replayed from the generated history.
+  """
+
+  def __init__(self, prefix='Gen', seed=None, batch_size=INSERT_BATCH_SIZE, log=None):
+    self.prefix = prefix
+    self.random = random.Random(seed)
+    self.batch_size = batch_size
+    self.log = log or (lambda message: None)
+
+  def _batches(self, objects):
+    iterator = iter(objects)
+    while batch := list(itertools.islice(iterator, self.batch_size)):
+      yield batch
+
+  def brands(self, count):
+    names = [f"{self.prefix} Brand {i}" for i in range(1, count + 1)]
+    for batch in self._batches(names):
+      Brand.objects.bulk_create([Brand(name=name) for name in batch], ignore_conflicts=True)
+    return list(Brand.objects.filter(name__in=names).values_list('id', flat=True))
+
+  def items(self, count, brand_ids, categories):
+    created = []
+    rows = (
+      Item(
+        name=f"{self.prefix} Item {i}",
+        brand_id=self.random.choice(brand_ids),
+        category_id=self.random.choice(categories).id,
+      )
+      for i in range(1, count + 1)
+    )
+    for batch in self._batches(rows):
+      created += Item.objects.bulk_create(batch)
+    self.log(f"{len(created)} items")
+    return created
+
+  def _combinations(self, keys):
+    pools = [ATTRIBUTE_VALUES.get(key) or [f"{key}-{n}" for n in range(1, GENERATED_VALUES + 1)] for key in keys]
+    return [dict(zip(keys, values)) for values in itertools.product(*pools)]
+
+  def variants(self, count, items, categories):
+    """
+    Spreads `count` variants over the items. SKUs stay unique because each
+    item takes distinct attribute combinations from its category's schema.
+    """
+    combinations = {category.id: self._combinations(sorted(category.attribute_schema or [])) for category in categories}
+    per_item, extra = divmod(count, len(items))
+    wanted = [per_item + (1 if index < extra else 0) for index in range(len(items))]
+
+    # An item can't have more variants than its category has attribute combinations
+    short = sum(max(0, want - len(combinations[item.category_id])) for item, want in zip(items, wanted))
+    if short:
+      raise ValueError(
+        f"{count} variants don't fit on {len(items)} items: {short} would need attribute "
+        f"combinations their category doesn't have. Generate more items."
+      )
+
+    def rows():
+      for item, want in zip(items, wanted):
+        for attributes in self.random.sample(combinations[item.category_id], want):
+          attributes = ItemVariant.normalize_attributes(attributes)
+          yield ItemVariant(
+            item_id=item.pk,
+            attributes=attributes,
+            sku=ItemVariant.build_sku(item.pk, attributes),
+            price=Decimal(self.random.randrange(50, 5000)) / 100,
+            quantity=self.random.randrange(0, 500),
+            target_quantity=self.random.randrange(0, 300),
+          )
+
+    ids = []
+    for batch in self._batches(rows()):
+      with transaction.atomic():
+        created = ItemVariant.objects.bulk_create(batch)
+        batch_ids = [variant.pk for variant in created]
+        refresh_search_vectors(variant_ids=batch_ids)
+        refresh_listings(variant_ids=batch_ids)
+      ids += batch_ids
+      self.log(f"{len(ids)} variants")
+    return ids
+
+  def transactions(self, count, variant_ids, lines_per_transaction=5, days=365):
+    """
+    `count` transactions with up to `lines_per_transaction` distinct variants each,
+    timestamped randomly over the last `days` days.
+    """
+    types = [choice for choice, _ in Transaction.TYPE_CHOICES]
+    now = timezone.now()
+    written = 0
+
+    for start in range(0, count, self.batch_size):
+      size = min(self.batch_size, count - start)
+      with transaction.atomic():
+        batch = Transaction.objects.bulk_create([
+          Transaction(type=self.random.choices(types, weights=[2, 7, 1])[0]) for _ in range(size)
+        ])
+        moments = self._spread(batch, now, days)
+
+        lines = []
+        for row, moment in zip(batch, moments):
+          sign = 1 if row.type == 'restock' else -1
+          for variant_id in self.random.sample(variant_ids, min(lines_per_transaction, len(variant_ids))):
+            lines.append(TransactionItem(
+              transaction_id=row.pk,
+              item_id=variant_id,
+              quantity_change=sign * self.random.randrange(1, 20),
+              unit_price_at_sale=Decimal(self.random.randrange(50, 5000)) / 100,
+              datetime_created=moment,
+            ))
+        TransactionItem.objects.bulk_create(lines, batch_size=self.batch_size)
+      written += size
+      self.log(f"{written} transactions")
+
+    # Backdated rows land in the default partition; give their months partitions
+    ensure_partitions()
+    return written
+
+  def _spread(self, batch, now, days):
+    span = int(timedelta(days=days).total_seconds())
+    moments = [now - timedelta(seconds=self.random.randrange(span)) for _ in batch]
+    with connection.cursor() as cursor:
+      cursor.execute(
+        f"""
+        UPDATE {Transaction._meta.db_table} AS t SET datetime_created = d.moment
+        FROM unnest(%s::integer[], %s::timestamptz[]) AS d(id, moment)
+        WHERE t.id = d.id
+        """,
+        [[row.pk for row in batch], moments],
+      )
+    return moments
+
+  def generate(self, brands, items, variants, transactions, lines_per_transaction=5, days=365):
+    categories = list(Category.objects.all())
+    if not categories:
+      raise ValueError("No categories; run the migrations first (they create the defaults).")
+
+    brand_ids = self.brands(brands)
+    created_items = self.items(items, brand_ids, categories)
+    variant_ids = self.variants(variants, created_items, categories)
+    written = self.transactions(transactions, variant_ids, lines_per_transaction, days) if variant_ids else 0
+    catalog_changed()
+    return {'brands': len(brand_ids), 'items': len(created_items), 'variants': len(variant_ids), 'transactions': written}
@@ -0,0 +1,24 @@
+from datetime import datetime, time
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_moment(value, name, end_of_day=False):
+  """
+  Parses a date or datetime query parameter called `name`. A bare date means
+  the start of that day, or its end with end_of_day (for inclusive upper bounds).
+  Naive values are in the current timezone.
+  """
+  try:
+    # Dates first: parse_datetime reads a bare date as midnight
+    day = parse_date(value)
+    moment = datetime.combine(day, time.max if end_of_day else time.min) if day else parse_datetime(value)
+  except ValueError:
+    moment = None
+
+  if moment is None:
+    raise ValidationError({name: 'Expected an ISO date or datetime, e.g. 2026-03-01.'})
+  if timezone.is_naive(moment):
+    moment = timezone.make_aware(moment)
+  return moment
@@ -0,0 +1,134 @@
+import csv
+import json
+from django.db.models import F
+from rest_framework.exceptions import ValidationError
+from .models import ItemVariant, Transaction, TransactionItem
+from .dates import parse_moment
+from .snapshots import annotate_quantity_as_of
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+# Rows rendered per chunk written to the response
+WRITE_BATCH_SIZE = 500
+
+TRANSACTION_COLUMNS = {
+  'transaction_id': F('transaction_id'),
+  'type': F('transaction__type'),
+  'datetime_created': F('datetime_created'),
+  'variant_id': F('item_id'),
+  'sku': F('item__sku'),
+  'item_name': F('item__item__name'),
+  'brand_name': F('item__item__brand__name'),
+  'category_name': F('item__item__category__name'),
+  'quantity_change': F('quantity_change'),
+  'unit_price_at_sale': F('unit_price_at_sale'),
+}
+
+INVENTORY_COLUMNS = {
+  'id': F('id'),
+  'sku': F('sku'),
+  'item_name': F('item__name'),
+  'brand_name': F('item__brand__name'),
+  'category_name': F('item__category__name'),
+  'attributes': F('attributes'),
+  'price': F('price'),
+  'quantity': F('quantity'),
+  'target_quantity': F('target_quantity'),
+}
+
+
+def transaction_rows(params):
+  """
+  One row per TransactionItem, oldest first.
+  Filters: ?start=, ?end= (dates or datetimes, inclusive), ?type=sale,restock
+  """
+  lines = TransactionItem.objects.all()
+  # Lines carry their transaction's timestamp; bounding both tables prunes both to the range's partitions
+  if params.get('start'):
+    start = parse_moment(params['start'], 'start')
+    lines = lines.filter(datetime_created__gte=start, transaction__datetime_created__gte=start)
+  if params.get('end'):
+    end = parse_moment(params['end'], 'end', end_of_day=True)
+    lines = lines.filter(datetime_created__lte=end, transaction__datetime_created__lte=end)
+  if params.get('type'):
+    types = [value for value in params['type'].split(',') if value]
+    unknown = set(types) - set(dict(Transaction.TYPE_CHOICES))
+    if unknown:
+      raise ValidationError({'type': f"Unknown type(s): {', '.join(sorted(unknown))}."})
+    lines = lines.filter(transaction__type__in=types)
+
+  lines = lines.order_by('datetime_created', 'transaction_id', 'id')
+  return list(TRANSACTION_COLUMNS), lines.values_list(*TRANSACTION_COLUMNS.values())
+
+
+def inventory_rows(params):
+  """
+  One row per ItemVariant, by SKU. ?as_of= exports the quantities at that moment.
+  """
+  variants = ItemVariant.objects.order_by('sku')
+  columns = dict(INVENTORY_COLUMNS)
+  if params.get('as_of'):
+    variants = annotate_quantity_as_of(variants, parse_moment(params['as_of'], 'as_of', end_of_day=True))
+    columns['quantity'] = F('quantity_as_of')
+  return list(columns), variants.values_list(*columns.values())
+
+
+DATASETS = {
+  'transactions': transaction_rows,
+  'inventory': inventory_rows,
+}
+
+
+class _Echo:
+  """
+  A file-like object for csv.writer that hands each line back instead of buffering it.
+  """
+  def write(self, value):
+    return value
+
+
+def _batched(lines):
+  batch = []
+  for line in lines:
+    batch.append(line)
+    if len(batch) >= WRITE_BATCH_SIZE:
+      yield ''.join(batch)
+      batch = []
+  if batch:
+    yield ''.join(batch)
+
+
+def render_csv(columns, rows):
+  writer = csv.writer(_Echo())
+  yield writer.writerow(columns)
+
+  def lines():
+    for row in rows:
+      yield writer.writerow([json.dumps(value) if isinstance(value, dict) else value for value in row])
+  yield from _batched(lines())
+
+
+def render_ndjson(columns, rows):
+  def lines():
+    for row in rows:
+      yield json.dumps(dict(zip(columns, row)), default=str) + '\n'
+  yield from _batched(lines())
+
+
+RENDERERS = {
+  'csv': ('text/csv', render_csv),
+  'ndjson': ('application/x-ndjson', render_ndjson),
+}
+
+
+def export_stream(dataset, file_format, params):
+  """
+  (content type, iterator of text chunks). Rows come from a server-side cursor
+  in EXPORT_CHUNK_SIZE batches, so memory stays flat however long the export is.
+  Bad parameters raise ValidationError before anything is streamed.
+  """
+  columns, queryset = DATASETS[dataset](params)
+  # Rows are read after the view returns, so pin the database chosen for this request now
+  queryset = queryset.using(queryset.db)
+  content_type, render = RENDERERS[file_format]
+  return content_type, render(columns, queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE))
@@ -1,20 +1,26 @@
+import json
 import django_filters
-from .models import Item, ItemVariant, Transaction
+from django.db.models import Exists, OuterRef
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from .dates import parse_moment
+from .models import Item, ItemVariant, Transaction, TransactionItem, VariantListing
 from .constants import CATEGORY_CHOICES, STOCK_CHOICES, TYPE_CHOICES
+from .validation import schema_registry
 
 class ItemVariantFilter(django_filters.FilterSet):
   """
   Filters for ItemVariant (the actual stockable units).
   """
   
-  # 1. Filter by Item Name (looking up the parent Item model)
+  # 1. Filter by Item Name (looking up the parent Item model, trigram indexed)
   name = django_filters.CharFilter(
     field_name='item__name', 
     lookup_expr='icontains', 
     label='Product Name'
   )
 
-  # 2. Filter by Brand Name (jumping from Variant -> Item -> Brand)
+  # 2. Filter by Brand Name (jumping from Variant -> Item -> Brand, trigram indexed)
   brand_name = django_filters.CharFilter(
     field_name='item__brand__name',
     lookup_expr='icontains',
@@ -35,28 +41,56 @@ class ItemVariantFilter(django_filters.FilterSet):
     label='Stock Status'
   )
 
-  # --- DYNAMIC ATTRIBUTE FILTERS ---
-  # Since attributes are in a JSONField, we can filter them like this:
-  color = django_filters.CharFilter(
-    field_name='attributes__color',
-    lookup_expr='icontains',
-    label='Color'
-  )
-  
-  tip_size = django_filters.CharFilter(
-    field_name='attributes__tip_size',
-    lookup_expr='icontains',
-    label='Tip Size'
+  # 5. Filter by JSON containment, e.g. ?attributes={"color": "Blue", "tip_size": "0.5"}
+  attributes = django_filters.CharFilter(
+    method='filter_by_attributes',
+    label='Attributes (JSON)'
   )
 
+  category_field = 'item__category__name'
+
   class Meta:
     model = ItemVariant
     fields = ['name', 'sku']
 
+  # --- DYNAMIC ATTRIBUTE FILTERS ---
+  # For every key in any Category.attribute_schema: a case-insensitive substring
+  # filter (?color=blu, also ?color__icontains=blu) and an exact one
+  # (?color__exact=Blue), which uses the GIN index.
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    for key in schema_registry.attribute_keys():
+      label = key.replace('_', ' ').title()
+      self.add_attribute_filter(key, key, 'filter_by_attribute_icontains', f"{label} contains")
+      self.add_attribute_filter(f"{key}__icontains", key, 'filter_by_attribute_icontains', f"{label} contains")
+      self.add_attribute_filter(f"{key}__exact", key, 'filter_by_attribute', label)
+
+  def add_attribute_filter(self, param, key, method, label):
+    if param in self.filters:
+      return
+    attribute_filter = django_filters.CharFilter(field_name=key, method=method, label=label)
+    attribute_filter.parent = self
+    self.filters[param] = attribute_filter
+
+  def filter_by_attribute(self, queryset, name, value):
+    return queryset.filter(attributes__contains={name: value})
+
+  def filter_by_attribute_icontains(self, queryset, name, value):
+    return queryset.filter(**{f"attributes__{name}__icontains": value})
+
+  def filter_by_attributes(self, queryset, name, value):
+    try:
+      attributes = json.loads(value)
+    except ValueError:
+      attributes = None
+    if not isinstance(attributes, dict):
+      raise ValidationError({'attributes': "Must be a JSON object, e.g. {\"color\": \"Blue\"}."})
+    return queryset.filter(attributes__contains=attributes)
+
   def filter_by_category_name(self, queryset, name, value):
     if value:
       # Filters the parent Item's category name
-      return queryset.filter(item__category__name__iexact=value)
+      return queryset.filter(**{f"{self.category_field}__iexact": value})
     return queryset
 
   def filter_by_stock_status(self, queryset, name, value):
@@ -67,14 +101,94 @@ class ItemVariantFilter(django_filters.FilterSet):
     return queryset
 
 
+class VariantListingFilter(ItemVariantFilter):
+  """
+  The same filters over the flattened VariantListing table, so no joins are needed.
+  """
+  name = django_filters.CharFilter(field_name='item_name', lookup_expr='icontains', label='Product Name')
+  brand_name = django_filters.CharFilter(field_name='brand_name', lookup_expr='icontains', label='Brand Name')
+
+  category_field = 'category_name'
+
+  class Meta:
+    model = VariantListing
+    fields = ['name', 'sku']
+
+
+class AliasOrderingFilter(filters.OrderingFilter):
+  """
+  OrderingFilter whose public field names can point at other columns, per model:
+  the view's `ordering_aliases` is {model: {public name: column}}.
+  """
+
+  def get_ordering(self, request, queryset, view):
+    ordering = super().get_ordering(request, queryset, view)
+    aliases = getattr(view, 'ordering_aliases', {}).get(queryset.model)
+    if not ordering or not aliases:
+      return ordering
+    return [
+      ('-' if field.startswith('-') else '') + aliases.get(field.lstrip('-'), field.lstrip('-'))
+      for field in ordering
+    ]
+
+
 class TransactionFilter(django_filters.FilterSet):
   """
   Simplified Transaction filter using the standard field filtering.
+
+  ?created_after= / ?created_before= take dates or datetimes (inclusive) and
+  only touch the partitions in range. ?variant=, ?sku=, ?brand= and ?category=
+  keep the transactions with a line matching all of them, as one EXISTS
+  semi-join, so a transaction is never repeated and no DISTINCT is needed.
   """
   # Since your Transaction model 'type' uses choices, 
   # we don't actually need a custom 'method' unless logic is complex.
   type = django_filters.ChoiceFilter(choices=TYPE_CHOICES)
 
+  # Applied together in filter_queryset(), so the date range bounds the lines too
+  created_after = django_filters.CharFilter(method='filter_together', label='Created on or after')
+  created_before = django_filters.CharFilter(method='filter_together', label='Created on or before')
+  variant = django_filters.NumberFilter(method='filter_together', label='Variant ID')
+  sku = django_filters.CharFilter(method='filter_together', label='SKU')
+  brand = django_filters.CharFilter(method='filter_together', label='Brand Name')
+  category = django_filters.CharFilter(method='filter_together', label='Category Name')
+
+  # Line filter -> TransactionItem lookup
+  LINE_LOOKUPS = {
+    'variant': 'item_id',
+    'sku': 'item__sku',
+    'brand': 'item__item__brand__name__iexact',
+    'category': 'item__item__category__name__iexact',
+  }
+
   class Meta:
     model = Transaction
-    fields = ['type']
\ No newline at end of file
+    fields = ['type']
+
+  def filter_together(self, queryset, name, value):
+    return queryset
+
+  def filter_queryset(self, queryset):
+    queryset = super().filter_queryset(queryset)
+    data = self.form.cleaned_data
+
+    # 1. The date range; lines carry the same timestamp (the partition key)
+    created = {}
+    if data.get('created_after'):
+      created['datetime_created__gte'] = parse_moment(data['created_after'], 'created_after')
+    if data.get('created_before'):
+      created['datetime_created__lte'] = parse_moment(data['created_before'], 'created_before', end_of_day=True)
+    queryset = queryset.filter(**created)
+
+    # 2. One semi-join for every line filter
+    lookups = {
+      lookup: data[name]
+      for name, lookup in self.LINE_LOOKUPS.items()
+      if data.get(name) not in (None, '')
+    }
+    if not lookups:
+      return queryset
+    lines = TransactionItem.objects.filter(
+      transaction=OuterRef('pk'), datetime_created=OuterRef('datetime_created'), **created, **lookups
+    )
+    return queryset.filter(Exists(lines))
@@ -0,0 +1,81 @@
+from django.db.models import ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.expressions import RowRange
+from rest_framework.utils.urls import replace_query_param
+from .models import ItemVariant, Transaction, TransactionItem
+from .pagination import KeysetPagination, decode_cursor, encode_cursor, invalid_cursor
+from .shards import live_quantity
+
+# Newest first, served by line_item_history_idx (item, datetime_created, id)
+HISTORY_ORDERING = ['-datetime_created', '-id']
+
+
+def movements(variant_id, anchor=None):
+  """
+  The variant's TransactionItems, newest first, with their transaction `type`
+  and `balance`, the variant's quantity right after each movement.
+
+  Balances are worked backwards from `anchor`, the balance after the newest
+  row that's fetched (the live quantity when None, read in the same statement).
+  The running sum is a window over the fetched rows only, so with a LIMIT a
+  page costs the same however long the history is.
+  """
+  if anchor is None:
+    # The shards' sum for sharded variants, which the stored quantity may trail by a moment
+    anchor = Subquery(ItemVariant.objects.filter(pk=variant_id).annotate(live=live_quantity()).values('live')[:1])
+  else:
+    anchor = Value(anchor)
+
+  # Changes of the newer rows: the running sum up to this row, minus the row itself
+  running = Window(
+    Sum('quantity_change'),
+    order_by=[F('datetime_created').desc(), F('id').desc()],
+    frame=RowRange(start=None, end=0),
+  )
+  # Matching the partition key too sends each lookup to a single partition
+  transaction_type = Transaction.objects.filter(
+    pk=OuterRef('transaction_id'), datetime_created=OuterRef('datetime_created')
+  ).values('type')[:1]
+
+  return (
+    TransactionItem.objects.filter(item_id=variant_id)
+    .annotate(
+      type=Subquery(transaction_type),
+      balance=ExpressionWrapper(anchor - running + F('quantity_change'), output_field=IntegerField()),
+    )
+    .order_by(*HISTORY_ORDERING)
+  )
+
+
+class HistoryPagination(KeysetPagination):
+  """
+  Forward-only keyset pages of movements(). Next links also carry the balance
+  the next page starts from, so no page ever sums the movements before it.
+  """
+  page_size = 50
+  max_page_size = 500
+
+  def paginate_history(self, variant_id, request, view=None):
+    encoded = request.query_params.get(self.cursor_query_param)
+    cursor = decode_cursor(encoded) if encoded else {}
+    anchor = cursor.get('b') if isinstance(cursor, dict) else None
+    return self.paginate_queryset(movements(variant_id, anchor), request, view)
+
+  def get_cursor(self, request):
+    cursor = super().get_cursor(request)
+    if cursor is not None and (cursor.get('r') or not isinstance(cursor.get('b'), int)):
+      raise invalid_cursor()
+    return cursor
+
+  def get_next_link(self):
+    if not self.has_next or not self.page:
+      return None
+    row = self.page[-1]
+    cursor = encode_cursor({
+      'o': self.ordering,
+      'v': [self._value(row, field.lstrip('-')) for field in self.ordering],
+      'b': row.balance - row.quantity_change,
+    })
+    return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+  def get_previous_link(self):
+    return None
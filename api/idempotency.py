@@ -0,0 +1,97 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# How long stored responses are kept before purge_idempotency_keys removes them
+IDEMPOTENCY_KEY_TTL = timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+class _Discard(Exception):
+  """
+  Rolls back the key together with a failed request, so a retry runs again.
+  """
+
+  def __init__(self, response):
+    self.response = response
+
+
+def request_fingerprint(request):
+  payload = json.dumps(request.data, sort_keys=True, default=str)
+  return hashlib.sha256(f"{request.method} {request.path}\n{payload}".encode()).hexdigest()
+
+
+def _replay(key, fingerprint):
+  record = IdempotencyKey.objects.filter(key=key).first()
+  if record is None:
+    return None
+  if record.request_hash != fingerprint:
+    return Response(
+      {"status": "error", "detail": f"{IDEMPOTENCY_HEADER} was already used for a different request."},
+      status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+  return Response(record.response_body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(request, handler):
+  """
+  Runs `handler()` at most once per `Idempotency-Key`.
+
+  The key row is inserted in the same database transaction as the handler's
+  writes, so a concurrent retry blocks on the unique index until the first
+  request finishes and then replays its stored response. Error responses are
+  not stored: the key is rolled back with them and the request can be retried.
+  """
+  key = request.headers.get(IDEMPOTENCY_HEADER)
+  if not key:
+    return handler()
+
+  fingerprint = request_fingerprint(request)
+  replay = _replay(key, fingerprint)
+  if replay is not None:
+    return replay
+
+  try:
+    with transaction.atomic():
+      record = IdempotencyKey.objects.create(key=key, request_hash=fingerprint)
+      response = handler()
+      if response.status_code >= 400:
+        raise _Discard(response)
+
+      record.response_status = response.status_code
+      record.response_body = response.data
+      record.save(update_fields=['response_status', 'response_body'])
+      return response
+  except _Discard as discarded:
+    return discarded.response
+  except IntegrityError:
+    # Someone else committed this key while we were waiting on it
+    return _replay(key, fingerprint) or Response(
+      {"status": "error", "detail": "A request with this key is still in progress."},
+      status=status.HTTP_409_CONFLICT
+    )
+
+
+def purge_expired_keys(ttl=IDEMPOTENCY_KEY_TTL, batch_size=1000):
+  """
+  Deletes keys older than `ttl` in batches of `batch_size`, so no single
+  DELETE holds locks for long. Returns the number of keys removed.
+  """
+  cutoff = timezone.now() - ttl
+  removed = 0
+  while True:
+    batch = list(
+      IdempotencyKey.objects.filter(datetime_created__lt=cutoff)
+      .order_by('datetime_created')
+      .values_list('pk', flat=True)[:batch_size]
+    )
+    if not batch:
+      return removed
+    removed += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
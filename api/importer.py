@@ -0,0 +1,256 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import IntegrityError, transaction
+from .cache import catalog_changed
+from .listings import refresh_listings
+from .models import Brand, Category, Item, ItemVariant
+from .search import refresh_search_vectors
+from .validation import validate_variant_batch
+
+# Columns with a fixed meaning; in CSV files every other column is an attribute
+CORE_COLUMNS = ('brand', 'category', 'name', 'description', 'price', 'quantity', 'target_quantity', 'attributes')
+
+# Keep the report bounded for very dirty files
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+  pass
+
+
+def read_csv(stream):
+  """
+  Yields (line number, row) from a CSV text stream. Attributes come either from an
+  `attributes` JSON column or from any non-empty column outside CORE_COLUMNS.
+  """
+  reader = csv.DictReader(stream)
+  for row in reader:
+    attributes = row.get('attributes')
+    if attributes:
+      try:
+        attributes = json.loads(attributes)
+      except ValueError:
+        yield reader.line_num, RowError("`attributes` is not valid JSON.")
+        continue
+    else:
+      attributes = {
+        key: value for key, value in row.items()
+        if key and key not in CORE_COLUMNS and value not in (None, '')
+      }
+    yield reader.line_num, {**row, 'attributes': attributes}
+
+
+def read_jsonl(stream):
+  """
+  Yields (line number, row) from a JSON Lines text stream, skipping blank lines.
+  """
+  for line_num, line in enumerate(stream, start=1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError:
+      yield line_num, RowError("Line is not valid JSON.")
+      continue
+    yield line_num, row if isinstance(row, dict) else RowError("Line must be a JSON object.")
+
+
+READERS = {
+  'csv': read_csv,
+  'jsonl': read_jsonl,
+}
+
+
+def _text(row, key, max_length=None, required=True):
+  value = row.get(key)
+  value = str(value).strip() if value is not None else ''
+  if required and not value:
+    raise RowError(f"`{key}` is required.")
+  if max_length and len(value) > max_length:
+    raise RowError(f"`{key}` is longer than {max_length} characters.")
+  return value
+
+
+def _number(row, key, cast, default=None):
+  value = row.get(key)
+  if value in (None, ''):
+    if default is None:
+      raise RowError(f"`{key}` is required.")
+    return default
+  try:
+    number = cast(str(value).strip())
+  except (ValueError, InvalidOperation):
+    raise RowError(f"`{key}` is not a valid number.")
+  if number < 0:
+    raise RowError(f"`{key}` cannot be negative.")
+  return number
+
+
+class CatalogImporter:
+  """
+  Imports brands, items and variants from a stream of rows, one chunk at a time.
+
+  Brands, categories and items are resolved with one set lookup per chunk (and
+  cached across chunks), SKUs are generated in memory and checked for collisions
+  before the insert, and variants are written with bulk_create. Bad rows are
+  reported with their line number; they never abort the rest of the file.
+  Categories must already exist, since they carry the attribute schema.
+  """
+
+  def __init__(self, chunk_size=1000):
+    self.chunk_size = chunk_size
+    self.brands = {}
+    self.items = {}
+    self.categories = {c.name.lower(): c.id for c in Category.objects.all()}
+    self.seen_skus = set()
+    self.report = {'rows': 0, 'created': 0, 'error_count': 0, 'errors': []}
+    self.created_ids = []
+
+  def run(self, rows):
+    rows = iter(rows)
+    while True:
+      chunk = list(islice(rows, self.chunk_size))
+      if not chunk:
+        self.report['errors'].sort(key=lambda error: error['row'])
+        return self.report
+      self.import_chunk(chunk)
+
+  def error(self, line, errors):
+    self.report['error_count'] += 1
+    if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+      self.report['errors'].append({'row': line, 'errors': errors if isinstance(errors, list) else [str(errors)]})
+
+  def parse(self, row):
+    if isinstance(row, RowError):
+      raise row
+    category = _text(row, 'category').lower()
+    if category not in self.categories:
+      raise RowError(f"Unknown category '{row.get('category')}'.")
+    attributes = row.get('attributes') or {}
+    if not isinstance(attributes, dict):
+      raise RowError("`attributes` must be an object.")
+    return {
+      'brand': _text(row, 'brand', Brand._meta.get_field('name').max_length, required=False) or None,
+      'category_id': self.categories[category],
+      'name': _text(row, 'name', Item._meta.get_field('name').max_length),
+      'description': _text(row, 'description', Item._meta.get_field('description').max_length, required=False) or None,
+      'price': _number(row, 'price', Decimal),
+      'quantity': _number(row, 'quantity', int, default=0),
+      'target_quantity': _number(row, 'target_quantity', int, default=0),
+      'attributes': ItemVariant.normalize_attributes(attributes),
+    }
+
+  def import_chunk(self, chunk):
+    self.report['rows'] += len(chunk)
+
+    # 1. Parse and check the rows on their own
+    parsed = []
+    for line, row in chunk:
+      try:
+        parsed.append((line, self.parse(row)))
+      except RowError as e:
+        self.error(line, e)
+
+    failures = validate_variant_batch([(data['category_id'], data['attributes']) for _, data in parsed])
+    for index in sorted(failures, reverse=True):
+      self.error(parsed[index][0], failures[index])
+      del parsed[index]
+    if not parsed:
+      return
+
+    brands, items = dict(self.brands), dict(self.items)
+    variants = []
+    try:
+      with transaction.atomic():
+        # 2. Resolve the parents with set lookups
+        self._resolve_brands({data['brand'] for _, data in parsed if data['brand']})
+        self._resolve_items(parsed)
+
+        # 3. Generate the SKUs and drop the rows that collide
+        variants = self._build_variants(parsed)
+
+        # 4. Write the chunk
+        created = ItemVariant.objects.bulk_create([variant for _, variant in variants])
+        refresh_search_vectors(variant_ids=[variant.pk for variant in created])
+        refresh_listings(variant_ids=[variant.pk for variant in created])
+        self.created_ids.extend(variant.pk for variant in created)
+        self.report['created'] += len(created)
+        catalog_changed()
+    except IntegrityError as e:
+      # Something raced us on a unique constraint; report the chunk instead of failing the file.
+      # Parents created in the rolled back transaction must not be reused either,
+      # and its SKUs are free again for later rows.
+      self.brands, self.items = brands, items
+      self.seen_skus -= {variant.sku for _, variant in variants}
+      # Rows _build_variants already rejected have their error
+      for line, _ in variants or parsed:
+        self.error(line, f"Could not be saved: {e}")
+
+  def _resolve_brands(self, names):
+    missing = names - self.brands.keys()
+    if not missing:
+      return
+    self.brands.update(Brand.objects.filter(name__in=missing).values_list('name', 'id'))
+    new = missing - self.brands.keys()
+    if new:
+      Brand.objects.bulk_create([Brand(name=name) for name in new], ignore_conflicts=True)
+      self.brands.update(Brand.objects.filter(name__in=new).values_list('name', 'id'))
+
+  def _item_key(self, data):
+    return (data['name'], self.brands.get(data['brand']), data['category_id'])
+
+  def _resolve_items(self, parsed):
+    missing = {self._item_key(data): data for _, data in parsed}
+    missing = {key: data for key, data in missing.items() if key not in self.items}
+    if not missing:
+      return
+
+    existing = Item.objects.filter(name__in={key[0] for key in missing}).values_list('name', 'brand_id', 'category_id', 'id')
+    for name, brand_id, category_id, pk in existing:
+      self.items.setdefault((name, brand_id, category_id), pk)
+
+    new = [
+      Item(name=name, brand_id=brand_id, category_id=category_id, description=data['description'])
+      for (name, brand_id, category_id), data in missing.items()
+      if (name, brand_id, category_id) not in self.items
+    ]
+    for item in Item.objects.bulk_create(new):
+      self.items[(item.name, item.brand_id, item.category_id)] = item.pk
+
+  def _build_variants(self, parsed):
+    variants = []
+    for line, data in parsed:
+      item_id = self.items[self._item_key(data)]
+      sku = ItemVariant.build_sku(item_id, data['attributes'])
+      variants.append((line, ItemVariant(
+        item_id=item_id,
+        attributes=data['attributes'],
+        sku=sku,
+        price=data['price'],
+        quantity=data['quantity'],
+        target_quantity=data['target_quantity'],
+      )))
+
+    taken = set(ItemVariant.objects.filter(sku__in=[v.sku for _, v in variants]).values_list('sku', flat=True))
+    accepted = []
+    for line, variant in variants:
+      if variant.sku in taken:
+        self.error(line, f"SKU '{variant.sku}' already exists.")
+      elif variant.sku in self.seen_skus:
+        self.error(line, f"SKU '{variant.sku}' appears earlier in this file.")
+      else:
+        self.seen_skus.add(variant.sku)
+        accepted.append((line, variant))
+    return accepted
+
+
+def import_catalog(stream, file_format, chunk_size=1000):
+  """
+  Imports a CSV or JSONL text stream and returns the report.
+  """
+  if file_format not in READERS:
+    raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(READERS)}.")
+  importer = CatalogImporter(chunk_size=chunk_size)
+  return importer.run(READERS[file_format](stream))
@@ -0,0 +1,98 @@
+from django.db import connection, transaction
+from .models import Brand, Category, Item, ItemVariant, VariantListing
+
+_TABLE = VariantListing._meta.db_table
+
+_COLUMNS = (
+  'variant_id', 'item_id', 'brand_id', 'category_id', 'sku', 'item_name', 'brand_name',
+  'category_name', 'attributes', 'price', 'quantity', 'target_quantity',
+)
+
+# Upserts the listing rows of the variants matched by {where} from the source tables
+_UPSERT_SQL = f"""
+  INSERT INTO {_TABLE} ({', '.join(_COLUMNS)})
+  SELECT v.id, i.id, b.id, c.id, v.sku, i.name, b.name, c.name, v.attributes, v.price, v.quantity, v.target_quantity
+  FROM {ItemVariant._meta.db_table} AS v
+  JOIN {Item._meta.db_table} AS i ON i.id = v.item_id
+  LEFT JOIN {Brand._meta.db_table} AS b ON b.id = i.brand_id
+  LEFT JOIN {Category._meta.db_table} AS c ON c.id = i.category_id
+  WHERE {{where}}
+  ON CONFLICT (variant_id) DO UPDATE SET
+  {', '.join(f'{column} = EXCLUDED.{column}' for column in _COLUMNS[1:])}
+"""
+
+
+def refresh_listings(variant_ids=None, item_ids=None, brand_ids=None, category_ids=None):
+  """
+  Rewrites the listing rows of the given variants, or of every variant of the
+  given items, brands or categories, in one statement. Brands and categories
+  also match on the listing's own ids, so deleted ones get their names cleared.
+  Call it inside the transaction that made the change.
+  """
+  if variant_ids is not None:
+    where, params = "v.id = ANY(%s)", [list(variant_ids)]
+  elif item_ids is not None:
+    where, params = "v.item_id = ANY(%s)", [list(item_ids)]
+  elif brand_ids is not None:
+    where = f"(i.brand_id = ANY(%s) OR v.id IN (SELECT variant_id FROM {_TABLE} WHERE brand_id = ANY(%s)))"
+    params = [list(brand_ids)] * 2
+  elif category_ids is not None:
+    where = f"(i.category_id = ANY(%s) OR v.id IN (SELECT variant_id FROM {_TABLE} WHERE category_id = ANY(%s)))"
+    params = [list(category_ids)] * 2
+  else:
+    raise ValueError("Pass variant_ids, item_ids, brand_ids or category_ids.")
+  if not params[0]:
+    return 0
+
+  with connection.cursor() as cursor:
+    cursor.execute(_UPSERT_SQL.format(where=where), params)
+    return cursor.rowcount
+
+
+def set_listing_quantities(quantities):
+  """
+  Copies new stock levels ({variant_id: quantity}) into the listing with one UPDATE.
+  """
+  if not quantities:
+    return 0
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f"""
+      UPDATE {_TABLE} AS l SET quantity = q.quantity
+      FROM unnest(%s::bigint[], %s::integer[]) AS q(id, quantity)
+      WHERE l.variant_id = q.id
+      """,
+      [list(quantities), list(quantities.values())],
+    )
+    return cursor.rowcount
+
+
+def rebuild_listings():
+  """
+  Rebuilds the whole table from the source tables. Readers keep the old rows
+  until it commits; writers wait for it. Returns the number of rows written.
+  """
+  with transaction.atomic(), connection.cursor() as cursor:
+    cursor.execute(f"LOCK TABLE {_TABLE} IN EXCLUSIVE MODE")
+    cursor.execute(f"DELETE FROM {_TABLE}")
+    cursor.execute(_UPSERT_SQL.format(where="TRUE"))
+    return cursor.rowcount
+
+
+class AtomicWritesMixin:
+  """
+  Runs a viewset's creates, updates and deletes in one transaction, so the
+  listing refresh done by the signals commits or rolls back with the write.
+  """
+
+  def perform_create(self, serializer):
+    with transaction.atomic():
+      super().perform_create(serializer)
+
+  def perform_update(self, serializer):
+    with transaction.atomic():
+      super().perform_update(serializer)
+
+  def perform_destroy(self, instance):
+    with transaction.atomic():
+      super().perform_destroy(instance)
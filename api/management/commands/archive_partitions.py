@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.partitions import PARTITION_ARCHIVE_DIR, archive_partitions, month_start, parse_month, restore_partitions
+
+
+class Command(BaseCommand):
+  help = (
+    "Detaches the Transaction/TransactionItem partitions older than --before and archives them "
+    "to gzipped CSV files, or loads an archived month back with --restore."
+  )
+
+  def add_arguments(self, parser):
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--before', help="Archive every month before this one, as YYYY-MM.")
+    action.add_argument('--restore', help="Re-attach this archived month, as YYYY-MM.")
+    parser.add_argument('--dir', default=PARTITION_ARCHIVE_DIR, help=f"Archive directory (default {PARTITION_ARCHIVE_DIR}).")
+
+  def handle(self, *args, **options):
+    try:
+      month = parse_month(options['before'] or options['restore'])
+    except ValueError:
+      raise CommandError("Months are given as YYYY-MM, e.g. 2026-01.")
+
+    if options['restore']:
+      try:
+        restored = restore_partitions(month, options['dir'])
+      except (FileNotFoundError, ValueError) as e:
+        raise CommandError(str(e))
+      for table, rows in restored.items():
+        self.stdout.write(f"{table}: {rows} rows")
+      self.stdout.write(self.style.SUCCESS(f"Restored {month:%Y-%m}."))
+      return
+
+    if month > month_start(timezone.now()):
+      raise CommandError("--before can't be later than the current month.")
+    written = archive_partitions(month, options['dir'])
+    for path in written:
+      self.stdout.write(f"Wrote {path}")
+    self.stdout.write(self.style.SUCCESS(f"Archived {len(written)} partition(s) before {month:%Y-%m}."))
@@ -0,0 +1,22 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from api.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+  help = "Rebuilds the daily sales rollups from the TransactionItem history (all of it, or from --since on)."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--since', help="First day to rebuild, as YYYY-MM-DD.")
+
+  def handle(self, *args, **options):
+    since = None
+    if options['since']:
+      try:
+        since = date.fromisoformat(options['since'])
+      except ValueError:
+        raise CommandError("--since must be a date like 2026-01-31.")
+
+    written = backfill_rollups(since)
+    scope = f"since {since}" if since else "for all history"
+    self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows {scope}."))
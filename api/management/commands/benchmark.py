@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmark import DEFAULT_TOLERANCE, SCALES, load_baselines, regressions, run_benchmarks, save_baselines, scale_label
+from api.models import ItemVariant
+
+
+class Command(BaseCommand):
+  help = (
+    "Times the main endpoints against the current database (see generate_dataset) and "
+    "compares p95 latency and query counts with the stored baselines for its scale."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--scale', choices=list(SCALES), help="Baseline set to use. Defaults to the one nearest the variant count.")
+    parser.add_argument('--baselines', default='benchmarks/baselines.json')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed p95 growth, e.g. 0.25 for +25%%.")
+    parser.add_argument('--only', nargs='*', help="Scenario names to run.")
+    parser.add_argument('--update-baselines', action='store_true', help="Store these results as the new baselines.")
+    parser.add_argument(
+      '--allow-missing-baselines', action='store_true',
+      help="Only warn when the scale or a scenario has no baseline, instead of failing.",
+    )
+
+  def handle(self, *args, **options):
+    scale = options['scale'] or scale_label(ItemVariant.objects.count())
+    self.stdout.write(f"Scale: {scale}, {options['runs']} runs per scenario")
+
+    results = run_benchmarks(options['runs'], options['warmup'], only=options['only'])
+    self.stdout.write(f"{'scenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for name, result in results.items():
+      self.stdout.write(f"{name:<26}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['queries']:>9}")
+
+    if options['update_baselines']:
+      save_baselines(options['baselines'], scale, results)
+      self.stdout.write(self.style.SUCCESS(f"Baselines for {scale} saved to {options['baselines']}."))
+      return
+
+    # 1. Nothing to compare against is a failure unless asked otherwise; a silent pass hides it
+    baseline = load_baselines(options['baselines']).get(scale, {})
+    missing = [name for name in results if name not in baseline]
+    if missing:
+      message = (
+        f"No {scale} baselines in {options['baselines']} for: {', '.join(missing)}. "
+        "Record them with --update-baselines on a dataset of that size."
+      )
+      if not options['allow_missing_baselines']:
+        raise CommandError(message)
+      self.stdout.write(self.style.WARNING(message))
+
+    # 2. Compare what there is
+    problems = regressions(results, baseline, options['tolerance'])
+    if problems:
+      raise CommandError("Regressions:\n  " + "\n  ".join(problems))
+    self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.partitions import PARTITION_MONTHS_AHEAD, ensure_partitions
+
+
+class Command(BaseCommand):
+  help = (
+    "Creates the monthly Transaction/TransactionItem partitions for the coming months "
+    "and for any month with rows in the default partition. Schedule it (e.g. daily)."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--months-ahead',
+      type=int,
+      default=PARTITION_MONTHS_AHEAD,
+      help=f"Months after the current one to create (default {PARTITION_MONTHS_AHEAD}).",
+    )
+
+  def handle(self, *args, **options):
+    created = ensure_partitions(months_ahead=options['months_ahead'])
+    for name in created:
+      self.stdout.write(f"Created {name}")
+    self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) created."))
@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import SaleFlush
+from api.sales import FLUSH_BATCH_SIZE, FLUSH_MAX_WAIT, flush_sales, queue_state, should_flush
+
+
+class Command(BaseCommand):
+  help = "Applies queued sale events to stock in batches, when the queue reaches --batch-size or its oldest event is --max-wait seconds old."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=FLUSH_BATCH_SIZE)
+    parser.add_argument('--max-wait', type=float, default=FLUSH_MAX_WAIT, help="Seconds an event may wait before a flush is forced.")
+    parser.add_argument('--poll', type=float, default=0.25, help="Seconds between queue checks.")
+    parser.add_argument('--keep-days', type=int, default=7, help="How long flush records are kept for the stats endpoint.")
+    parser.add_argument('--once', action='store_true', help="Drain whatever is queued and exit.")
+
+  def handle(self, *args, **options):
+    batch_size = options['batch_size']
+
+    if options['once']:
+      while self._flush(batch_size):
+        pass
+      return
+
+    self.stdout.write(f"Flushing sales every {batch_size} events or {options['max_wait']}s.")
+    flushes = 0
+    while True:
+      depth, age = queue_state()
+      if should_flush(depth, age, batch_size, options['max_wait']):
+        flushes += 1 if self._flush(batch_size) else 0
+        # Prune old flush records now and then
+        if flushes % 100 == 1:
+          SaleFlush.objects.filter(datetime_flushed__lt=timezone.now() - timedelta(days=options['keep_days'])).delete()
+      else:
+        time.sleep(options['poll'])
+
+  def _flush(self, batch_size):
+    flush = flush_sales(batch_size)
+    if flush is not None:
+      self.stdout.write(
+        f"Flushed {flush.event_count} events into {flush.line_count} lines "
+        f"({flush.rejected_count} rejected) in {flush.duration_ms}ms, max latency {flush.max_latency_ms}ms."
+      )
+    return flush
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.shards import fold_shards
+
+
+class Command(BaseCommand):
+  help = (
+    "Brings every sharded variant's quantity (and its listing row) up to the sum of its "
+    "StockShard rows. Stock batches do this themselves; this is for repairs, e.g. after "
+    "editing shards by hand."
+  )
+
+  def handle(self, *args, **options):
+    quantities = fold_shards()
+    self.stdout.write(self.style.SUCCESS(f"Folded {len(quantities)} variants."))
@@ -0,0 +1,51 @@
+import json
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.dataset import INSERT_BATCH_SIZE, DatasetGenerator
+from api.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+  help = "Bulk-generates a synthetic catalog and transaction history, e.g. --variants 100000 --transactions 200000."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--brands', type=int, default=50)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--variants', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=2000)
+    parser.add_argument('--lines-per-transaction', type=int, default=5)
+    parser.add_argument('--days', type=int, default=365, help="Spread transactions over this many past days.")
+    parser.add_argument('--prefix', default='Gen', help="Prefix of generated brand and item names.")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=INSERT_BATCH_SIZE)
+    parser.add_argument('--skip-rollups', action='store_true', help="Don't rebuild the sales rollups for the generated days.")
+
+  def handle(self, *args, **options):
+    if min(options['brands'], options['items']) < 1:
+      raise CommandError("--brands and --items must be at least 1.")
+
+    generator = DatasetGenerator(
+      prefix=options['prefix'],
+      seed=options['seed'],
+      batch_size=options['batch_size'],
+      log=lambda message: self.stdout.write(f"  {message}"),
+    )
+    try:
+      counts = generator.generate(
+        options['brands'],
+        options['items'],
+        options['variants'],
+        options['transactions'],
+        options['lines_per_transaction'],
+        options['days'],
+      )
+    except ValueError as e:
+      raise CommandError(str(e))
+
+    # The generated lines bypass apply_stock_changes, so rebuild the sales rollups
+    # of the days they were spread over (earlier days are left alone)
+    if counts['transactions'] and not options['skip_rollups']:
+      backfill_rollups(since=timezone.localdate() - timedelta(days=options['days']))
+    self.stdout.write(json.dumps(counts))
+    self.stdout.write(self.style.SUCCESS("Dataset generated."))
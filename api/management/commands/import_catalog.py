@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from api.importer import READERS, import_catalog
+
+
+class Command(BaseCommand):
+  help = "Imports brands, items and variants from a CSV or JSONL file, in chunks."
+
+  def add_arguments(self, parser):
+    parser.add_argument('path')
+    parser.add_argument('--format', dest='file_format', choices=list(READERS), help="Defaults to the file extension.")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    path = Path(options['path'])
+    file_format = options['file_format'] or path.suffix.lstrip('.').lower()
+    if file_format not in READERS:
+      raise CommandError(f"Can't tell the format of '{path.name}'; pass --format.")
+
+    with path.open(encoding='utf-8-sig', newline='') as stream:
+      report = import_catalog(stream, file_format, options['chunk_size'])
+
+    self.stdout.write(json.dumps(report, indent=2))
+    self.stdout.write(self.style.SUCCESS(
+      f"Imported {report['created']} of {report['rows']} rows ({report['error_count']} with errors)."
+    ))
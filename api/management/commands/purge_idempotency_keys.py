@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from api.idempotency import IDEMPOTENCY_KEY_TTL, purge_expired_keys
+
+
+class Command(BaseCommand):
+  help = "Deletes stored Idempotency-Key responses older than the TTL, in bounded batches."
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--ttl-hours',
+      type=float,
+      default=IDEMPOTENCY_KEY_TTL.total_seconds() / 3600,
+      help="Keys older than this are removed (default: IDEMPOTENCY_KEY_TTL_HOURS or 24).",
+    )
+    parser.add_argument('--batch-size', type=int, default=1000)
+
+  def handle(self, *args, **options):
+    removed = purge_expired_keys(timedelta(hours=options['ttl_hours']), options['batch_size'])
+    self.stdout.write(self.style.SUCCESS(f"Purged {removed} idempotency keys."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import ItemVariant
+from api.shards import MAX_SHARDS, rebalance_all, rebalance_shards
+
+
+class Command(BaseCommand):
+  help = (
+    "Spreads sharded variants' stock evenly over their StockShard rows. "
+    "With --variant and --shards, turns sharding on (or off with 0) or changes the shard count."
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--variant', type=int, action='append', default=[], help="ItemVariant id (repeatable). Default: every sharded variant.")
+    parser.add_argument('--shards', type=int, default=None, help=f"Number of shards, 0 to {MAX_SHARDS}. Needs --variant.")
+
+  def handle(self, *args, **options):
+    variant_ids, shards = options['variant'], options['shards']
+    if shards is not None and not variant_ids:
+      raise CommandError("--shards needs at least one --variant.")
+
+    try:
+      if variant_ids:
+        quantities = {variant_id: rebalance_shards(variant_id, shards) for variant_id in variant_ids}
+      else:
+        quantities = rebalance_all()
+    except ItemVariant.DoesNotExist:
+      raise CommandError("No ItemVariant with that id.")
+    except ValueError as e:
+      raise CommandError(str(e))
+
+    for variant_id, quantity in quantities.items():
+      self.stdout.write(f"{variant_id}: {quantity}")
+    self.stdout.write(self.style.SUCCESS(f"Rebalanced {len(quantities)} variants."))
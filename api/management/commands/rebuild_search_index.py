@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.search import REFRESH_BATCH_SIZE, rebuild_search_vectors
+
+
+class Command(BaseCommand):
+  help = "Recomputes ItemVariant.search_vector for the whole catalog (e.g. after raw SQL edits or bulk loads that skipped the signals)."
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=REFRESH_BATCH_SIZE)
+
+  def handle(self, *args, **options):
+    updated = rebuild_search_vectors(options['batch_size'])
+    self.stdout.write(self.style.SUCCESS(f"Search vectors rebuilt for {updated} variants."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.listings import rebuild_listings
+
+
+class Command(BaseCommand):
+  help = "Rebuilds the VariantListing read table from ItemVariant, Item, Brand and Category (e.g. after raw SQL edits)."
+
+  def handle(self, *args, **options):
+    written = rebuild_listings()
+    self.stdout.write(self.style.SUCCESS(f"Listings rebuilt for {written} variants."))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import StockSnapshot
+from api.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+  help = "Records the current quantity of every ItemVariant. Schedule it periodically (e.g. nightly) to keep ?as_of= queries bounded."
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--keep-days',
+      type=int,
+      default=None,
+      help="Also delete snapshots older than this many days.",
+    )
+
+  def handle(self, *args, **options):
+    written = take_snapshot()
+    self.stdout.write(self.style.SUCCESS(f"Snapshot taken for {written} variants."))
+
+    if options['keep_days'] is not None:
+      cutoff = timezone.now() - timedelta(days=options['keep_days'])
+      deleted, _ = StockSnapshot.objects.filter(taken_at__lt=cutoff).delete()
+      self.stdout.write(f"Deleted {deleted} snapshots older than {options['keep_days']} days.")
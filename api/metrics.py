@@ -0,0 +1,199 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A request running the same SQL shape this many times is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Collapses literal lists so `IN (%s, %s)` and `IN (%s, %s, %s)` count as one shape
+_PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+class RequestStats:
+  """
+  What one request spent on SQL and serialization. Held in a context variable
+  while the request runs, so the database and serializer hooks can add to it.
+  """
+  __slots__ = ('queries', 'sql_seconds', 'serializer_seconds', 'shapes', 'serializer_depth')
+
+  def __init__(self):
+    self.queries = 0
+    self.sql_seconds = 0.0
+    self.serializer_seconds = 0.0
+    self.shapes = Counter()
+    self.serializer_depth = 0
+
+  def repeated_shapes(self, threshold=N_PLUS_ONE_THRESHOLD):
+    return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+def sql_shape(sql):
+  return _PLACEHOLDER_LIST.sub('%s...', sql)
+
+
+def sql_observer(execute, sql, params, many, context):
+  """
+  Database execute wrapper (installed on every connection, see signals.py).
+  """
+  stats = current_stats.get()
+  if stats is None:
+    return execute(sql, params, many, context)
+
+  started = time.perf_counter()
+  try:
+    return execute(sql, params, many, context)
+  finally:
+    stats.sql_seconds += time.perf_counter() - started
+    stats.queries += 1
+    stats.shapes[sql_shape(sql)] += 1
+
+
+def install_sql_observer(connection):
+  if sql_observer not in connection.execute_wrappers:
+    connection.execute_wrappers.append(sql_observer)
+
+
+def instrument_serializers():
+  """
+  Times every top-level `serializer.data` call into the current request's stats.
+  """
+  from rest_framework.serializers import BaseSerializer
+
+  if getattr(BaseSerializer.data, 'instrumented', False):
+    return
+  original = BaseSerializer.data.fget
+
+  def timed_data(serializer):
+    stats = current_stats.get()
+    if stats is None:
+      return original(serializer)
+    stats.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+      return original(serializer)
+    finally:
+      stats.serializer_depth -= 1
+      # Only the outermost call, so nested .data access isn't counted twice
+      if stats.serializer_depth == 0:
+        stats.serializer_seconds += time.perf_counter() - started
+
+  timed = property(timed_data)
+  timed.fget.instrumented = True
+  BaseSerializer.data = timed
+
+
+class MetricsRegistry:
+  """
+  Per-process counters and latency histograms, keyed by (route, method, status class).
+  With several worker processes, each one exposes its own series.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._series = defaultdict(lambda: {
+      'requests': 0,
+      'seconds': 0.0,
+      'buckets': [0] * len(LATENCY_BUCKETS),
+      'queries': 0,
+      'sql_seconds': 0.0,
+      'serializer_seconds': 0.0,
+      'response_bytes': 0,
+      'n_plus_one': 0,
+    })
+
+  def record(self, route, method, status_code, seconds, stats, response_bytes, n_plus_one):
+    key = (route, method, f"{status_code // 100}xx")
+    with self._lock:
+      series = self._series[key]
+      series['requests'] += 1
+      series['seconds'] += seconds
+      for index, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+          series['buckets'][index] += 1
+      series['queries'] += stats.queries
+      series['sql_seconds'] += stats.sql_seconds
+      series['serializer_seconds'] += stats.serializer_seconds
+      series['response_bytes'] += response_bytes
+      series['n_plus_one'] += int(n_plus_one)
+
+  def render(self):
+    """
+    The Prometheus text exposition format (version 0.0.4).
+    """
+    with self._lock:
+      series = {key: {**values, 'buckets': list(values['buckets'])} for key, values in self._series.items()}
+
+    lines = []
+
+    def family(name, kind, help_text, samples):
+      lines.append(f"# HELP {name} {help_text}")
+      lines.append(f"# TYPE {name} {kind}")
+      lines.extend(samples)
+
+    def labels(key, **extra):
+      route, method, status = key
+      pairs = {'route': route, 'method': method, 'status': status, **extra}
+      return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs.items())
+
+    histogram = []
+    for key, values in sorted(series.items()):
+      for bound, count in zip(LATENCY_BUCKETS, values['buckets']):
+        histogram.append(f"refill_http_request_duration_seconds_bucket{{{labels(key, le=str(bound))}}} {count}")
+      histogram.append(f"refill_http_request_duration_seconds_bucket{{{labels(key, le='+Inf')}}} {values['requests']}")
+      histogram.append(f"refill_http_request_duration_seconds_sum{{{labels(key)}}} {values['seconds']:.6f}")
+      histogram.append(f"refill_http_request_duration_seconds_count{{{labels(key)}}} {values['requests']}")
+    family('refill_http_request_duration_seconds', 'histogram', "Request latency by route.", histogram)
+
+    counters = [
+      ('refill_http_sql_queries_total', 'queries', "SQL queries issued.", '{}'),
+      ('refill_http_sql_seconds_total', 'sql_seconds', "Time spent executing SQL.", '{:.6f}'),
+      ('refill_http_serializer_seconds_total', 'serializer_seconds', "Time spent in serializer.data.", '{:.6f}'),
+      ('refill_http_response_bytes_total', 'response_bytes', "Response body bytes (streamed bodies excluded).", '{}'),
+      ('refill_http_n_plus_one_total', 'n_plus_one', f"Requests repeating one SQL shape {N_PLUS_ONE_THRESHOLD}+ times.", '{}'),
+    ]
+    for name, field, help_text, number in counters:
+      family(name, 'counter', help_text, [
+        f"{name}{{{labels(key)}}} {number.format(values[field])}" for key, values in sorted(series.items())
+      ])
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def route_name(request):
+  match = getattr(request, 'resolver_match', None)
+  if match is None:
+    return 'unmatched'
+  return match.view_name or match.route
+
+
+def finish_request(request, response, stats, started):
+  """
+  Records one finished request and logs any likely N+1 pattern.
+  """
+  seconds = time.perf_counter() - started
+  route = route_name(request)
+  repeated = stats.repeated_shapes()
+  if repeated:
+    shape, count = repeated[0]
+    logger.warning("Likely N+1 on %s %s: %d runs of %s", request.method, route, count, shape[:200])
+
+  size = 0 if response.streaming else len(response.content)
+  registry.record(route, request.method, response.status_code, seconds, stats, size, bool(repeated))
@@ -0,0 +1,121 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from .metrics import RequestStats, current_stats, finish_request
+from .routers import pick_replica, read_alias, replica_aliases
+
+# After a write, the client reads from the primary for this many seconds (read-your-writes)
+REPLICA_STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+REPLICA_STICKY_COOKIE = getattr(settings, 'REPLICA_STICKY_COOKIE', 'refill_primary_until')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _view_class(path):
+  try:
+    match = resolve(path)
+  except Resolver404:
+    return None
+  # DRF views expose `cls`, Django class-based views `view_class`
+  return getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+
+
+class ReplicaRoutingMiddleware:
+  """
+  Routes the reads of safe requests to views marked `replica_reads = True`
+  to a replica (see routers.py), unless the client wrote recently.
+
+  Any successful unsafe request sets a cookie that pins the client to the
+  primary for REPLICA_STICKY_SECONDS, so it sees its own writes.
+  """
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    self.enabled = bool(replica_aliases())
+    if iscoroutinefunction(self.get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+
+    token = read_alias.set(pick_replica() if self.wants_replica(request) else None)
+    try:
+      response = self.get_response(request)
+    finally:
+      read_alias.reset(token)
+    return self.mark_write(request, response)
+
+  async def __acall__(self, request):
+    # Picking a replica may query it for its lag, which is sync ORM work
+    alias = await sync_to_async(pick_replica)() if self.wants_replica(request) else None
+    token = read_alias.set(alias)
+    try:
+      response = await self.get_response(request)
+    finally:
+      read_alias.reset(token)
+    return self.mark_write(request, response)
+
+  def wants_replica(self, request):
+    if not self.enabled or request.method not in SAFE_METHODS:
+      return False
+    try:
+      if float(request.COOKIES.get(REPLICA_STICKY_COOKIE) or 0) > time.time():
+        return False
+    except ValueError:
+      pass
+    return getattr(_view_class(request.path_info), 'replica_reads', False)
+
+  def mark_write(self, request, response):
+    if self.enabled and request.method not in SAFE_METHODS and response.status_code < 400:
+      response.set_cookie(
+        REPLICA_STICKY_COOKIE,
+        str(time.time() + REPLICA_STICKY_SECONDS),
+        max_age=REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite='Lax',
+      )
+    return response
+
+
+class MetricsMiddleware:
+  """
+  Records latency, SQL query count and time, serializer time and response size
+  per resolved route (see metrics.py), and logs likely N+1 query patterns.
+  Exposed at /api/metrics.
+  """
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    if iscoroutinefunction(self.get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+
+    stats = RequestStats()
+    token = current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+      response = self.get_response(request)
+    finally:
+      current_stats.reset(token)
+    finish_request(request, response, stats, started)
+    return response
+
+  async def __acall__(self, request):
+    stats = RequestStats()
+    token = current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+      response = await self.get_response(request)
+    finally:
+      current_stats.reset(token)
+    finish_request(request, response, stats, started)
+    return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name', 'id'], name='item_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemvariant',
+            index=models.Index(fields=['price', 'id'], name='variant_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemvariant',
+            index=models.Index(fields=['quantity', 'id'], name='variant_quantity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['datetime_created', 'id'], name='transaction_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.itemvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['variant', 'taken_at'], name='snapshot_variant_taken_idx'), models.Index(fields=['taken_at'], name='snapshot_taken_idx')],
+            },
+        ),
+    ]
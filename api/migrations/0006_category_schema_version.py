@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='schema_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_category_schema_version'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddIndex(
+            model_name='brand',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='brand_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='item_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemvariant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['attributes'], name='variant_attributes_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_attribute_and_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemvariant',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='itemvariant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='variant_search_vector_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE api_itemvariant AS v
+                SET search_vector =
+                    setweight(to_tsvector('simple', coalesce(i.name, '')), 'A') ||
+                    setweight(to_tsvector('simple', v.sku || ' ' || replace(v.sku, '-', ' ')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(b.name, '')), 'B') ||
+                    setweight(jsonb_to_tsvector('simple', v.attributes, '["string", "numeric"]'), 'C')
+                FROM api_item AS i
+                LEFT JOIN api_brand AS b ON b.id = i.brand_id
+                WHERE i.id = v.item_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
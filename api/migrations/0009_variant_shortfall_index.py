@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_variant_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itemvariant',
+            index=models.Index(models.OrderBy(django.db.models.expressions.CombinedExpression(models.F('target_quantity'), '-', models.F('quantity')), descending=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('quantity__lt', models.F('target_quantity'))), name='variant_shortfall_idx'),
+        ),
+    ]
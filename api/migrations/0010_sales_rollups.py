@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_variant_shortfall_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('restock', 'Restock'), ('sale', 'Sale'), ('adjustment', 'Adjustment')], max_length=15)),
+                ('units', models.IntegerField(default=0)),
+                ('net_quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('line_count', models.IntegerField(default=0)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='api.itemvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['type', 'day'], name='salesrollup_type_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('variant', 'day', 'type'), name='salesrollup_variant_day_type_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+TABLES = ['api_transaction', 'api_transactionitem']
+
+
+def _rebuild(schema_editor, table, partitioned):
+    """
+    Recreates `table` as a table range partitioned by month on datetime_created
+    (with a default partition; api.partitions adds the monthly ones after
+    migrating), or back as a plain table. Rows, indexes, constraints and the
+    id sequence carry over. Identity columns aren't allowed on partitioned
+    tables, so ids come from an owned sequence instead.
+    """
+    old = f'{table}_old'
+    sequence = f'{table}_id_seq'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('u', 'f')
+            """,
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index AS i
+            JOIN pg_class AS c ON c.oid = i.indexrelid
+            WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)
+            """,
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT attidentity, format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attname = 'id'
+            """,
+            [table],
+        )
+        identity, id_type = cursor.fetchone()
+
+    # 1. Free the names the new table needs
+    schema_editor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    schema_editor.execute(f'ALTER TABLE {old} DROP CONSTRAINT {table}_pkey')
+    for name, _ in constraints:
+        schema_editor.execute(f'ALTER TABLE {old} DROP CONSTRAINT {name}')
+    for name, _ in indexes:
+        schema_editor.execute(f'DROP INDEX {name}')
+    if identity:
+        schema_editor.execute(f'ALTER TABLE {old} ALTER COLUMN id DROP IDENTITY')
+        schema_editor.execute(f'CREATE SEQUENCE {sequence} AS {id_type}')
+
+    # 2. The new table, with the same columns, indexes and constraints
+    if partitioned:
+        schema_editor.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (datetime_created)')
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, datetime_created)')
+        schema_editor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    else:
+        schema_editor.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)')
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+    schema_editor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+    schema_editor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    for name, definition in constraints:
+        schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+
+    # 3. Move the rows over
+    schema_editor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    # Run the deferred foreign key checks now; later operations alter the table
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    schema_editor.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+    schema_editor.execute(f'DROP TABLE {old}')
+
+
+def partition_tables(apps, schema_editor):
+    for table in TABLES:
+        _rebuild(schema_editor, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    for table in TABLES:
+        _rebuild(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='transactionitem',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='transactionitem',
+            name='datetime_created',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE api_transactionitem AS li SET datetime_created = t.datetime_created
+                FROM api_transaction AS t
+                WHERE t.id = li.transaction_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='saleflush',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='transactionitem',
+            name='transaction',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='api.transaction'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transactionitem',
+            unique_together={('transaction', 'item', 'datetime_created')},
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
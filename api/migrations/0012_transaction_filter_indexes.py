@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_partition_transactions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionitem',
+            name='item',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transaction_lines', to='api.itemvariant'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'datetime_created', 'id'], name='transaction_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionitem',
+            index=models.Index(fields=['item', 'transaction'], include=('datetime_created',), name='line_item_transaction_idx'),
+        ),
+    ]
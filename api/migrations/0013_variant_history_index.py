@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_transaction_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionitem',
+            index=models.Index(fields=['item', 'datetime_created', 'id'], name='line_item_history_idx'),
+        ),
+    ]
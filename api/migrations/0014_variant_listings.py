@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:57
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_variant_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariantListing',
+            fields=[
+                ('variant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='api.itemvariant')),
+                ('item_id', models.IntegerField()),
+                ('brand_id', models.IntegerField(null=True)),
+                ('category_id', models.IntegerField(null=True)),
+                ('sku', models.CharField(db_index=True, max_length=100)),
+                ('item_name', models.CharField(max_length=25)),
+                ('brand_name', models.CharField(max_length=25, null=True)),
+                ('category_name', models.CharField(max_length=25, null=True)),
+                ('attributes', models.JSONField(default=dict)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('target_quantity', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_name', 'variant'], name='listing_item_name_idx'), models.Index(fields=['brand_name', 'variant'], name='listing_brand_name_idx'), models.Index(fields=['category_name', 'variant'], name='listing_category_name_idx'), models.Index(fields=['price', 'variant'], name='listing_price_idx'), models.Index(fields=['quantity', 'variant'], name='listing_quantity_idx'), django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('item_name'), name='gin_trgm_ops'), name='listing_item_name_trgm_idx'), django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('brand_name'), name='gin_trgm_ops'), name='listing_brand_name_trgm_idx'), django.contrib.postgres.indexes.GinIndex(fields=['attributes'], name='listing_attributes_gin_idx', opclasses=['jsonb_path_ops'])],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO api_variantlisting (
+                    variant_id, item_id, brand_id, category_id, sku, item_name, brand_name,
+                    category_name, attributes, price, quantity, target_quantity
+                )
+                SELECT v.id, i.id, b.id, c.id, v.sku, i.name, b.name, c.name, v.attributes, v.price, v.quantity, v.target_quantity
+                FROM api_itemvariant AS v
+                JOIN api_item AS i ON i.id = v.item_id
+                LEFT JOIN api_brand AS b ON b.id = i.brand_id
+                LEFT JOIN api_category AS c ON c.id = i.category_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_stock_shards'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='salesrollup_variant_day_type_uniq',
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('variant', 'day', 'type', 'shard'), name='salesrollup_variant_day_type_shard_uniq'),
+        ),
+    ]
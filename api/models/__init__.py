@@ -1,6 +1,11 @@
 from .base import Brand, Category, Memo
-from .transactions import Transaction, TransactionItem
+from .transactions import Transaction, TransactionItem, StockSnapshot
 from .items import Item, ItemVariant
+from .sales import SaleEvent, SaleFlush
+from .idempotency import IdempotencyKey
+from .rollups import SalesRollup
+from .listings import VariantListing
+from .shards import StockShard
 
 __all__ = [
   'Brand',
@@ -8,6 +13,13 @@ __all__ = [
   'Memo',
   'Transaction',
   'TransactionItem',
+  'StockSnapshot',
   'Item',
   'ItemVariant',
+  'SaleEvent',
+  'SaleFlush',
+  'IdempotencyKey',
+  'SalesRollup',
+  'VariantListing',
+  'StockShard',
 ]
\ No newline at end of file
@@ -1,4 +1,6 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
 # Create your models here.
 
@@ -9,6 +11,12 @@ class Brand(models.Model):
   name = models.CharField(max_length=25, unique=True)
   description = models.TextField(max_length=200, blank=True, null=True)
 
+  class Meta:
+    indexes = [
+      # Serves the `icontains` brand filter (UPPER(name) LIKE UPPER('%...%'))
+      GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='brand_name_trgm_idx'),
+    ]
+
   def __str__(self):
     return self.name
 
@@ -23,6 +31,15 @@ class Category(models.Model):
     blank=True,
     help_text="A list of required attribute keys. e.g., ['color', 'tip_size']",
   )
+  # Bumped on every save so cached attribute validators get rebuilt
+  schema_version = models.PositiveIntegerField(default=1, editable=False)
+
+  def save(self, *args, **kwargs):
+    if self.pk is not None:
+      self.schema_version += 1
+      if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'schema_version'}
+    super().save(*args, **kwargs)
 
   def __str__(self):
     return self.name
@@ -0,0 +1,15 @@
+from django.db import models
+
+class IdempotencyKey(models.Model):
+  """
+  The stored outcome of a request sent with an `Idempotency-Key` header.
+  Retries with the same key get this response back instead of being re-run.
+  """
+  key = models.CharField(max_length=255, unique=True)
+  request_hash = models.CharField(max_length=64)
+  response_status = models.PositiveSmallIntegerField(default=0)
+  response_body = models.JSONField(null=True, blank=True)
+  datetime_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+  def __str__(self):
+    return self.key
@@ -1,7 +1,11 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from .base import Brand, Category
+from ..validation import schema_registry
 
 class Item(models.Model):
   id = models.AutoField(primary_key=True)
@@ -10,6 +14,13 @@ class Item(models.Model):
   brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True)
   category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
 
+  class Meta:
+    indexes = [
+      models.Index(fields=['name', 'id'], name='item_name_id_idx'),
+      # Serves the `icontains` name filter (UPPER(name) LIKE UPPER('%...%'))
+      GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='item_name_trgm_idx'),
+    ]
+
   def __str__(self):
     return f"{self.brand.name} {self.name}" if self.brand else self.name
 
@@ -34,20 +45,56 @@ class ItemVariant(models.Model):
   price = models.DecimalField(max_digits=10, decimal_places=2)
   quantity = models.IntegerField(default=0)
   target_quantity = models.PositiveIntegerField(default=0)
+  # > 0: the stock lives in this many StockShard rows and `quantity` is their sum (see api.shards)
+  shard_count = models.PositiveSmallIntegerField(default=0, editable=False)
+  # Maintained by api.search (item name, brand, SKU and attribute values)
+  search_vector = SearchVectorField(null=True, editable=False)
+
+  class Meta:
+    indexes = [
+      # Keyset pagination for the /items/ ordering fields
+      models.Index(fields=['price', 'id'], name='variant_price_id_idx'),
+      models.Index(fields=['quantity', 'id'], name='variant_quantity_id_idx'),
+      # Serves `attributes @> {...}` (the exact attribute filters and ?attributes=)
+      GinIndex(fields=['attributes'], opclasses=['jsonb_path_ops'], name='variant_attributes_gin_idx'),
+      GinIndex(fields=['search_vector'], name='variant_search_vector_idx'),
+      # The reorder report: only variants below target, largest shortfall first
+      models.Index(
+        (models.F('target_quantity') - models.F('quantity')).desc(),
+        models.F('id').desc(),
+        name='variant_shortfall_idx',
+        condition=models.Q(quantity__lt=models.F('target_quantity')),
+      ),
+    ]
   
-  def save(self, *args, **kwargs):
+  @staticmethod
+  def normalize_attributes(attributes):
+    """
+    Sorts the attribute keys alphabetically, so equal attributes give equal SKUs.
+    """
+    if isinstance(attributes, dict):
+      return dict(sorted(attributes.items()))
+    return attributes
+
+  @staticmethod
+  def build_sku(item_id, attributes):
+    """
+    Pattern: [ITEM_ID]-[ATTR1]-[ATTR2]...
+    Example: 12-BLUE-07MM
+    Only needs the parent id, so SKUs can be generated in memory for bulk inserts.
+    """
+    attr_values = [slugify(str(v)).upper() for v in attributes.values()]
+    return f"{item_id}-" + "-".join(attr_values)
+
+  def assign_sku(self):
     # 1. Normalize the JSON (Sort keys alphabetically)
-    if isinstance(self.attributes, dict):
-      self.attributes = dict(sorted(self.attributes.items()))
+    self.attributes = self.normalize_attributes(self.attributes)
 
     # 2. Generate the SKU string
-    # Pattern: [ITEM_ID]-[ATTR1]-[ATTR2]...
-    # Example: 12-BLUE-07MM
-    attr_values = [slugify(str(v)).upper() for v in self.attributes.values()]
-    generated_sku = f"{self.item.id}-" + "-".join(attr_values)
-    
-    self.sku = generated_sku
-    
+    self.sku = self.build_sku(self.item_id, self.attributes)
+
+  def save(self, *args, **kwargs):
+    self.assign_sku()
     super().save(*args, **kwargs)
 
   def __str__(self):
@@ -73,26 +120,20 @@ class ItemVariant(models.Model):
   def clean(self):
     """
     This method validates the `attributes` JSON against the 
-    parent `Item.Category.attribute_schema`
+    parent `Item.Category.attribute_schema`, using the cached compiled schema
     """
     super().clean()
     
-    if not self.item:
+    if self.item_id is None:
       # Can't validate if there's no parent Item
       return 
     
-    # Get the rules from the category
-    required_keys = self.item.category.attribute_schema
-    
-    # Get the data we have
-    provided_keys = self.attributes.keys()
-    
-    # 1. Check for missing keys
-    for key in required_keys:
-      if key not in provided_keys or not self.attributes[key]:
-        raise ValidationError(f"Attribute '{key}' is required for this category.")
-    
-    # 2. Check for extra keys
-    for key in provided_keys:
-      if key not in required_keys:
-        raise ValidationError(f"Attribute '{key}' is not defined for this category.")
\ No newline at end of file
+    # Get the (cached) rules from the category
+    schema = schema_registry.get(self.item.category_id)
+    if schema is None:
+      # Items without a category have no schema to check against
+      return
+
+    errors = schema.errors(self.attributes)
+    if errors:
+      raise ValidationError({'attributes': errors})
@@ -0,0 +1,49 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models
+from django.db.models.functions import Upper
+from .items import ItemVariant
+
+class VariantListing(models.Model):
+  """
+  A flattened copy of an ItemVariant with its Item, Brand and Category names,
+  so /items/ can list, filter, order and summarize from one table.
+  Kept in step by api.listings in the same database transaction as the write;
+  `rebuild_variant_listings` rebuilds it from the source tables.
+
+  The parent ids are plain columns: deleting a Brand or Category refreshes the
+  rows instead of cascading into them.
+  """
+  variant = models.OneToOneField(
+    ItemVariant,
+    on_delete = models.CASCADE,
+    primary_key = True,
+    related_name = 'listing'
+  )
+  item_id = models.IntegerField()
+  brand_id = models.IntegerField(null=True)
+  category_id = models.IntegerField(null=True)
+  sku = models.CharField(max_length=100, db_index=True)
+  item_name = models.CharField(max_length=25)
+  brand_name = models.CharField(max_length=25, null=True)
+  category_name = models.CharField(max_length=25, null=True)
+  attributes = models.JSONField(default=dict)
+  price = models.DecimalField(max_digits=10, decimal_places=2)
+  quantity = models.IntegerField(default=0)
+  target_quantity = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    indexes = [
+      # Keyset pagination for every /items/ ordering, without joins
+      models.Index(fields=['item_name', 'variant'], name='listing_item_name_idx'),
+      models.Index(fields=['brand_name', 'variant'], name='listing_brand_name_idx'),
+      models.Index(fields=['category_name', 'variant'], name='listing_category_name_idx'),
+      models.Index(fields=['price', 'variant'], name='listing_price_idx'),
+      models.Index(fields=['quantity', 'variant'], name='listing_quantity_idx'),
+      # The `icontains` name filters and the attribute filters
+      GinIndex(OpClass(Upper('item_name'), name='gin_trgm_ops'), name='listing_item_name_trgm_idx'),
+      GinIndex(OpClass(Upper('brand_name'), name='gin_trgm_ops'), name='listing_brand_name_trgm_idx'),
+      GinIndex(fields=['attributes'], opclasses=['jsonb_path_ops'], name='listing_attributes_gin_idx'),
+    ]
+
+  def __str__(self):
+    return self.sku
@@ -0,0 +1,40 @@
+from django.db import models
+from .items import ItemVariant
+from .transactions import Transaction
+
+class SalesRollup(models.Model):
+  """
+  Per-variant, per-day totals of TransactionItem rows, split by Transaction.type.
+  Kept up to date by apply_stock_changes in the same database transaction;
+  `backfill_sales_rollups` rebuilds it from the raw history.
+
+  `units` is the number of units moved (always positive), `net_quantity` the
+  signed stock change, and `revenue` the units times unit_price_at_sale.
+  `day` is the local date (settings.TIME_ZONE) of the transaction.
+  A sharded variant's totals are split over one row per stock shard (see
+  api.shards), so reports sum the rows; backfills put everything on shard 0.
+  """
+  variant = models.ForeignKey(
+    ItemVariant,
+    on_delete = models.CASCADE,
+    related_name = 'rollups'
+  )
+  day = models.DateField()
+  type = models.CharField(max_length=15, choices=Transaction.TYPE_CHOICES)
+  shard = models.PositiveSmallIntegerField(default=0)
+  units = models.IntegerField(default=0)
+  net_quantity = models.IntegerField(default=0)
+  revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+  line_count = models.IntegerField(default=0)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['variant', 'day', 'type', 'shard'], name='salesrollup_variant_day_type_shard_uniq'),
+    ]
+    indexes = [
+      # Reports scan a date range of one type across all variants
+      models.Index(fields=['type', 'day'], name='salesrollup_type_day_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.variant_id} {self.day} {self.type}: {self.units}"
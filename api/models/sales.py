@@ -0,0 +1,48 @@
+from django.db import models
+from .items import ItemVariant
+from .transactions import Transaction
+
+class SaleEvent(models.Model):
+  """
+  A POS sale that has been accepted and durably queued, but not yet applied to stock.
+  The flusher coalesces pending events per ItemVariant into batched Transactions.
+  """
+  STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('rejected', 'Rejected'),
+  ]
+  item = models.ForeignKey(
+    ItemVariant,
+    on_delete = models.CASCADE,
+    related_name = 'sale_events'
+  )
+  quantity = models.PositiveIntegerField()
+  unit_price_at_sale = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+  status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+  detail = models.CharField(max_length=200, blank=True)
+  datetime_received = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    indexes = [
+      # The flusher only ever scans the pending events, oldest first
+      models.Index(fields=['id'], condition=models.Q(status='pending'), name='saleevent_pending_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.item_id} x{self.quantity} ({self.status})"
+
+
+class SaleFlush(models.Model):
+  """
+  One run of the sales flusher, kept so queue latency can be monitored.
+  """
+  transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
+  datetime_flushed = models.DateTimeField(auto_now_add=True, db_index=True)
+  event_count = models.PositiveIntegerField(default=0)
+  line_count = models.PositiveIntegerField(default=0)
+  rejected_count = models.PositiveIntegerField(default=0)
+  duration_ms = models.PositiveIntegerField(default=0)
+  max_latency_ms = models.PositiveIntegerField(default=0)
+
+  def __str__(self):
+    return f"{self.datetime_flushed:%Y-%m-%d %H:%M:%S} ({self.event_count} events)"
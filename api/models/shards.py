@@ -0,0 +1,25 @@
+from django.db import models
+from .items import ItemVariant
+
+class StockShard(models.Model):
+  """
+  One of the counter rows a sharded ItemVariant's stock is split across
+  (see api.shards). Concurrent stock changes land on different shards, so
+  they don't queue on the variant's row; the variant's quantity is their sum.
+  """
+  variant = models.ForeignKey(
+    ItemVariant,
+    on_delete = models.CASCADE,
+    related_name = 'shards'
+  )
+  shard = models.PositiveSmallIntegerField()
+  quantity = models.IntegerField(default=0)
+
+  class Meta:
+    unique_together = ('variant', 'shard')
+    constraints = [
+      models.CheckConstraint(condition=models.Q(quantity__gte=0), name='stockshard_quantity_gte_0'),
+    ]
+
+  def __str__(self):
+    return f"{self.variant_id}#{self.shard}: {self.quantity}"
@@ -5,6 +5,10 @@ class Transaction(models.Model):
   """
   Model representing a batch operation of sales/restocks.
   Can contain multiple Items
+
+  The table is range partitioned by month on datetime_created, and so is
+  TransactionItem (see api.partitions); that's why foreign keys to it
+  carry no database constraint.
   """
   id = models.AutoField(primary_key=True)
   TYPE_CHOICES = [
@@ -20,6 +24,14 @@ class Transaction(models.Model):
     related_name='transactions'
   )
 
+  class Meta:
+    indexes = [
+      # Keyset pagination over (datetime_created, id)
+      models.Index(fields=['datetime_created', 'id'], name='transaction_created_id_idx'),
+      # ?type= with a date range, in keyset order
+      models.Index(fields=['type', 'datetime_created', 'id'], name='transaction_type_created_idx'),
+    ]
+
   def __str__(self):
     return f"{self.get_type_display()} - {self.datetime_created.strftime('%Y-%m-%d %H:%M')}"
 
@@ -30,18 +42,62 @@ class TransactionItem(models.Model):
   transaction = models.ForeignKey(
     Transaction,
     on_delete = models.CASCADE,
-    related_name = 'line_items'
+    related_name = 'line_items',
+    db_constraint = False
   )
   item = models.ForeignKey(
     ItemVariant,
     on_delete = models.SET_NULL,
     null = True,
-    related_name = 'transaction_lines'
+    related_name = 'transaction_lines',
+    db_index = False  # Covered by line_item_transaction_idx
   )
 
   quantity_change = models.IntegerField()
   unit_price_at_sale = models.DecimalField(max_digits=10, decimal_places=2, default=0, blank=True)
+  # Copy of the transaction's datetime_created: the partition key, so lines
+  # land in the same month as their transaction. save() fills it in;
+  # bulk_create callers must set it themselves
+  datetime_created = models.DateTimeField()
 
   class Meta:
     # Ensures one item only appears once per transaction batch
-    unique_together = ('transaction', 'item')
\ No newline at end of file
+    # (unique keys on a partitioned table must include the partition key).
+    # That's weaker than (transaction, item) alone: it only holds while every
+    # line carries its transaction's exact timestamp
+    unique_together = ('transaction', 'item', 'datetime_created')
+    indexes = [
+      # The transaction filters' line semi-join (?variant=, ?sku=, ...), answered from the index alone
+      models.Index(fields=['item', 'transaction'], include=['datetime_created'], name='line_item_transaction_idx'),
+      # A variant's movement history, newest first (/items/{id}/history/)
+      models.Index(fields=['item', 'datetime_created', 'id'], name='line_item_history_idx'),
+    ]
+
+  def save(self, *args, **kwargs):
+    if self.datetime_created is None:
+      self.datetime_created = self.transaction.datetime_created
+    super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+  """
+  A point-in-time copy of an ItemVariant's quantity.
+  Stock "as of" a date is the nearest earlier snapshot plus the TransactionItem
+  deltas recorded after it, so history never has to be replayed from the start.
+  """
+  variant = models.ForeignKey(
+    ItemVariant,
+    on_delete = models.CASCADE,
+    related_name = 'snapshots'
+  )
+  quantity = models.IntegerField()
+  taken_at = models.DateTimeField()
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['variant', 'taken_at'], name='snapshot_variant_taken_idx'),
+      models.Index(fields=['taken_at'], name='snapshot_taken_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.variant_id} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.quantity}"
\ No newline at end of file
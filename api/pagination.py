@@ -1,6 +1,228 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPageNumberPagination(PageNumberPagination):
   page_size = 10
   page_size_query_param = 'page_size'
-  max_page_size = 50
\ No newline at end of file
+  max_page_size = 50
+
+
+def encode_cursor(payload):
+  data = json.dumps(payload, default=str, separators=(',', ':'))
+  return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def invalid_cursor():
+  # A 400: the cursor is client input, even when it came from one of our links
+  return ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def decode_cursor(encoded):
+  try:
+    return json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+  except (TypeError, ValueError):
+    raise invalid_cursor()
+
+
+class KeysetPagination(BasePagination):
+  """
+  Cursor pagination over the queryset's ordering plus the primary key as a tie breaker.
+  Each page is fetched with a WHERE on the previous row's values instead of an OFFSET,
+  and no COUNT(*) is run.
+  """
+  cursor_query_param = 'cursor'
+  page_size = 10
+  page_size_query_param = 'page_size'
+  max_page_size = 50
+  tiebreaker = 'pk'
+
+  def paginate_queryset(self, queryset, request, view=None):
+    page_queryset = self.get_page_queryset(queryset, request, view)
+    return self.paginate_rows(list(page_queryset))
+
+  def get_page_queryset(self, queryset, request, view=None):
+    """
+    Builds the (unevaluated) queryset for the requested page, so callers that
+    evaluate it themselves (e.g. async views) can reuse the paging logic.
+    """
+    self.request = request
+    self.base_url = request.build_absolute_uri()
+    self.page_size = self.get_page_size(request)
+    self.ordering = self.get_ordering(queryset)
+
+    cursor = self.get_cursor(request)
+    self.has_cursor = cursor is not None
+    self.reverse = bool(cursor and cursor.get('r'))
+
+    model = queryset.model
+    columns = [self._column(model, field) for field in self.ordering]
+    if self.reverse:
+      columns = [(name, not desc, not nulls_last, nullable) for name, desc, nulls_last, nullable in columns]
+
+    queryset = queryset.order_by(*[self._order_by(column) for column in columns])
+    if cursor:
+      # Tampered values fail to convert to the columns' types here
+      try:
+        condition = self._after(columns, cursor['v'])
+        queryset = queryset.filter(condition) if condition is not None else queryset.none()
+      except (DjangoValidationError, TypeError, ValueError):
+        raise invalid_cursor()
+    return queryset[:self.page_size + 1]
+
+  def paginate_rows(self, rows):
+    has_more = len(rows) > self.page_size
+    rows = rows[:self.page_size]
+
+    if self.reverse:
+      rows.reverse()
+      self.has_next, self.has_previous = self.has_cursor, has_more
+    else:
+      self.has_next, self.has_previous = has_more, self.has_cursor
+
+    self.page = rows
+    return rows
+
+  def get_paginated_response(self, data):
+    return Response({
+      'next': self.get_next_link(),
+      'previous': self.get_previous_link(),
+      'results': data,
+    })
+
+  def get_page_size(self, request):
+    try:
+      size = int(request.query_params[self.page_size_query_param])
+      if size > 0:
+        return min(size, self.max_page_size)
+    except (KeyError, ValueError):
+      pass
+    return self.page_size
+
+  def get_ordering(self, queryset):
+    ordering = [f for f in (queryset.query.order_by or queryset.model._meta.ordering) if isinstance(f, str)]
+    names = {f.lstrip('-') for f in ordering}
+    if not names & {'pk', 'id', self.tiebreaker}:
+      descending = bool(ordering) and ordering[-1].startswith('-')
+      ordering.append(f"-{self.tiebreaker}" if descending else self.tiebreaker)
+    return ordering
+
+  def get_cursor(self, request):
+    encoded = request.query_params.get(self.cursor_query_param)
+    if not encoded:
+      return None
+    cursor = decode_cursor(encoded)
+    if not isinstance(cursor, dict) or cursor.get('o') != self.ordering:
+      raise invalid_cursor()
+    if not isinstance(cursor.get('v'), list) or len(cursor['v']) != len(self.ordering):
+      raise invalid_cursor()
+    return cursor
+
+  def get_next_link(self):
+    if not self.has_next or not self.page:
+      return None
+    return self._link(self.page[-1], reverse=False)
+
+  def get_previous_link(self):
+    if not self.has_previous:
+      return None
+    if not self.page:
+      return remove_query_param(self.base_url, self.cursor_query_param)
+    return self._link(self.page[0], reverse=True)
+
+  def _link(self, row, reverse):
+    values = [self._value(row, field.lstrip('-')) for field in self.ordering]
+    cursor = encode_cursor({'o': self.ordering, 'v': values, 'r': reverse})
+    return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+  def _value(self, row, name):
+    # Rows can be model instances or dicts from .values()
+    if isinstance(row, dict):
+      return row[name]
+    for part in name.split('__'):
+      row = getattr(row, part, None)
+      if row is None:
+        break
+    return row
+
+  def _column(self, model, field):
+    """
+    (name, descending, nulls_last, nullable) for one ordering entry.
+    Nullable columns always sort their NULLs last so the cursor math stays simple.
+    """
+    name = field.lstrip('-')
+    return (name, field.startswith('-'), True, self._is_nullable(model, name))
+
+  def _is_nullable(self, model, name):
+    for part in name.split('__'):
+      try:
+        field = model._meta.get_field(part)
+      except FieldDoesNotExist:
+        # Annotations and the pk alias
+        return False
+      if field.null:
+        return True
+      model = field.related_model
+    return False
+
+  def _order_by(self, column):
+    name, desc, nulls_last, nullable = column
+    if not nullable:
+      return F(name).desc() if desc else F(name).asc()
+    nulls = {'nulls_last': True} if nulls_last else {'nulls_first': True}
+    return F(name).desc(**nulls) if desc else F(name).asc(**nulls)
+
+  def _strictly_after(self, column, value):
+    name, desc, nulls_last, nullable = column
+    if value is None:
+      # NULLs are either the last group (nothing after) or the first one
+      return None if nulls_last else Q(**{f"{name}__isnull": False})
+    condition = Q(**{f"{name}__lt" if desc else f"{name}__gt": value})
+    if nullable and nulls_last:
+      condition |= Q(**{f"{name}__isnull": True})
+    return condition
+
+  def _equal(self, column, value):
+    name = column[0]
+    if value is None:
+      return Q(**{f"{name}__isnull": True})
+    return Q(**{name: value})
+
+  def _after(self, columns, values):
+    """
+    Row-value comparison `(a, b, c) > (x, y, z)` expanded into ORs, honouring
+    per-column direction and NULL placement.
+    """
+    condition = None
+    prefix = Q()
+    for column, value in zip(columns, values):
+      strict = self._strictly_after(column, value)
+      if strict is not None:
+        term = prefix & strict
+        condition = term if condition is None else condition | term
+      prefix &= self._equal(column, value)
+    return condition
+
+
+class KeysetOrPageNumberPagination(BasePagination):
+  """
+  Keyset pagination by default. Clients that send ?page= keep the old
+  page-number responses (with the COUNT(*) that comes with them).
+  """
+  keyset_class = KeysetPagination
+  page_number_class = CustomPageNumberPagination
+
+  def paginate_queryset(self, queryset, request, view=None):
+    if self.page_number_class.page_query_param in request.query_params:
+      self.paginator = self.page_number_class()
+    else:
+      self.paginator = self.keyset_class()
+    return self.paginator.paginate_queryset(queryset, request, view)
+
+  def get_paginated_response(self, data):
+    return self.paginator.get_paginated_response(data)
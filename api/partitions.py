@@ -0,0 +1,227 @@
+import gzip
+from datetime import date, datetime, time
+from pathlib import Path
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from .models import Transaction, TransactionItem
+
+# Range partitioned by month on datetime_created (see migration 0011).
+# Rows outside every monthly partition land in "<table>_default".
+PARTITIONED_TABLES = (Transaction._meta.db_table, TransactionItem._meta.db_table)
+
+# How many months after the current one create_partitions keeps ready
+PARTITION_MONTHS_AHEAD = getattr(settings, 'PARTITION_MONTHS_AHEAD', 3)
+
+# Where archive_partitions writes (and restores from) its .csv.gz files
+PARTITION_ARCHIVE_DIR = Path(getattr(settings, 'PARTITION_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+def month_start(moment):
+  """
+  The first day of the month of `moment` (a date, or a datetime in the project's time zone).
+  """
+  if isinstance(moment, datetime):
+    moment = timezone.localtime(moment)
+  return date(moment.year, moment.month, 1)
+
+
+def add_months(month, count):
+  index = month.year * 12 + month.month - 1 + count
+  return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_month(value):
+  """
+  'YYYY-MM' -> the first day of that month. Raises ValueError.
+  """
+  return datetime.strptime(value, '%Y-%m').date()
+
+
+def month_bounds(month):
+  """
+  [start, end) of a month, as aware datetimes in the project's time zone.
+  """
+  start = timezone.make_aware(datetime.combine(month, time.min))
+  end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+  return start, end
+
+
+def partition_name(table, month):
+  return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(cursor, table):
+  cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+  return cursor.fetchone() is not None
+
+
+def attached_months(cursor, table):
+  """
+  The months that have a partition attached to `table`.
+  """
+  cursor.execute(
+    """
+    SELECT c.relname FROM pg_inherits AS i
+    JOIN pg_class AS c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+    """,
+    [table],
+  )
+  prefix = f"{table}_p"
+  return {
+    parse_month(name[len(prefix):].replace('_', '-'))
+    for name, in cursor.fetchall() if name.startswith(prefix)
+  }
+
+
+def _default_months(cursor, table):
+  cursor.execute(
+    f"SELECT DISTINCT date_trunc('month', datetime_created AT TIME ZONE %s)::date FROM {table}_default",
+    [settings.TIME_ZONE],
+  )
+  return {month for month, in cursor.fetchall()}
+
+
+def present_months(cursor, table):
+  """
+  The months whose rows are still in `table`: attached partitions plus months
+  sitting in the default partition. None when the table isn't partitioned.
+  """
+  if not is_partitioned(cursor, table):
+    return None
+  return attached_months(cursor, table) | _default_months(cursor, table)
+
+
+def create_partition(cursor, table, month):
+  """
+  Adds the partition of `month` to `table`. It's built as a separate table and
+  attached at the end, so readers of the parent aren't blocked while rows that
+  already landed in the default partition for that month are moved over.
+  """
+  name = partition_name(table, month)
+  start, end = (f"'{moment.isoformat()}'" for moment in month_bounds(month))
+
+  # 1. An empty table with the parent's columns
+  cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+
+  # 2. Take over the month's rows from the default partition (the attach fails otherwise)
+  cursor.execute(
+    f"""
+    WITH moved AS (
+      DELETE FROM {table}_default
+      WHERE datetime_created >= {start} AND datetime_created < {end}
+      RETURNING *
+    )
+    INSERT INTO {name} SELECT * FROM moved
+    """
+  )
+
+  # 3. A CHECK matching the bounds lets the attach skip its validation scan
+  cursor.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK (datetime_created >= {start} AND datetime_created < {end})")
+  cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})")
+  cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range")
+  return name
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD, using=DEFAULT_DB_ALIAS):
+  """
+  Creates the partitions for the current month and the next `months_ahead`,
+  plus one for every month that has rows sitting in the default partition
+  (backdated writes, or months that were never created). Run it regularly
+  (create_partitions); it also runs after migrate. Returns the names created.
+  """
+  current = month_start(timezone.now())
+  wanted = {add_months(current, count) for count in range(months_ahead + 1)}
+  created = []
+
+  with transaction.atomic(using=using), connections[using].cursor() as cursor:
+    for table in PARTITIONED_TABLES:
+      if not is_partitioned(cursor, table):
+        continue
+      months = (wanted | _default_months(cursor, table)) - attached_months(cursor, table)
+      for month in sorted(months):
+        created.append(create_partition(cursor, table, month))
+  return created
+
+
+def _copy_out(cursor, sql, out):
+  raw = cursor.cursor
+  if hasattr(raw, 'copy_expert'):  # psycopg2
+    raw.copy_expert(sql, out)
+    return
+  with raw.copy(sql) as copy:
+    for block in copy:
+      out.write(block)
+
+
+def _copy_in(cursor, sql, source):
+  raw = cursor.cursor
+  if hasattr(raw, 'copy_expert'):  # psycopg2
+    raw.copy_expert(sql, source)
+  else:
+    with raw.copy(sql) as copy:
+      while block := source.read(COPY_BLOCK_SIZE):
+        copy.write(block)
+  return raw.rowcount
+
+
+def archive_path(directory, table, month):
+  return Path(directory) / f"{partition_name(table, month)}.csv.gz"
+
+
+def archive_partitions(before, directory=PARTITION_ARCHIVE_DIR, using=DEFAULT_DB_ALIAS):
+  """
+  Detaches every monthly partition older than `before` (a month), writes it to
+  `directory` as gzipped CSV (with a header row) and drops it. A month's
+  transactions and lines are archived together, in one database transaction.
+  Sales rollups are kept, so reports still cover archived months
+  (backfill_sales_rollups leaves them alone). Returns the files written.
+  """
+  Path(directory).mkdir(parents=True, exist_ok=True)
+  with connections[using].cursor() as cursor:
+    months = set().union(*(attached_months(cursor, table) for table in PARTITIONED_TABLES))
+
+  written = []
+  for month in sorted(month for month in months if month < before):
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+      for table in PARTITIONED_TABLES:
+        if month not in attached_months(cursor, table):
+          continue
+        name = partition_name(table, month)
+        path = archive_path(directory, table, month)
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        with gzip.open(path, 'wb') as out:
+          _copy_out(cursor, f"COPY {name} TO STDOUT (FORMAT csv, HEADER)", out)
+        cursor.execute(f"DROP TABLE {name}")
+        written.append(path)
+  return written
+
+
+def restore_partitions(month, directory=PARTITION_ARCHIVE_DIR, using=DEFAULT_DB_ALIAS):
+  """
+  Loads an archived month back: its partitions are recreated if needed and the
+  rows copied in through the parent. Returns {table: rows restored}.
+  """
+  paths = {table: archive_path(directory, table, month) for table in PARTITIONED_TABLES}
+  paths = {table: path for table, path in paths.items() if path.exists()}
+  if not paths:
+    raise FileNotFoundError(f"No archive for {month:%Y-%m} in {directory}.")
+
+  restored = {}
+  with transaction.atomic(using=using), connections[using].cursor() as cursor:
+    for table, path in paths.items():
+      if month not in attached_months(cursor, table):
+        create_partition(cursor, table, month)
+
+      with gzip.open(path, 'rb') as source:
+        # Columns come from the header, so archives survive columns being added later
+        columns = source.readline().decode().strip().split(',')
+        known = {column.name for column in connections[using].introspection.get_table_description(cursor, table)}
+        unknown = set(columns) - known
+        if unknown:
+          raise ValueError(f"{path.name} has columns {table} doesn't: {', '.join(sorted(unknown))}.")
+        restored[table] = _copy_in(cursor, f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT csv)", source)
+  return restored
@@ -0,0 +1,72 @@
+import math
+from datetime import timedelta
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import TransactionItem
+
+# Days of sales used to estimate demand
+DEFAULT_WINDOW_DAYS = 30
+# Days of demand a reorder should cover on top of the target quantity
+DEFAULT_COVER_DAYS = 14
+
+# Matches the partial index `variant_shortfall_idx`
+SHORTFALL = F('target_quantity') - F('quantity')
+
+
+def below_target(queryset):
+  """
+  Variants under their target quantity, with a `shortfall` annotation.
+  """
+  return queryset.filter(quantity__lt=F('target_quantity')).annotate(shortfall=SHORTFALL)
+
+
+def outbound_volume(variant_ids, window_days=DEFAULT_WINDOW_DAYS):
+  """
+  {variant_id: units sold in the last `window_days`}, in one grouped query.
+  """
+  since = timezone.now() - timedelta(days=window_days)
+  rows = (
+    TransactionItem.objects
+    .filter(
+      item_id__in=variant_ids, transaction__type='sale', quantity_change__lt=0,
+      # Both sides of the join bounded, so only the window's partitions are read
+      datetime_created__gte=since, transaction__datetime_created__gte=since,
+    )
+    .values('item_id')
+    .annotate(units=-Sum('quantity_change'))
+    .values_list('item_id', 'units')
+  )
+  return dict(rows)
+
+
+def suggest_order(quantity, target_quantity, units_sold, window_days=DEFAULT_WINDOW_DAYS, cover_days=DEFAULT_COVER_DAYS):
+  """
+  Enough to get back to the target and to cover `cover_days` of the recent sales rate.
+  """
+  daily = units_sold / window_days if window_days else 0
+  return max(target_quantity - quantity + math.ceil(daily * cover_days), 0)
+
+
+def reorder_rows(variants, window_days=DEFAULT_WINDOW_DAYS, cover_days=DEFAULT_COVER_DAYS):
+  """
+  One report row per variant (from below_target), with the suggested order quantity.
+  """
+  sold = outbound_volume([variant.pk for variant in variants], window_days)
+  rows = []
+  for variant in variants:
+    units = sold.get(variant.pk, 0)
+    rows.append({
+      'id': variant.pk,
+      'sku': variant.sku,
+      'item_name': variant.item.name,
+      'brand_name': variant.item.brand.name if variant.item.brand else None,
+      'attributes': variant.attributes,
+      'price': variant.price,
+      'quantity': variant.quantity,
+      'target_quantity': variant.target_quantity,
+      'shortfall': variant.shortfall,
+      'units_sold': units,
+      'daily_sales': round(units / window_days, 2) if window_days else 0,
+      'suggested_order': suggest_order(variant.quantity, variant.target_quantity, units, window_days, cover_days),
+    })
+  return rows
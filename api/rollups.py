@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import datetime, time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+from .models import SalesRollup, Transaction, TransactionItem
+from .partitions import present_months
+
+GROUPS = ('day', 'week', 'month')
+
+# ?by= -> the rollup column to group on (None = one total per period)
+BY = {
+  'total': None,
+  'variant': 'variant__sku',
+  'brand': 'variant__item__brand__name',
+  'category': 'variant__item__category__name',
+}
+
+MISSING_VALUE = 'N/A'
+
+_TABLE = SalesRollup._meta.db_table
+
+
+def record_rollups(new_transaction, lines, shards=None):
+  """
+  Adds one Transaction's lines to the rollups with a single upsert.
+  `lines` are dicts with `item`, `quantity_change` and the resolved `unit_price_at_sale`.
+  `shards` maps sharded variants to the stock shard the batch changed; their
+  totals go to that shard's rollup row, so concurrent batches on a hot variant
+  don't wait on one row. Everything else is shard 0.
+  Call it inside the transaction that records the lines.
+  """
+  shards = shards or {}
+  totals = defaultdict(lambda: [0, 0, 0, 0])
+  for line in lines:
+    units = abs(line['quantity_change'])
+    total = totals[line['item']]
+    total[0] += units
+    total[1] += line['quantity_change']
+    total[2] += units * line['unit_price_at_sale']
+    total[3] += 1
+
+  # Sorted so concurrent upserts touch the rows in the same order
+  variant_ids = sorted(totals)
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f"""
+      INSERT INTO {_TABLE} (variant_id, day, type, shard, units, net_quantity, revenue, line_count)
+      SELECT r.variant_id, %s, %s, r.shard, r.units, r.net_quantity, r.revenue, r.line_count
+      FROM unnest(%s::bigint[], %s::smallint[], %s::integer[], %s::integer[], %s::numeric[], %s::integer[])
+        AS r(variant_id, shard, units, net_quantity, revenue, line_count)
+      ON CONFLICT (variant_id, day, type, shard) DO UPDATE SET
+        units = {_TABLE}.units + EXCLUDED.units,
+        net_quantity = {_TABLE}.net_quantity + EXCLUDED.net_quantity,
+        revenue = {_TABLE}.revenue + EXCLUDED.revenue,
+        line_count = {_TABLE}.line_count + EXCLUDED.line_count
+      """,
+      [
+        timezone.localdate(new_transaction.datetime_created),
+        new_transaction.type,
+        variant_ids,
+        [shards.get(pk, 0) for pk in variant_ids],
+        [totals[pk][0] for pk in variant_ids],
+        [totals[pk][1] for pk in variant_ids],
+        [totals[pk][2] for pk in variant_ids],
+        [totals[pk][3] for pk in variant_ids],
+      ],
+    )
+
+
+def backfill_rollups(since=None):
+  """
+  Rebuilds the rollups from TransactionItem, for every day from `since` (a date) on,
+  or for all of history. Months whose lines were archived (see api.partitions)
+  can't be rebuilt, so their rollups are left as they are.
+  Writers wait on the table lock until it's done.
+  Returns the number of rollup rows written.
+  """
+  params = [settings.TIME_ZONE]
+  where = "li.item_id IS NOT NULL"
+  if since is not None:
+    where += " AND li.datetime_created >= %s AND t.datetime_created >= %s"
+    since_moment = timezone.make_aware(datetime.combine(since, time.min))
+    params += [since_moment, since_moment]
+
+  with transaction.atomic(), connection.cursor() as cursor:
+    cursor.execute(f"LOCK TABLE {_TABLE} IN EXCLUSIVE MODE")
+    delete, delete_params = [], []
+    if since is not None:
+      delete.append("day >= %s")
+      delete_params.append(since)
+    months = present_months(cursor, TransactionItem._meta.db_table)
+    if months is not None:
+      delete.append("date_trunc('month', day)::date = ANY(%s::date[])")
+      delete_params.append(sorted(months))
+    cursor.execute(f"DELETE FROM {_TABLE} WHERE {' AND '.join(delete) or 'TRUE'}", delete_params)
+
+    cursor.execute(
+      f"""
+      INSERT INTO {_TABLE} (variant_id, day, type, shard, units, net_quantity, revenue, line_count)
+      SELECT
+        li.item_id,
+        (t.datetime_created AT TIME ZONE %s)::date,
+        t.type,
+        0,
+        SUM(ABS(li.quantity_change)),
+        SUM(li.quantity_change),
+        SUM(ABS(li.quantity_change) * li.unit_price_at_sale),
+        COUNT(*)
+      FROM {TransactionItem._meta.db_table} AS li
+      JOIN {Transaction._meta.db_table} AS t ON t.id = li.transaction_id AND t.datetime_created = li.datetime_created
+      WHERE {where}
+      GROUP BY 1, 2, 3
+      """,
+      params,
+    )
+    return cursor.rowcount
+
+
+def sales_report(group='day', by='total', type='sale', start=None, end=None):
+  """
+  Time series of units, revenue and line counts, read from the rollups only.
+  `start` and `end` are inclusive dates.
+  """
+  queryset = SalesRollup.objects.filter(type=type)
+  if start:
+    queryset = queryset.filter(day__gte=start)
+  if end:
+    queryset = queryset.filter(day__lte=end)
+
+  queryset = queryset.annotate(period=Trunc('day', group, output_field=DateField()))
+  fields = ['period']
+  if BY[by]:
+    queryset = queryset.annotate(key=Coalesce(F(BY[by]), Value(MISSING_VALUE)))
+    fields.append('key')
+
+  rows = (
+    queryset.values(*fields)
+    .annotate(units=Sum('units'), net_quantity=Sum('net_quantity'), revenue=Sum('revenue'), lines=Sum('line_count'), variants=Count('variant', distinct=True))
+    .order_by(*fields)
+  )
+  return list(rows)
@@ -0,0 +1,102 @@
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Reads lagging further behind the primary than this go to the primary instead
+REPLICA_MAX_LAG_SECONDS = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5.0)
+# WAL a replica may still have to replay and count as caught up (background writes
+# like checkpoints keep the primary's position moving a little even when it's idle)
+REPLICA_MAX_LAG_BYTES = getattr(settings, 'REPLICA_MAX_LAG_BYTES', 1024 * 1024)
+# Seconds a replica's measured lag is trusted before it's checked again
+REPLICA_LAG_CHECK_INTERVAL = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5.0)
+
+# The alias reads of the current request should use (None = the primary).
+# Set by ReplicaRoutingMiddleware, per request (and per async task).
+read_alias = ContextVar('read_alias', default=None)
+
+# {alias: (lag in seconds or None if unreachable, checked at)}
+_lag = {}
+
+
+def replica_aliases():
+  return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def lag_seconds(recovering, behind, replay_age):
+  """
+  How far a replica's data is behind, from what it reports: whether it's replaying
+  WAL at all, how many bytes of the primary's WAL it hasn't replayed yet, and the
+  age of the last transaction it replayed. A replica that has replayed up to
+  the primary's position is current however old that transaction is (the
+  primary may simply have had no writes); only one that is behind is as stale
+  as the last transaction it applied.
+  """
+  if not recovering:
+    # A plain second database, e.g. in development
+    return 0.0
+  if behind is not None and behind <= REPLICA_MAX_LAG_BYTES:
+    return 0.0
+  return float(replay_age) if replay_age is not None else float('inf')
+
+
+def replica_lag(alias):
+  """
+  Seconds the replica is behind the primary (see lag_seconds), or None if it
+  can't be reached. Measured at most once per REPLICA_LAG_CHECK_INTERVAL.
+  """
+  now = time.monotonic()
+  cached = _lag.get(alias)
+  if cached and now - cached[1] < REPLICA_LAG_CHECK_INTERVAL:
+    return cached[0]
+
+  try:
+    # 1. Where the primary's WAL is now...
+    with connections['default'].cursor() as cursor:
+      cursor.execute("SELECT CASE WHEN pg_is_in_recovery() THEN NULL ELSE pg_current_wal_lsn() END")
+      primary_lsn = cursor.fetchone()[0]
+
+    # 2. ...and how much of it the replica still has to replay
+    with connections[alias].cursor() as cursor:
+      cursor.execute(
+        "SELECT pg_is_in_recovery(), pg_wal_lsn_diff(%s::pg_lsn, pg_last_wal_replay_lsn()), "
+        "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())",
+        [primary_lsn],
+      )
+      lag = lag_seconds(*cursor.fetchone())
+  except DatabaseError:
+    lag = None
+  _lag[alias] = (lag, now)
+  return lag
+
+
+def pick_replica():
+  """
+  A random replica within REPLICA_MAX_LAG_SECONDS, or None to read from the primary.
+  """
+  healthy = [
+    alias for alias in replica_aliases()
+    if (lag := replica_lag(alias)) is not None and lag <= REPLICA_MAX_LAG_SECONDS
+  ]
+  return random.choice(healthy) if healthy else None
+
+
+class ReplicaRouter:
+  """
+  Sends reads to the replica chosen for the current request (if any) and
+  everything else to the primary. Replicas are never migrated; they follow the primary.
+  """
+
+  def db_for_read(self, model, **hints):
+    return read_alias.get()
+
+  def db_for_write(self, model, **hints):
+    return 'default'
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # Every alias holds the same data
+    return True
+
+  def allow_migrate(self, db, app_label, model_name=None, **hints):
+    return db == 'default'
@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Sum
+from django.utils import timezone
+from .models import SaleEvent, SaleFlush
+from .stock import InsufficientStockError, apply_stock_changes
+
+# Flush once this many events are pending...
+FLUSH_BATCH_SIZE = getattr(settings, 'SALES_FLUSH_BATCH_SIZE', 500)
+# ...or once the oldest pending event has waited this many seconds
+FLUSH_MAX_WAIT = getattr(settings, 'SALES_FLUSH_MAX_WAIT', 2.0)
+
+
+def queue_state():
+  """
+  (depth, age of the oldest pending event in seconds)
+  """
+  pending = SaleEvent.objects.filter(status='pending').aggregate(depth=Count('id'), oldest=Min('datetime_received'))
+  if not pending['depth']:
+    return 0, 0.0
+  return pending['depth'], (timezone.now() - pending['oldest']).total_seconds()
+
+
+def should_flush(depth, age, batch_size=FLUSH_BATCH_SIZE, max_wait=FLUSH_MAX_WAIT):
+  return depth >= batch_size or (depth > 0 and age >= max_wait)
+
+
+def _coalesce(events):
+  """
+  Sums the pending events per ItemVariant into one sale line each.
+  The line price is the quantity-weighted average when every event carried one.
+  """
+  groups = OrderedDict()
+  for event in events:
+    group = groups.setdefault(event.item_id, {'quantity': 0, 'revenue': Decimal('0'), 'priced': True})
+    group['quantity'] += event.quantity
+    if event.unit_price_at_sale is None:
+      group['priced'] = False
+    else:
+      group['revenue'] += event.unit_price_at_sale * event.quantity
+
+  lines = []
+  for variant_id, group in groups.items():
+    price = None
+    if group['priced']:
+      price = (group['revenue'] / group['quantity']).quantize(Decimal('0.01'))
+    lines.append({'item': variant_id, 'quantity_change': -group['quantity'], 'unit_price_at_sale': price})
+  return lines
+
+
+def flush_sales(batch_size=FLUSH_BATCH_SIZE):
+  """
+  Applies up to `batch_size` pending events as one 'sale' Transaction.
+
+  Variants that can't cover their coalesced quantity have their events marked
+  as rejected (and kept for review); the rest of the batch is still applied.
+  Returns the SaleFlush record, or None if the queue was empty.
+  """
+  started = time.monotonic()
+
+  with transaction.atomic():
+    # skip_locked lets several flushers drain the queue without blocking each other
+    events = list(
+      SaleEvent.objects.select_for_update(skip_locked=True)
+      .filter(status='pending')
+      .order_by('id')[:batch_size]
+    )
+    if not events:
+      return None
+
+    lines = _coalesce(events)
+    rejected = {}
+    new_transaction = None
+
+    while lines:
+      try:
+        with transaction.atomic():
+          new_transaction, _ = apply_stock_changes('sale', lines)
+        break
+      except InsufficientStockError as e:
+        for error in e.errors:
+          rejected[error['item']] = error['detail']
+        lines = [line for line in lines if line['item'] not in rejected]
+
+    for variant_id, detail in rejected.items():
+      SaleEvent.objects.filter(id__in=[ev.id for ev in events if ev.item_id == variant_id]).update(
+        status='rejected', detail=detail
+      )
+    SaleEvent.objects.filter(id__in=[ev.id for ev in events if ev.item_id not in rejected]).delete()
+
+    oldest = min(ev.datetime_received for ev in events)
+    return SaleFlush.objects.create(
+      transaction=new_transaction,
+      event_count=len(events),
+      line_count=len(lines),
+      rejected_count=sum(1 for ev in events if ev.item_id in rejected),
+      duration_ms=int((time.monotonic() - started) * 1000),
+      max_latency_ms=int((timezone.now() - oldest).total_seconds() * 1000),
+    )
+
+
+def queue_stats(window=timedelta(minutes=15)):
+  """
+  Queue depth and recent flush latency, for tuning the batch size and wait time.
+  """
+  depth, age = queue_state()
+  flushes = SaleFlush.objects.filter(datetime_flushed__gte=timezone.now() - window).aggregate(
+    flushes=Count('id'),
+    events=Sum('event_count'),
+    avg_duration_ms=Avg('duration_ms'),
+    max_duration_ms=Max('duration_ms'),
+    avg_latency_ms=Avg('max_latency_ms'),
+    max_latency_ms=Max('max_latency_ms'),
+  )
+  return {
+    'depth': depth,
+    'oldest_age_seconds': round(age, 3),
+    'rejected': SaleEvent.objects.filter(status='rejected').count(),
+    'batch_size': FLUSH_BATCH_SIZE,
+    'max_wait_seconds': FLUSH_MAX_WAIT,
+    'window_seconds': int(window.total_seconds()),
+    **flushes,
+  }
@@ -0,0 +1,89 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+from .models import ItemVariant
+
+# 'simple' keeps names, brands and SKU parts as typed (no stemming or stop words)
+SEARCH_CONFIG = 'simple'
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Variants per UPDATE when rebuilding the whole index
+REFRESH_BATCH_SIZE = 5000
+
+# Weights: A = item name and SKU, B = brand name, C = attribute values
+_VECTOR_SQL = f"""
+  UPDATE {ItemVariant._meta.db_table} AS v
+  SET search_vector =
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(i.name, '')), 'A') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', v.sku || ' ' || replace(v.sku, '-', ' ')), 'A') ||
+    setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(b.name, '')), 'B') ||
+    setweight(jsonb_to_tsvector('{SEARCH_CONFIG}', v.attributes, '["string", "numeric"]'), 'C')
+  FROM api_item AS i
+  LEFT JOIN api_brand AS b ON b.id = i.brand_id
+  WHERE i.id = v.item_id AND {{where}}
+"""
+
+
+def refresh_search_vectors(variant_ids=None, item_ids=None, brand_ids=None):
+  """
+  Recomputes the search vector of the given variants, of every variant of the
+  given items, or of every variant of the given brands, in one UPDATE.
+  """
+  if variant_ids is not None:
+    where, params = "v.id = ANY(%s)", [list(variant_ids)]
+  elif item_ids is not None:
+    where, params = "v.item_id = ANY(%s)", [list(item_ids)]
+  elif brand_ids is not None:
+    where, params = "i.brand_id = ANY(%s)", [list(brand_ids)]
+  else:
+    raise ValueError("Pass variant_ids, item_ids or brand_ids.")
+  if not params[0]:
+    return 0
+
+  with connection.cursor() as cursor:
+    cursor.execute(_VECTOR_SQL.format(where=where), params)
+    return cursor.rowcount
+
+
+def rebuild_search_vectors(batch_size=REFRESH_BATCH_SIZE):
+  """
+  Recomputes every search vector, walking the table in primary key ranges.
+  """
+  updated, last_id = 0, 0
+  while True:
+    ids = list(
+      ItemVariant.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+      return updated
+    updated += refresh_search_vectors(variant_ids=ids)
+    last_id = ids[-1]
+
+
+def build_query(text):
+  """
+  Every word of `text` must match the start of a token, so "pil g2 bl" finds
+  "Pilot G2 07 (Blue)" while it's being typed. Returns None when there's nothing to search for.
+  """
+  tokens = [token.strip('.') for token in re.findall(r"[\w.]+", text.lower())]
+  tokens = [token for token in tokens if token]
+  if not tokens:
+    return None
+  return SearchQuery(" & ".join(f"'{token}':*" for token in tokens), config=SEARCH_CONFIG, search_type='raw')
+
+
+def search_variants(queryset, text, limit=DEFAULT_LIMIT):
+  """
+  The top `limit` variants matching `text`, best match first, with a `rank` annotation.
+  """
+  query = build_query(text)
+  if query is None:
+    return queryset.none()
+  return (
+    queryset.filter(search_vector=query)
+    .annotate(rank=SearchRank(F('search_vector'), query))
+    .order_by('-rank', 'pk')[:limit]
+  )
@@ -1,6 +1,6 @@
 from .generic import MemoSerializer,CategorySerializer,BrandSerializer
-from .items import ItemSerializer, ItemVariantSerializer
-from .transactions import StockUpdateLineItemSerializer,BulkStockUpdateSerializer,TransactionSerializer
+from .items import ItemSerializer, ItemVariantSerializer, ItemVariantRows, ListingRows, parse_sparse_fields
+from .transactions import StockUpdateLineItemSerializer,BulkStockUpdateSerializer,StockMovementSerializer,TransactionSerializer,CompactTransactionSerializer,SaleEventSerializer
 
 __all__ = [
   'CategorySerializer',
@@ -8,8 +8,14 @@ __all__ = [
   'MemoSerializer',
   'ItemSerializer',
   'ItemVariantSerializer',
+  'ItemVariantRows',
+  'ListingRows',
+  'parse_sparse_fields',
   'StockUpdateLineItemSerializer',
   'BulkStockUpdateSerializer',
+  'StockMovementSerializer',
   'TransactionSerializer',
+  'CompactTransactionSerializer',
+  'SaleEventSerializer',
 
 ]
\ No newline at end of file
@@ -1,5 +1,10 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from ..models import Item, ItemVariant
+from ..cache import catalog_changed
+from ..listings import refresh_listings
+from ..models import Brand, Category, Item, ItemVariant
+from ..search import refresh_search_vectors
+from ..validation import validate_variant_batch
 from .generic import CategorySerializer, BrandSerializer
 
 class ItemSerializer(serializers.ModelSerializer):
@@ -10,7 +15,126 @@ class ItemSerializer(serializers.ModelSerializer):
     model = Item
     fields = '__all__'
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+  """
+  A PrimaryKeyRelatedField that looks values up in `preloaded` ({pk: object})
+  when a list serializer has loaded them all at once, instead of one query each.
+  """
+  preloaded = None
+
+  def to_python_pk(self, data):
+    try:
+      return self.get_queryset().model._meta.pk.to_python(data)
+    except (DjangoValidationError, TypeError):
+      return None
+
+  def to_internal_value(self, data):
+    if self.preloaded is None:
+      return super().to_internal_value(data)
+    pk = None if isinstance(data, bool) else self.to_python_pk(data)
+    if pk is None:
+      self.fail('incorrect_type', data_type=type(data).__name__)
+    if pk not in self.preloaded:
+      self.fail('does_not_exist', pk_value=data)
+    return self.preloaded[pk]
+
+
+class ItemVariantListSerializer(serializers.ListSerializer):
+  """
+  Used for bulk creates (POST a list to /items/).
+  The parent Items are loaded with one query, the attribute schemas of the
+  whole batch are checked in one pass and the rows are written with one
+  bulk_create, so the request costs the same number of queries for any size.
+  """
+
+  def to_internal_value(self, data):
+    # 1. Every parent Item (with what the response shows of it) in one query
+    field = self.child.fields['item']
+    if isinstance(data, list):
+      ids = {field.to_python_pk(row.get('item')) for row in data if isinstance(row, dict)}
+      field.preloaded = Item.objects.select_related('brand', 'category').in_bulk(ids - {None})
+    try:
+      return super().to_internal_value(data)
+    finally:
+      field.preloaded = None
+
+  def validate(self, attrs):
+    failures = {
+      index: {'attributes': errors}
+      for index, errors in validate_variant_batch([
+        (data['item'].category_id, data.get('attributes', {})) for data in attrs
+      ]).items()
+    }
+
+    # 2. SKUs taken already or twice in the batch, checked with one query
+    skus = [
+      ItemVariant.build_sku(data['item'].pk, ItemVariant.normalize_attributes(data.get('attributes', {})))
+      for data in attrs
+    ]
+    taken = set(ItemVariant.objects.filter(sku__in=skus).values_list('sku', flat=True))
+    seen = set()
+    for index, sku in enumerate(skus):
+      if sku in taken or sku in seen:
+        failures.setdefault(index, {})['sku'] = [f"SKU '{sku}' already exists."]
+      seen.add(sku)
+
+    if failures:
+      raise serializers.ValidationError([failures.get(index, {}) for index in range(len(attrs))])
+    return attrs
+
+  def create(self, validated_data):
+    variants = [ItemVariant(**data) for data in validated_data]
+    for variant in variants:
+      variant.assign_sku()
+
+    # 3. bulk_create skips save() and the post_save signals, so refresh what they would
+    created = ItemVariant.objects.bulk_create(variants)
+    variant_ids = [variant.pk for variant in created]
+    refresh_search_vectors(variant_ids=variant_ids)
+    refresh_listings(variant_ids=variant_ids)
+    catalog_changed()
+    return created
+
+# Output keys of an ItemVariant, in response order
+VARIANT_OUTPUT_FIELDS = [
+  'id', 'item', 'sku', 'price', 'quantity', 'target_quantity', 'attributes',
+  'brand_details', 'category_details', 'item_details',
+]
+# ?expand= name -> the nested object it adds
+VARIANT_EXPANSIONS = {'brand': 'brand_details', 'category': 'category_details'}
+
+ITEM_DETAIL_FIELDS = ['item_name', 'category_name', 'brand_name']
+
+
+def parse_sparse_fields(params):
+  """
+  The output keys asked for with ?fields= and ?expand=, or None for the full response.
+  ?fields= picks keys; nested brand/category details are only added when listed
+  there or named in ?expand=. ?expand= alone trims the response to the flat keys
+  plus the expansions.
+  """
+  fields = [name for name in params.get('fields', '').split(',') if name]
+  expand = [name for name in params.get('expand', '').split(',') if name]
+  if not fields and not expand:
+    return None
+
+  errors = {}
+  unknown = set(fields) - set(VARIANT_OUTPUT_FIELDS)
+  if unknown:
+    errors['fields'] = f"Unknown field(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(VARIANT_OUTPUT_FIELDS)}."
+  unknown = set(expand) - set(VARIANT_EXPANSIONS)
+  if unknown:
+    errors['expand'] = f"Unknown expansion(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(VARIANT_EXPANSIONS)}."
+  if errors:
+    raise serializers.ValidationError(errors)
+
+  wanted = set(fields) if fields else set(VARIANT_OUTPUT_FIELDS) - set(VARIANT_EXPANSIONS.values())
+  wanted |= {VARIANT_EXPANSIONS[name] for name in expand}
+  return [name for name in VARIANT_OUTPUT_FIELDS if name in wanted]
+
+
 class ItemVariantSerializer(serializers.ModelSerializer):
+  item = PreloadedPrimaryKeyRelatedField(queryset=Item.objects.all())
   sku = serializers.CharField(read_only=True)
 
   category_name = serializers.CharField(source='item.category.name', read_only=True)
@@ -40,6 +164,19 @@ class ItemVariantSerializer(serializers.ModelSerializer):
       'brand_details',
       'category_details'
     ]
+    list_serializer_class = ItemVariantListSerializer
+
+  def __init__(self, *args, output_fields=None, **kwargs):
+    """
+    `output_fields` (from parse_sparse_fields) limits the response to those keys.
+    """
+    super().__init__(*args, **kwargs)
+    if output_fields is not None:
+      keep = {name for name in output_fields if name != 'item_details'}
+      if 'item_details' in output_fields:
+        keep.update(ITEM_DETAIL_FIELDS)
+      for name in set(self.fields) - keep:
+        self.fields.pop(name)
   
   def validate(self, data):
     """
@@ -49,12 +186,19 @@ class ItemVariantSerializer(serializers.ModelSerializer):
     if self.partial and 'attributes' not in data:
       return data
 
+    # Bulk creates are checked all at once by ItemVariantListSerializer
+    if isinstance(self.parent, serializers.ListSerializer):
+      return data
+
     # Check the model's clean() method (where we wrote the logic earlier)
     # We simulate the instance to run the model validation logic
-    instance = ItemVariant(**data)
+    values = data
+    if self.instance is not None:
+      values = {'item': self.instance.item, 'attributes': self.instance.attributes, **data}
+    instance = ItemVariant(item=values.get('item'), attributes=values.get('attributes', {}))
     try:
       instance.clean()
-    except serializers.ValidationError as e:
+    except DjangoValidationError as e:
       raise serializers.ValidationError(e.message_dict)
     return data
 
@@ -74,11 +218,128 @@ class ItemVariantSerializer(serializers.ModelSerializer):
     structure we used in the ViewSet summary action.
     """
     data = super().to_representation(instance)
+
+    # Historical quantity when the view was asked for ?as_of=
+    if hasattr(instance, 'quantity_as_of') and 'quantity' in data:
+      data['quantity'] = instance.quantity_as_of
     
     # We group the names into a nested object to keep the root clean
-    data['item_details'] = {
-      'name': data.pop('item_name'),
-      'category_name': data.pop('category_name'),
-      'brand_name': data.pop('brand_name'),
-    }
-    return data
\ No newline at end of file
+    if 'item_name' in data:
+      data['item_details'] = {
+        'name': data.pop('item_name', None),
+        'category_name': data.pop('category_name', None),
+        'brand_name': data.pop('brand_name', None),
+      }
+    return data
+
+
+class ItemVariantRows:
+  """
+  The list fast path: builds the same rows as ItemVariantSerializer straight
+  from .values() dicts, without model instances or per-row serializers.
+  Only the columns behind the requested output keys (plus the ordering
+  columns the paginator needs for its cursor) are selected.
+  """
+  BRAND_COLUMNS = {f.name: f"item__brand__{f.attname}" for f in Brand._meta.concrete_fields}
+  CATEGORY_COLUMNS = {f.name: f"item__category__{f.attname}" for f in Category._meta.concrete_fields}
+  COLUMNS = {
+    'id': ['id'],
+    'item': ['item_id'],
+    'sku': ['sku'],
+    'price': ['price'],
+    'quantity': ['quantity'],
+    'target_quantity': ['target_quantity'],
+    'attributes': ['attributes'],
+    'brand_details': list(BRAND_COLUMNS.values()),
+    'category_details': list(CATEGORY_COLUMNS.values()),
+    'item_details': ['item__name', 'item__category__name', 'item__brand__name'],
+  }
+  ID_COLUMN = 'id'
+  # item_details key -> column
+  ITEM_DETAIL_COLUMNS = {'name': 'item__name', 'category_name': 'item__category__name', 'brand_name': 'item__brand__name'}
+
+  def __init__(self, output_fields=None, quantity='quantity'):
+    self.output_fields = output_fields or VARIANT_OUTPUT_FIELDS
+    self.quantity = quantity
+    price_field = ItemVariant._meta.get_field('price')
+    self.price = serializers.DecimalField(max_digits=price_field.max_digits, decimal_places=price_field.decimal_places)
+
+  def values(self, queryset):
+    columns = {column for name in self.output_fields for column in self.COLUMNS[name]}
+    if 'quantity' in self.output_fields:
+      columns.discard('quantity')
+      columns.add(self.quantity)
+    ordering = [field.lstrip('-') for field in queryset.query.order_by if isinstance(field, str)]
+    columns.update(ordering, ['pk'])
+    return queryset.values(*sorted(columns))
+
+  def _nested(self, row, columns):
+    if row[columns['id']] is None:
+      return None
+    return {name: row[column] for name, column in columns.items()}
+
+  def brand_details(self, row):
+    return self._nested(row, self.BRAND_COLUMNS)
+
+  def category_details(self, row):
+    return self._nested(row, self.CATEGORY_COLUMNS)
+
+  def build(self, rows):
+    fields = self.output_fields
+    result = []
+    for row in rows:
+      data = {}
+      for name in fields:
+        if name == 'id':
+          data['id'] = row[self.ID_COLUMN]
+        elif name == 'item':
+          data['item'] = row['item_id']
+        elif name == 'price':
+          data['price'] = self.price.to_representation(row['price'])
+        elif name == 'quantity':
+          data['quantity'] = row[self.quantity]
+        elif name == 'brand_details':
+          data['brand_details'] = self.brand_details(row)
+        elif name == 'category_details':
+          data['category_details'] = self.category_details(row)
+        elif name == 'item_details':
+          data['item_details'] = {key: row[column] for key, column in self.ITEM_DETAIL_COLUMNS.items()}
+        else:
+          data[name] = row[name]
+      result.append(data)
+    return result
+
+class ListingRows(ItemVariantRows):
+  """
+  ItemVariantRows read from the flattened VariantListing table. Brand and
+  category details are filled in from one primary key lookup each per page.
+  """
+  COLUMNS = {
+    **ItemVariantRows.COLUMNS,
+    'id': ['variant_id'],
+    'brand_details': ['brand_id'],
+    'category_details': ['category_id'],
+    'item_details': ['item_name', 'category_name', 'brand_name'],
+  }
+  ID_COLUMN = 'variant_id'
+  ITEM_DETAIL_COLUMNS = {'name': 'item_name', 'category_name': 'category_name', 'brand_name': 'brand_name'}
+
+  def _details(self, model, ids):
+    fields = model._meta.concrete_fields
+    rows = model.objects.filter(pk__in=ids).values(*[field.attname for field in fields])
+    return {row[model._meta.pk.attname]: {field.name: row[field.attname] for field in fields} for row in rows}
+
+  def brand_details(self, row):
+    return self.brands.get(row['brand_id'])
+
+  def category_details(self, row):
+    return self.categories.get(row['category_id'])
+
+  def build(self, rows):
+    rows = list(rows)
+    self.brands, self.categories = {}, {}
+    if 'brand_details' in self.output_fields:
+      self.brands = self._details(Brand, {row['brand_id'] for row in rows if row['brand_id'] is not None})
+    if 'category_details' in self.output_fields:
+      self.categories = self._details(Category, {row['category_id'] for row in rows if row['category_id'] is not None})
+    return super().build(rows)
@@ -1,10 +1,12 @@
-from ..models import Item, Transaction, TransactionItem
+from ..models import Transaction, TransactionItem, SaleEvent
 from ..serializers import ItemSerializer
 from rest_framework import serializers
 
 # 1. This new serializer validates one line item (associative model of Transaction)
 class StockUpdateLineItemSerializer(serializers.Serializer):
-  item = serializers.PrimaryKeyRelatedField(queryset=Item.objects.all())
+  # ItemVariant id. Existence is checked for the whole batch when the rows are locked,
+  # instead of one lookup per line here.
+  item = serializers.IntegerField(min_value=1)
   quantity_change = serializers.IntegerField()
   unit_price_at_sale = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
@@ -25,7 +27,7 @@ class BulkStockUpdateSerializer(serializers.Serializer):
       raise serializers.ValidationError("Line items list cannot be empty.")
     
     # Check for duplicate items in the same request
-    item_ids = [item_data['item'].id for item_data in value]
+    item_ids = [item_data['item'] for item_data in value]
     if len(item_ids) != len(set(item_ids)):
       raise serializers.ValidationError("Duplicate items found in the request.")
     return value
@@ -33,15 +35,60 @@ class BulkStockUpdateSerializer(serializers.Serializer):
 
 
 class TransactionItemSerializer(serializers.ModelSerializer):
-  item = ItemSerializer(read_only=True)
+  # The line points at an ItemVariant; the nested details are its parent Item
+  variant = serializers.PrimaryKeyRelatedField(source='item', read_only=True)
+  sku = serializers.CharField(source='item.sku', read_only=True)
+  item = ItemSerializer(source='item.item', read_only=True)
   
   class Meta:
     model = TransactionItem
-    fields = ['id', 'quantity_change', 'unit_price_at_sale', 'item']
+    fields = ['id', 'quantity_change', 'unit_price_at_sale', 'variant', 'sku', 'item']
+
+class StockMovementSerializer(serializers.ModelSerializer):
+  """
+  One line of a variant's history, with the quantity after it (see api.history).
+  """
+  type = serializers.CharField(read_only=True)
+  balance = serializers.IntegerField(read_only=True)
+
+  class Meta:
+    model = TransactionItem
+    fields = ['id', 'transaction', 'type', 'datetime_created', 'quantity_change', 'unit_price_at_sale', 'balance']
 
 class TransactionSerializer(serializers.ModelSerializer):
   transaction_items = TransactionItemSerializer(many=True, source='line_items')
 
   class Meta:
     model = Transaction
-    fields = ['id', 'type', 'datetime_created', 'transaction_items']
\ No newline at end of file
+    fields = ['id', 'type', 'datetime_created', 'transaction_items']
+
+
+class CompactTransactionItemSerializer(serializers.ModelSerializer):
+  sku = serializers.CharField(source='item.sku', read_only=True)
+  name = serializers.CharField(source='item.item.name', read_only=True)
+
+  class Meta:
+    model = TransactionItem
+    fields = ['sku', 'name', 'quantity_change', 'unit_price_at_sale']
+
+class CompactTransactionSerializer(serializers.ModelSerializer):
+  """
+  Flat line rows without any nested Item/Brand/Category objects (?view=compact).
+  """
+  transaction_items = CompactTransactionItemSerializer(many=True, source='line_items')
+
+  class Meta:
+    model = Transaction
+    fields = ['id', 'type', 'datetime_created', 'transaction_items']
+
+
+class SaleEventSerializer(serializers.ModelSerializer):
+  """
+  One POS sale for the write-behind queue. `item` is the ItemVariant id.
+  """
+  item = serializers.IntegerField(min_value=1)
+  quantity = serializers.IntegerField(min_value=1)
+
+  class Meta:
+    model = SaleEvent
+    fields = ['item', 'quantity', 'unit_price_at_sale']
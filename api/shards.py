@@ -0,0 +1,230 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from .cache import catalog_changed
+from .listings import set_listing_quantities
+from .models import ItemVariant, StockShard
+
+# Sharded stock: a hot variant's quantity split across StockShard rows.
+# A batch only takes a key-share lock on a sharded variant (which other batches
+# don't wait on) and moves its change onto one random shard it can lock without
+# waiting; its sales rollup row is keyed by that shard too (see rollups.py), so
+# batches that skip each other's shard share no rows at all.
+# The batch then folds its variants' shard sums back into ItemVariant.quantity
+# and the listing in its own transaction, skipping a variant whose row another
+# batch's fold holds; that batch can't have seen this one's change, so the
+# skipped fold runs again right after commit (waiting for the holder), out of
+# any transaction another batch could wait on.
+
+MAX_SHARDS = getattr(settings, 'STOCK_MAX_SHARDS', 64)
+
+_TABLE = StockShard._meta.db_table
+_VARIANTS = ItemVariant._meta.db_table
+
+
+def live_quantity(variant='pk'):
+  """
+  The variant's quantity as of the current statement: the sum of its shards,
+  or its own column when it isn't sharded. `variant` is the outer reference.
+  """
+  total = (
+    StockShard.objects.filter(variant=OuterRef(variant))
+    .order_by().values('variant').annotate(total=Sum('quantity')).values('total')
+  )
+  return Coalesce(Subquery(total), F('quantity'))
+
+
+def _take_from_random_shard(cursor, variant_id, change):
+  # One random shard that can take the whole change, skipping the ones other batches hold.
+  # Returns its number, or None.
+  cursor.execute(
+    f"""
+    UPDATE {_TABLE} SET quantity = quantity + %s
+    WHERE id = (
+      SELECT id FROM {_TABLE}
+      WHERE variant_id = %s AND quantity + %s >= 0
+      ORDER BY random() LIMIT 1
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING shard
+    """,
+    [change, variant_id, change],
+  )
+  row = cursor.fetchone()
+  return row[0] if row else None
+
+
+def _spread_over_shards(cursor, variant_id, change):
+  """
+  Locks every shard of the variant (waiting for them) and spreads the change,
+  fullest shards first. Returns the number of the first shard changed, or None
+  if the shards can't cover the change.
+  """
+  cursor.execute(f"SELECT id, shard, quantity FROM {_TABLE} WHERE variant_id = %s ORDER BY shard FOR UPDATE", [variant_id])
+  shards = cursor.fetchall()
+  total = sum(quantity for _, _, quantity in shards)
+  if total + change < 0:
+    return None
+
+  new = {}
+  if change >= 0:
+    shard_id, first, quantity = min(shards, key=lambda shard: shard[2])
+    new[shard_id] = quantity + change
+  else:
+    remaining = -change
+    first = None
+    for shard_id, number, quantity in sorted(shards, key=lambda shard: -shard[2]):
+      if not remaining:
+        break
+      taken = min(quantity, remaining)
+      new[shard_id] = quantity - taken
+      remaining -= taken
+      first = number if first is None else first
+
+  cursor.execute(
+    f"""
+    UPDATE {_TABLE} AS s SET quantity = n.quantity
+    FROM unnest(%s::bigint[], %s::integer[]) AS n(id, quantity)
+    WHERE s.id = n.id
+    """,
+    [list(new), list(new.values())],
+  )
+  return first
+
+
+def apply_shard_changes(lines):
+  """
+  Applies the stock lines of sharded variants (same dicts as apply_stock_changes).
+  Each variant's net change goes onto one random shard that can take it; only
+  when none can (or all are busy) are its shards locked and the change spread.
+  Call it inside the batch's transaction. Returns ({variant_id: new quantity},
+  {variant_id: shard taken}, errors); on errors the caller must roll back.
+  ItemVariant.quantity isn't touched (see fold_shards).
+  """
+  changes = defaultdict(int)
+  for line in lines:
+    changes[line['item']] += line['quantity_change']
+
+  taken = {}
+  errors = []
+  with connection.cursor() as cursor:
+    # Variant order, so two batches that both fall back to locking every shard can't deadlock
+    for variant_id in sorted(changes):
+      change = changes[variant_id]
+      shard = _take_from_random_shard(cursor, variant_id, change)
+      if shard is None:
+        shard = _spread_over_shards(cursor, variant_id, change)
+      if shard is not None:
+        taken[variant_id] = shard
+      else:
+        cursor.execute(f"SELECT COALESCE(SUM(quantity), 0) FROM {_TABLE} WHERE variant_id = %s", [variant_id])
+        errors.append({
+          'item': variant_id,
+          'detail': "Not enough stock.",
+          'available': cursor.fetchone()[0],
+          'requested': -change,
+        })
+    if errors or not changes:
+      return {}, {}, errors
+
+    cursor.execute(
+      f"SELECT variant_id, SUM(quantity) FROM {_TABLE} WHERE variant_id = ANY(%s) GROUP BY variant_id",
+      [sorted(changes)],
+    )
+    quantities = dict(cursor.fetchall())
+
+  skipped = set(changes) - _fold(sorted(changes), skip_locked=True)[0]
+  if skipped:
+    transaction.on_commit(lambda: fold_shards(sorted(skipped)))
+  return quantities, taken, errors
+
+
+def fold_shards(variant_ids=None):
+  """
+  Sets ItemVariant.quantity (and the listing's) to the sum of the shards, for
+  the given variants or every sharded one, in a short transaction of its own.
+  Batches fold their own variants; this is for after a batch's fold was
+  skipped, and for repairs (fold_stock_shards).
+  Returns {variant_id: quantity} for the rows changed.
+  """
+  if variant_ids is not None and not variant_ids:
+    return {}
+  return _fold(variant_ids)[1]
+
+
+def _fold(variant_ids, skip_locked=False):
+  """
+  The variant rows are locked first so the sum is read (by the next statement)
+  after any fold ahead of it commits; the lock doesn't conflict with the
+  batches' key-share locks. Returns (ids locked, {variant_id: quantity changed}).
+  """
+  where, params = "shard_count > 0", []
+  if variant_ids is not None:
+    where, params = "id = ANY(%s) AND shard_count > 0", [list(variant_ids)]
+  skip = " SKIP LOCKED" if skip_locked else ""
+  with transaction.atomic(), connection.cursor() as cursor:
+    cursor.execute(f"SELECT id FROM {_VARIANTS} WHERE {where} ORDER BY id FOR NO KEY UPDATE{skip}", params)
+    locked = [pk for pk, in cursor.fetchall()]
+    if not locked:
+      return set(), {}
+    cursor.execute(
+      f"""
+      UPDATE {_VARIANTS} AS v SET quantity = s.total
+      FROM (
+        SELECT variant_id, SUM(quantity) AS total FROM {_TABLE}
+        WHERE variant_id = ANY(%s) GROUP BY variant_id
+      ) AS s
+      WHERE v.id = s.variant_id AND v.quantity <> s.total
+      RETURNING v.id, v.quantity
+      """,
+      [locked],
+    )
+    quantities = dict(cursor.fetchall())
+    if quantities:
+      set_listing_quantities(quantities)
+      catalog_changed()
+  return set(locked), quantities
+
+
+def rebalance_shards(variant_id, shards=None):
+  """
+  Spreads a variant's stock evenly over `shards` counter rows (its current
+  shard count when None); 0 turns sharding off and keeps the stock on the
+  variant row. Waits for in-flight batches on the variant and holds new ones
+  until it commits. Returns the variant's quantity.
+  """
+  if shards is not None and not 0 <= shards <= MAX_SHARDS:
+    raise ValueError(f"shards must be between 0 and {MAX_SHARDS}.")
+
+  with transaction.atomic():
+    # 1. FOR UPDATE conflicts with the batches' key-share lock
+    variant = ItemVariant.objects.select_for_update().only('quantity', 'shard_count').get(pk=variant_id)
+    quantity = variant.quantity
+    if variant.shard_count:
+      quantity = StockShard.objects.filter(variant_id=variant_id).aggregate(total=Coalesce(Sum('quantity'), 0))['total']
+    count = variant.shard_count if shards is None else shards
+
+    # 2. Rewrite the shards with the stock split evenly
+    StockShard.objects.filter(variant_id=variant_id).delete()
+    if count:
+      base, extra = divmod(quantity, count)
+      StockShard.objects.bulk_create([
+        StockShard(variant_id=variant_id, shard=shard, quantity=base + (shard < extra))
+        for shard in range(count)
+      ])
+
+    # 3. The variant row keeps the total either way
+    ItemVariant.objects.filter(pk=variant_id).update(quantity=quantity, shard_count=count)
+    set_listing_quantities({variant_id: quantity})
+    catalog_changed()
+  return quantity
+
+
+def rebalance_all():
+  """
+  Rebalances every sharded variant, one transaction each. Returns {variant_id: quantity}.
+  """
+  variant_ids = ItemVariant.objects.filter(shard_count__gt=0).order_by('pk').values_list('pk', flat=True)
+  return {variant_id: rebalance_shards(variant_id) for variant_id in variant_ids}
@@ -1,14 +1,116 @@
-from django.db.models.signals import post_migrate
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, post_save, post_delete
 from django.dispatch import receiver
 from . import startup
+from .models import Brand, Category, Item, ItemVariant
+from .cache import catalog_changed
+from .listings import refresh_listings
+from .metrics import install_sql_observer
+from .partitions import ensure_partitions
+from .search import refresh_search_vectors
+from .validation import schema_registry
 
 # The @receiver decorator connects our function to the signal
 @receiver(post_migrate)
-def run_after_migrations(sender, **kwargs):
+def run_after_migrations(sender, using=DEFAULT_DB_ALIAS, **kwargs):
   """
   This function is called after migrations are applied.
   """
   # We use 'sender.name' to ensure this only runs 
   # when the migrations for *this* app ('core') are applied.
   if sender.name == 'api':
-    startup.create_or_get_category()
\ No newline at end of file
+    startup.create_or_get_category()
+    if connections[using].vendor == 'postgresql':
+      ensure_partitions(using=using)
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_schema(sender, instance, **kwargs):
+  """
+  Swap in the new attribute schema for this process as soon as a Category is saved.
+  """
+  schema_registry.register(instance.pk, instance.schema_version, instance.attribute_schema)
+
+
+@receiver(post_delete, sender=Category)
+def drop_category_schema(sender, instance, **kwargs):
+  schema_registry.invalidate(instance.pk)
+
+
+# --- SEARCH VECTORS ---
+# Keep ItemVariant.search_vector in step with the text it's built from
+
+@receiver(post_save, sender=ItemVariant)
+def refresh_variant_search(sender, instance, raw=False, **kwargs):
+  if not raw:
+    refresh_search_vectors(variant_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Item)
+def refresh_item_search(sender, instance, created=False, raw=False, **kwargs):
+  # A new item has no variants yet
+  if not raw and not created:
+    refresh_search_vectors(item_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+def refresh_brand_search(sender, instance, created=False, raw=False, **kwargs):
+  if not raw and not created:
+    refresh_search_vectors(brand_ids=[instance.pk])
+
+
+# --- VARIANT LISTINGS ---
+# Keep the flattened VariantListing rows in step with the four source models.
+# Deleted variants and items take their rows with them (CASCADE).
+
+@receiver(post_save, sender=ItemVariant)
+def refresh_variant_listing(sender, instance, raw=False, **kwargs):
+  if not raw:
+    refresh_listings(variant_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Item)
+def refresh_item_listings(sender, instance, created=False, raw=False, **kwargs):
+  if not raw and not created:
+    refresh_listings(item_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def refresh_brand_listings(sender, instance, created=False, raw=False, **kwargs):
+  if not raw and not created:
+    refresh_listings(brand_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_listings(sender, instance, created=False, raw=False, **kwargs):
+  if not raw and not created:
+    refresh_listings(category_ids=[instance.pk])
+
+
+# --- CATALOG CACHE ---
+# Any change to the catalog invalidates the cached list/retrieve responses
+
+@receiver(post_save, sender=ItemVariant)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=ItemVariant)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def bump_catalog_cache(sender, raw=False, **kwargs):
+  if not raw:
+    catalog_changed()
+
+
+# --- METRICS ---
+
+@receiver(connection_created)
+def observe_sql(sender, connection, **kwargs):
+  """
+  Counts and times every query of a request (see metrics.py).
+  """
+  install_sql_observer(connection)
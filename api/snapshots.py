@@ -0,0 +1,65 @@
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from .models import ItemVariant, StockShard, StockSnapshot, TransactionItem
+from .shards import live_quantity
+
+
+def take_snapshot():
+  """
+  Copies the current quantity of every variant into StockSnapshot in one statement.
+  Sharded variants are read from their shards (see shards.py).
+  Returns the number of snapshot rows written.
+
+  `taken_at` has to split the ledger exactly: every line stamped before it is in
+  the quantities, none stamped after. Stock writers change quantities before
+  they stamp their Transaction, so the tables are locked against writes first,
+  which waits for the writers in flight and holds new ones until the snapshot
+  commits, and the time is read by the INSERT itself, after the lock is granted.
+  (This relies on the app servers' clocks agreeing with the database's.)
+  """
+  with transaction.atomic(), connection.cursor() as cursor:
+    # 1. SHARE conflicts with the row writes of apply_stock_changes, not with readers
+    cursor.execute(f"LOCK TABLE {ItemVariant._meta.db_table}, {StockShard._meta.db_table} IN SHARE MODE")
+
+    # 2. statement_timestamp(): now() would be the start of this transaction, before the wait
+    cursor.execute(
+      f"INSERT INTO {StockSnapshot._meta.db_table} (variant_id, quantity, taken_at) "
+      f"SELECT v.id, COALESCE(s.total, v.quantity), statement_timestamp() FROM {ItemVariant._meta.db_table} AS v "
+      f"LEFT JOIN (SELECT variant_id, SUM(quantity) AS total FROM {StockShard._meta.db_table} GROUP BY variant_id) AS s "
+      f"ON s.variant_id = v.id"
+    )
+    return cursor.rowcount
+
+
+def _ledger_delta(after, until=None):
+  """
+  Sum of the variant's TransactionItem changes with after < datetime_created <= until.
+  """
+  # Filtering on the line's own timestamp (the partition key) skips older partitions
+  lines = TransactionItem.objects.filter(item=OuterRef('pk'), datetime_created__gt=after)
+  if until is not None:
+    lines = lines.filter(datetime_created__lte=until)
+  total = lines.order_by().values('item').annotate(total=Sum('quantity_change')).values('total')
+  return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def annotate_quantity_as_of(queryset, as_of, name='quantity_as_of'):
+  """
+  Annotates each variant with its quantity at `as_of`:
+  the latest snapshot taken at or before `as_of` plus the ledger delta since then.
+  Variants without such a snapshot are walked back from the live quantity instead
+  (a sharded variant's shard sum, which already includes every committed line).
+  """
+  snapshots = StockSnapshot.objects.filter(variant=OuterRef('pk'), taken_at__lte=as_of).order_by('-taken_at')
+
+  return queryset.alias(
+    snapshot_at=Subquery(snapshots.values('taken_at')[:1]),
+    snapshot_quantity=Subquery(snapshots.values('quantity')[:1]),
+  ).annotate(**{
+    name: Case(
+      When(snapshot_at__isnull=False, then=F('snapshot_quantity') + _ledger_delta(OuterRef('snapshot_at'), as_of)),
+      default=live_quantity() - _ledger_delta(as_of),
+      output_field=IntegerField(),
+    )
+  })
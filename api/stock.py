@@ -0,0 +1,141 @@
+from django.db import connection, transaction
+from .cache import catalog_changed
+from .listings import set_listing_quantities
+from .models import ItemVariant, Transaction, TransactionItem
+from .rollups import record_rollups
+from .shards import apply_shard_changes
+
+# TransactionItem rows per INSERT when recording large batches
+LINE_BATCH_SIZE = 1000
+
+
+class InsufficientStockError(ValueError):
+  """
+  Raised when one or more lines of a batch can't be applied.
+  `errors` lists every failing line, not just the first one.
+  """
+
+  def __init__(self, errors):
+    self.errors = errors
+    super().__init__(f"{len(errors)} line(s) could not be applied.")
+
+
+def _lock_variants(variant_ids):
+  """
+  Locks the variants in primary key order (so concurrent batches can't deadlock)
+  and returns {id: (quantity, price, shard_count)}. Sharded variants only get a
+  key-share lock, which concurrent batches don't wait on (see shards.py).
+  """
+  table = ItemVariant._meta.db_table
+  sharded = set(ItemVariant.objects.filter(pk__in=variant_ids, shard_count__gt=0).values_list('pk', flat=True))
+  plain = [pk for pk in variant_ids if pk not in sharded]
+
+  current = {}
+  with connection.cursor() as cursor:
+    for ids, mode in ((plain, 'UPDATE'), (sorted(sharded), 'KEY SHARE')):
+      if not ids:
+        continue
+      cursor.execute(
+        f"SELECT id, quantity, price, shard_count FROM {table} WHERE id = ANY(%s) ORDER BY id FOR {mode}",
+        [ids],
+      )
+      current.update((pk, (quantity, price, shard_count)) for pk, quantity, price, shard_count in cursor.fetchall())
+  return current
+
+
+def _check_lines(lines, current):
+  errors = []
+  for line in lines:
+    variant_id, change = line['item'], line['quantity_change']
+    if variant_id not in current:
+      errors.append({'item': variant_id, 'detail': "Item variant does not exist."})
+    elif current[variant_id][0] + change < 0:
+      errors.append({
+        'item': variant_id,
+        'detail': "Not enough stock.",
+        'available': current[variant_id][0],
+        'requested': -change,
+      })
+  return errors
+
+
+def _apply_deltas(lines):
+  """
+  One set-based UPDATE for the whole batch. Returns {id: new_quantity} for the rows it changed.
+  """
+  table = ItemVariant._meta.db_table
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f"""
+      UPDATE {table} AS v
+      SET quantity = v.quantity + delta.change
+      FROM unnest(%s::bigint[], %s::integer[]) AS delta(id, change)
+      WHERE v.id = delta.id AND v.quantity + delta.change >= 0
+      RETURNING v.id, v.quantity
+      """,
+      [[line['item'] for line in lines], [line['quantity_change'] for line in lines]],
+    )
+    return dict(cursor.fetchall())
+
+
+def _unit_price(line, current):
+  price = line.get('unit_price_at_sale')
+  return current[line['item']][1] if price is None else price
+
+
+def apply_stock_changes(type, lines):
+  """
+  Applies a batch of stock changes and records it as one Transaction.
+
+  `lines` is a list of dicts with `item` (ItemVariant id), `quantity_change`
+  and an optional `unit_price_at_sale` (defaults to the variant's price).
+  Raises InsufficientStockError, with every failing line, if any line would
+  take a variant below zero; nothing is written in that case.
+  Lines of sharded variants go to their StockShard rows (see shards.py).
+  Returns (transaction, {variant_id: new_quantity}).
+  """
+  variant_ids = sorted({line['item'] for line in lines})
+
+  with transaction.atomic():
+    # 1. Lock and read the current stock. The locked rows decide which variants are
+    # sharded: rebalance_shards can't change that while the locks are held.
+    current = _lock_variants(variant_ids)
+    sharded = {pk for pk, row in current.items() if row[2]}
+    plain_lines = [line for line in lines if line['item'] not in sharded]
+    errors = _check_lines(plain_lines, current)
+    shard_quantities, shards_taken, shard_errors = apply_shard_changes([line for line in lines if line['item'] in sharded])
+    errors += shard_errors
+    if errors:
+      raise InsufficientStockError(errors)
+
+    # 2. Apply every other delta in a single statement
+    plain_ids = {line['item'] for line in plain_lines}
+    quantities = _apply_deltas(plain_lines) if plain_lines else {}
+    if len(quantities) != len(plain_ids):
+      missed = plain_ids - set(quantities)
+      raise InsufficientStockError([{'item': pk, 'detail': "Not enough stock."} for pk in sorted(missed)])
+    set_listing_quantities(quantities)
+    quantities.update(shard_quantities)
+
+    # 3. Record the audit trail
+    lines = [{**line, 'unit_price_at_sale': _unit_price(line, current)} for line in lines]
+    new_transaction = Transaction.objects.create(type=type)
+    TransactionItem.objects.bulk_create(
+      [
+        TransactionItem(
+          transaction=new_transaction,
+          item_id=line['item'],
+          quantity_change=line['quantity_change'],
+          unit_price_at_sale=line['unit_price_at_sale'],
+          datetime_created=new_transaction.datetime_created,
+        )
+        for line in lines
+      ],
+      batch_size=LINE_BATCH_SIZE,
+    )
+    record_rollups(new_transaction, lines, shards=shards_taken)
+
+    # 4. Cached catalog responses show quantities, so they're stale once this commits
+    catalog_changed()
+
+  return new_transaction, quantities
@@ -0,0 +1,179 @@
+from decimal import Decimal
+from django.db.models import CharField, Count, DecimalField, F, Sum, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce
+
+# Summary path keys that live on the parent Item instead of the attributes JSON
+RELATED_KEYS = {
+  'name': 'item__name',
+  'brand_name': 'item__brand__name',
+  'category_name': 'item__category__name',
+}
+# The same keys on the flattened VariantListing table
+LISTING_KEYS = {
+  'name': 'item_name',
+  'brand_name': 'brand_name',
+  'category_name': 'category_name',
+}
+
+# Value used for a group when the variant has no value for that key
+MISSING_VALUE = 'N/A'
+
+# Columns copied as-is into each leaf row (id, name and quantity are resolved separately)
+LEAF_FIELDS = ['sku', 'price', 'target_quantity', 'attributes']
+
+
+def group_expressions(keys, related_keys=RELATED_KEYS):
+  """
+  Maps each summary path key to a SQL expression, aliased as level_0, level_1...
+  Known keys read the joined columns, anything else is pulled out of `attributes`.
+  """
+  expressions = {}
+  for depth, key in enumerate(keys):
+    if key in related_keys:
+      source = F(related_keys[key])
+    else:
+      source = KeyTextTransform(key, 'attributes')
+    expressions[f'level_{depth}'] = Coalesce(source, Value(MISSING_VALUE), output_field=CharField())
+  return expressions
+
+
+class SummaryTreeBuilder:
+  """
+  Builds the nested summary in a single pass over rows sorted by the path keys.
+  Every node carries the count, quantity total and stock value of everything under it.
+  """
+
+  def __init__(self, keys, leaves=False):
+    self.keys = keys
+    self.leaves = leaves
+    self.root = self._new_node(0)
+    self.root['path'] = list(keys)
+    self._stack = []
+    self._leaf_nodes = {}
+
+  def _new_node(self, depth):
+    node = {'count': 0, 'total_quantity': 0, 'stock_value': Decimal('0')}
+    if depth < len(self.keys):
+      node['children'] = {}
+    elif self.leaves:
+      node['items'] = []
+    return node
+
+  def add_group(self, values, count, quantity, value):
+    """
+    Adds one GROUP BY row. `values` holds the group value for each level of the path.
+    """
+    # 1. Keep the part of the current branch we share with this row
+    shared = 0
+    while shared < len(self._stack) and self._stack[shared][0] == values[shared]:
+      shared += 1
+    del self._stack[shared:]
+
+    # 2. Open the nodes for the rest of the path
+    parent = self._stack[-1][1] if self._stack else self.root
+    for depth in range(shared, len(values)):
+      node = parent['children'].setdefault(values[depth], self._new_node(depth + 1))
+      self._stack.append((values[depth], node))
+      parent = node
+
+    self._leaf_nodes[tuple(values)] = parent
+
+    # 3. Roll the totals up the branch
+    for node in [self.root] + [node for _, node in self._stack]:
+      node['count'] += count
+      node['total_quantity'] += quantity or 0
+      node['stock_value'] += value or 0
+
+  def add_leaf(self, values, leaf):
+    node = self._leaf_nodes.get(tuple(values))
+    if node is not None:
+      node['items'].append(leaf)
+
+  @property
+  def result(self):
+    return self.root
+
+
+def summary_rows(queryset, keys, quantity='quantity', related_keys=RELATED_KEYS):
+  """
+  The grouped aggregate query, sorted by the path so the tree can be streamed.
+  """
+  groups = group_expressions(keys, related_keys)
+  aliases = list(groups)
+  return (
+    queryset.order_by()
+    .annotate(**groups)
+    .values(*aliases)
+    .annotate(
+      variant_count=Count('pk'),
+      total_quantity=Sum(quantity),
+      stock_value=Sum(F('price') * F(quantity), output_field=DecimalField(max_digits=20, decimal_places=2)),
+    )
+    .order_by(*aliases)
+  )
+
+
+def leaf_rows(queryset, keys, quantity='quantity', related_keys=RELATED_KEYS):
+  """
+  The individual variants under each leaf group, in the same order as summary_rows.
+  """
+  groups = group_expressions(keys, related_keys)
+  aliases = list(groups)
+  return (
+    queryset.order_by()
+    .annotate(**groups, leaf_id=F('pk'), leaf_name=F(related_keys['name']), leaf_quantity=F(quantity))
+    .values(*aliases, 'leaf_id', *LEAF_FIELDS, 'leaf_name', 'leaf_quantity')
+    .order_by(*aliases, 'pk')
+  )
+
+
+def _leaf_from_row(row, depth):
+  leaf = {'id': row['leaf_id'], **{field: row[field] for field in LEAF_FIELDS}}
+  leaf['name'] = row['leaf_name']
+  leaf['quantity'] = row['leaf_quantity']
+  return [row[f'level_{i}'] for i in range(depth)], leaf
+
+
+def build_summary(queryset, keys, leaves=False, quantity='quantity', related_keys=RELATED_KEYS):
+  """
+  Runs the aggregate (and optionally the leaf) query and returns the summary tree.
+  """
+  builder = SummaryTreeBuilder(keys, leaves=leaves)
+  depth = len(keys)
+
+  for row in summary_rows(queryset, keys, quantity, related_keys).iterator():
+    builder.add_group(
+      [row[f'level_{i}'] for i in range(depth)],
+      row['variant_count'],
+      row['total_quantity'],
+      row['stock_value'],
+    )
+
+  if leaves:
+    for row in leaf_rows(queryset, keys, quantity, related_keys).iterator():
+      builder.add_leaf(*_leaf_from_row(row, depth))
+
+  return builder.result
+
+
+async def abuild_summary(queryset, keys, leaves=False, quantity='quantity', related_keys=RELATED_KEYS):
+  """
+  build_summary for async views: same queries, iterated with the async ORM.
+  """
+  builder = SummaryTreeBuilder(keys, leaves=leaves)
+  depth = len(keys)
+
+  async for row in summary_rows(queryset, keys, quantity, related_keys).aiterator():
+    builder.add_group(
+      [row[f'level_{i}'] for i in range(depth)],
+      row['variant_count'],
+      row['total_quantity'],
+      row['stock_value'],
+    )
+
+  if leaves:
+    async for row in leaf_rows(queryset, keys, quantity, related_keys).aiterator():
+      builder.add_leaf(*_leaf_from_row(row, depth))
+
+  return builder.result
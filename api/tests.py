@@ -1,3 +1,954 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .cache import catalog_changed, get_catalog_version
+from .dates import parse_moment
+from .models import Brand, Category, Item, ItemVariant, SaleEvent, SalesRollup, StockSnapshot, Transaction, TransactionItem, VariantListing
+from .middleware import REPLICA_STICKY_COOKIE, ReplicaRoutingMiddleware
+from .pagination import encode_cursor
+from .partitions import archive_partitions, attached_months, ensure_partitions, partition_name, restore_partitions
+from . import routers
+from .importer import import_catalog
+from .rollups import backfill_rollups
+from .sales import flush_sales, queue_state, should_flush
+from .shards import rebalance_shards
+from .snapshots import annotate_quantity_as_of, take_snapshot
+from .validation import SchemaRegistry, schema_registry
+from .stock import InsufficientStockError, apply_stock_changes
+from .views.items import ItemViewSet
 
-# Create your tests here.
+# These run against a real PostgreSQL database: the stock code relies on row
+# locks, SKIP LOCKED and partitioned tables. Tests that need two connections
+# at once are TransactionTestCases and run their second connection in a thread.
+
+
+def make_variant(quantity=10, price='2.50', color='Blue'):
+  category, _ = Category.objects.get_or_create(name='Test Pens', defaults={'attribute_schema': ['color']})
+  item = Item.objects.create(name='Test Pen', category=category)
+  return ItemVariant.objects.create(item=item, attributes={'color': color}, price=Decimal(price), quantity=quantity)
+
+
+def in_thread(target, *args):
+  """
+  Runs `target` on its own database connection. Returns (thread, result dict).
+  """
+  result = {}
+
+  def run():
+    try:
+      result['value'] = target(*args)
+    except Exception as e:
+      result['error'] = e
+    finally:
+      connection.close()
+
+  thread = threading.Thread(target=run)
+  thread.start()
+  return thread, result
+
+
+class ParseMomentTests(SimpleTestCase):
+
+  def test_bare_date_is_the_start_or_end_of_the_day(self):
+    start = parse_moment('2026-03-01', 'start')
+    end = parse_moment('2026-03-01', 'end', end_of_day=True)
+    self.assertEqual(start, timezone.make_aware(datetime(2026, 3, 1)))
+    self.assertEqual(end, timezone.make_aware(datetime(2026, 3, 1, 23, 59, 59, 999999)))
+
+  def test_bad_value_names_the_parameter(self):
+    with self.assertRaises(ValidationError) as raised:
+      parse_moment('2026-13-01', 'as_of')
+    self.assertIn('as_of', raised.exception.detail)
+
+
+class TransactionItemTests(TestCase):
+
+  def test_line_takes_its_transaction_timestamp(self):
+    variant = make_variant()
+    batch = Transaction.objects.create(type='restock')
+    line = TransactionItem.objects.create(transaction=batch, item=variant, quantity_change=1)
+    self.assertEqual(line.datetime_created, batch.datetime_created)
+    self.assertTrue(TransactionItem.objects.filter(pk=line.pk, datetime_created=batch.datetime_created).exists())
+
+
+class SnapshotTests(TransactionTestCase):
+
+  def test_as_of_snapshot_time_matches_the_ledger(self):
+    variant = make_variant(quantity=10)
+    apply_stock_changes('restock', [{'item': variant.pk, 'quantity_change': 5}])
+    take_snapshot()
+    snapshot = StockSnapshot.objects.get(variant=variant)
+    apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -3}])
+
+    # Without the snapshot, ?as_of= works back from the live quantity through the ledger
+    StockSnapshot.objects.all().delete()
+    as_of = annotate_quantity_as_of(ItemVariant.objects.filter(pk=variant.pk), snapshot.taken_at).get()
+    self.assertEqual(snapshot.quantity, 15)
+    self.assertEqual(as_of.quantity_as_of, 15)
+
+  def test_snapshot_waits_for_stock_writers_in_flight(self):
+    variant = make_variant(quantity=10)
+    applied, release = threading.Event(), threading.Event()
+
+    def writer():
+      with transaction.atomic():
+        new_transaction, _ = apply_stock_changes('restock', [{'item': variant.pk, 'quantity_change': 5}])
+        applied.set()
+        release.wait(5)
+      return new_transaction
+
+    writer_thread, written = in_thread(writer)
+    self.assertTrue(applied.wait(5))
+    snapshot_thread, _ = in_thread(take_snapshot)
+    snapshot_thread.join(0.5)
+    self.assertTrue(snapshot_thread.is_alive(), "take_snapshot didn't wait for the open stock write")
+
+    release.set()
+    writer_thread.join(5)
+    snapshot_thread.join(5)
+    snapshot = StockSnapshot.objects.get(variant=variant)
+    self.assertEqual(snapshot.quantity, 15)
+    self.assertLess(written['value'].datetime_created, snapshot.taken_at)
+
+
+class ShardTests(TransactionTestCase):
+
+  def sharded_variant(self, quantity=100):
+    variant = make_variant(quantity=quantity)
+    rebalance_shards(variant.pk, 4)
+    return variant
+
+  def test_batches_on_a_sharded_variant_dont_block_each_other(self):
+    variant = self.sharded_variant()
+    applied, release, committed = threading.Event(), threading.Event(), threading.Event()
+
+    def first():
+      with transaction.atomic():
+        apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -1}])
+        applied.set()
+        release.wait(5)
+
+    def second():
+      with transaction.atomic():
+        transaction.on_commit(committed.set)
+        apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -2}])
+
+    first_thread, first_result = in_thread(first)
+    try:
+      self.assertTrue(applied.wait(5))
+      second_thread, second_result = in_thread(second)
+      self.assertTrue(committed.wait(5), "the second batch waited for the first")
+    finally:
+      release.set()
+      first_thread.join(5)
+      second_thread.join(5)
+    self.assertNotIn('error', first_result)
+    self.assertNotIn('error', second_result)
+
+    # Each batch has its own rollup row, and the skipped fold caught up after commit
+    rollups = SalesRollup.objects.filter(variant=variant, type='sale')
+    self.assertEqual(rollups.count(), 2)
+    self.assertEqual(sum(rollup.units for rollup in rollups), 3)
+    self.assertEqual(ItemVariant.objects.get(pk=variant.pk).quantity, 97)
+    self.assertEqual(VariantListing.objects.get(variant_id=variant.pk).quantity, 97)
+
+  def test_batch_folds_its_variants(self):
+    variant = self.sharded_variant()
+    _, quantities = apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -3}])
+    self.assertEqual(quantities, {variant.pk: 97})
+    self.assertEqual(ItemVariant.objects.get(pk=variant.pk).quantity, 97)
+    self.assertEqual(VariantListing.objects.get(variant_id=variant.pk).quantity, 97)
+
+  def test_as_of_walks_back_from_the_shards(self):
+    variant = self.sharded_variant()
+    before = timezone.now()
+    apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -3}])
+    # A fold that hasn't caught up yet
+    ItemVariant.objects.filter(pk=variant.pk).update(quantity=100)
+    as_of = annotate_quantity_as_of(ItemVariant.objects.filter(pk=variant.pk), before).get()
+    self.assertEqual(as_of.quantity_as_of, 100)
+
+
+class SchemaRegistryTests(TestCase):
+
+  def test_keeps_only_the_current_version(self):
+    registry = SchemaRegistry()
+    for version in range(1, 6):
+      registry.register(1, version, ['color'] * version)
+    self.assertEqual(list(registry._compiled), [1])
+    self.assertEqual(registry.get(1).version, 5)
+
+  def test_category_edits_replace_the_compiled_schema(self):
+    category = Category.objects.create(name='Edited Pens', attribute_schema=['color'])
+    for schema in (['color', 'tip_size'], ['tip_size']):
+      category.attribute_schema = schema
+      category.save()
+    compiled = schema_registry.get(category.pk)
+    self.assertEqual((compiled.version, compiled.required), (category.schema_version, ('tip_size',)))
+    self.assertEqual(compiled.errors({'color': 'Blue'}), [
+      "Attribute 'tip_size' is required for this category.",
+      "Attribute 'color' is not defined for this category.",
+    ])
+    self.assertEqual([schema for schema in schema_registry.all() if schema.category_id == category.pk], [compiled])
+
+
+class StockUpdateTests(TestCase):
+
+  def post(self, data, **headers):
+    return self.client.post('/api/stock/update/', json.dumps(data), content_type='application/json', headers=headers)
+
+  def test_a_failing_line_applies_nothing(self):
+    enough, short = make_variant(quantity=10, color='Blue'), make_variant(quantity=2, color='Red')
+    lines = [
+      {'item': enough.pk, 'quantity_change': -4},
+      {'item': short.pk, 'quantity_change': -3},
+      {'item': 999999, 'quantity_change': -1},
+    ]
+    with self.assertRaises(InsufficientStockError) as raised:
+      apply_stock_changes('sale', lines)
+
+    # Every failing line is reported, and none of the batch is written
+    self.assertEqual([error['item'] for error in raised.exception.errors], [short.pk, 999999])
+    self.assertEqual(raised.exception.errors[0]['available'], 2)
+    self.assertEqual(ItemVariant.objects.get(pk=enough.pk).quantity, 10)
+    self.assertEqual(ItemVariant.objects.get(pk=short.pk).quantity, 2)
+    self.assertFalse(Transaction.objects.exists())
+    self.assertFalse(TransactionItem.objects.exists())
+
+  def test_endpoint_reports_failing_lines(self):
+    variant = make_variant(quantity=1)
+    response = self.post({'type': 'sale', 'line_items': [{'item': variant.pk, 'quantity_change': -5}]})
+    self.assertEqual(response.status_code, 400)
+    self.assertEqual(response.json()['errors'][0]['requested'], 5)
+    self.assertEqual(ItemVariant.objects.get(pk=variant.pk).quantity, 1)
+
+  def test_idempotent_retry_is_replayed(self):
+    variant = make_variant(quantity=10)
+    body = {'type': 'sale', 'line_items': [{'item': variant.pk, 'quantity_change': -2}]}
+
+    first = self.post(body, **{'Idempotency-Key': 'retry-1'})
+    second = self.post(body, **{'Idempotency-Key': 'retry-1'})
+    self.assertEqual(first.status_code, 201)
+    self.assertEqual(second.status_code, 201)
+    self.assertEqual(second.json(), first.json())
+    self.assertEqual(second.headers.get('Idempotent-Replayed'), 'true')
+    self.assertEqual(ItemVariant.objects.get(pk=variant.pk).quantity, 8)
+    self.assertEqual(Transaction.objects.count(), 1)
+
+    # The same key with a different body is refused
+    body['line_items'][0]['quantity_change'] = -3
+    self.assertEqual(self.post(body, **{'Idempotency-Key': 'retry-1'}).status_code, 422)
+
+  def test_failed_request_does_not_keep_its_key(self):
+    variant = make_variant(quantity=1)
+    body = {'type': 'sale', 'line_items': [{'item': variant.pk, 'quantity_change': -2}]}
+    self.assertEqual(self.post(body, **{'Idempotency-Key': 'retry-2'}).status_code, 400)
+
+    apply_stock_changes('restock', [{'item': variant.pk, 'quantity_change': 5}])
+    self.assertEqual(self.post(body, **{'Idempotency-Key': 'retry-2'}).status_code, 201)
+    self.assertEqual(ItemVariant.objects.get(pk=variant.pk).quantity, 4)
+
+
+class AttributeFilterTests(TestCase):
+
+  def setUp(self):
+    for color in ('Blue', 'Light Blue', 'Red'):
+      make_variant(color=color)
+
+  def colors(self, query):
+    response = self.client.get(f'/api/items/?{query}')
+    self.assertEqual(response.status_code, 200)
+    return sorted(row['attributes']['color'] for row in response.json()['results'])
+
+  def test_plain_key_is_a_case_insensitive_substring(self):
+    self.assertEqual(self.colors('color=blue'), ['Blue', 'Light Blue'])
+    self.assertEqual(self.colors('color__icontains=BLU'), ['Blue', 'Light Blue'])
+
+  def test_exact_key_matches_the_whole_value(self):
+    self.assertEqual(self.colors('color__exact=Blue'), ['Blue'])
+    self.assertEqual(self.colors('color__exact=blue'), [])
+
+
+class SummaryTests(TestCase):
+
+  def test_tree_ignores_sparse_fields(self):
+    make_variant(color='Blue')
+    response = self.client.get('/api/items/summary/?path=category_name,color&fields=id,sku')
+    self.assertEqual(response.status_code, 200)
+    [row] = response.json()['Test Pens']['Blue']
+    self.assertEqual(row['item_details']['name'], 'Test Pen')
+
+
+class AsyncItemTests(TestCase):
+
+  def test_list_and_detail_take_sparse_fields(self):
+    variant = make_variant()
+    response = self.client.get('/api/async/items/?fields=id,sku')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['results'], [{'id': variant.pk, 'sku': variant.sku}])
+
+    response = self.client.get(f'/api/async/items/{variant.pk}/?fields=id,sku')
+    self.assertEqual(response.json(), {'id': variant.pk, 'sku': variant.sku})
+    self.assertEqual(self.client.get('/api/async/items/?fields=nope').status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+
+  def setUp(self):
+    acme, beta = Brand.objects.create(name='Acme'), Brand.objects.create(name='Beta')
+    pens = Category.objects.get_or_create(name='Test Pens', defaults={'attribute_schema': ['color']})[0]
+    self.variants = []
+    # Repeated and NULL names, so the pk tiebreaker and NULL placement both matter
+    for brand, category in [(acme, pens), (None, pens), (beta, None), (acme, None), (None, None), (beta, pens), (acme, pens)]:
+      item = Item.objects.create(name='Paged', brand=brand, category=category)
+      variant = ItemVariant.objects.create(item=item, attributes={'color': 'Blue'}, price=Decimal('1.00'))
+      self.variants.append((brand and brand.name, category and category.name, variant.pk))
+
+  def expected(self, column, descending):
+    present = sorted((row[column], row[2]) for row in self.variants if row[column] is not None)
+    missing = sorted(row[2] for row in self.variants if row[column] is None)
+    if descending:
+      return [pk for _, pk in reversed(present)] + list(reversed(missing))
+    return [pk for _, pk in present] + missing
+
+  def page(self, url):
+    response = self.client.get(url)
+    self.assertEqual(response.status_code, 200)
+    body = response.json()
+    return [row['id'] for row in body['results']], body['next'], body['previous']
+
+  def walk(self, ordering):
+    url = f'/api/items/?name=Paged&page_size=2&ordering={ordering}'
+    forward, pages = [], 0
+    while url:
+      ids, url, previous = self.page(url)
+      forward += ids
+      pages += 1
+      last = (ids, previous)
+
+    # Back from the last page
+    backward = last[0]
+    url = last[1]
+    while url:
+      ids, _, url = self.page(url)
+      backward = ids + backward
+    return forward, backward, pages
+
+  def test_next_and_previous_under_both_directions(self):
+    for ordering, column in (('item__brand__name', 0), ('item__category__name', 1)):
+      for descending in (False, True):
+        with self.subTest(ordering=ordering, descending=descending):
+          forward, backward, pages = self.walk(('-' if descending else '') + ordering)
+          expected = self.expected(column, descending)
+          self.assertEqual(forward, expected)
+          self.assertEqual(backward, expected)
+          self.assertEqual(pages, 4)
+
+  def test_bad_cursors_are_a_400(self):
+    _, next_url, _ = self.page('/api/items/?name=Paged&page_size=2&ordering=price')
+    cursor = json.loads(base64.urlsafe_b64decode(parse_qs(urlparse(next_url).query)['cursor'][0]))
+    tampered = {**cursor, 'v': ['not a price'] + cursor['v'][1:]}
+
+    for value in ('!!!', base64.urlsafe_b64encode(b'[1, 2]').decode(), encode_cursor({**cursor, 'o': ['pk']}), encode_cursor(tampered)):
+      with self.subTest(cursor=value):
+        response = self.client.get('/api/items/', {'name': 'Paged', 'page_size': 2, 'ordering': 'price', 'cursor': value})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+class SearchTests(TestCase):
+
+  def setUp(self):
+    pens = Category.objects.get_or_create(name='Test Pens', defaults={'attribute_schema': ['color']})[0]
+    pilot, other = Brand.objects.create(name='Pilot'), Brand.objects.create(name='G2co')
+    self.named = Item.objects.create(name='G2 Gel', brand=pilot, category=pens)
+    self.branded = Item.objects.create(name='Sarasa', brand=other, category=pens)
+    for item in (self.named, self.branded):
+      for color in ('Blue', 'Red'):
+        ItemVariant.objects.create(item=item, attributes={'color': color}, price=Decimal('1.00'))
+
+  def search(self, text):
+    response = self.client.get('/api/items/search/', {'q': text})
+    self.assertEqual(response.status_code, 200)
+    return response.json()['results']
+
+  def test_every_word_matches_a_prefix(self):
+    results = self.search('pil g2 bl')
+    self.assertEqual([(row['item'], row['attributes']['color']) for row in results], [(self.named.pk, 'Blue')])
+    self.assertEqual(self.search('pil g2 gr'), [])
+    self.assertEqual(self.search('  '), [])
+
+  def test_name_matches_rank_above_brand_matches(self):
+    results = self.search('g2')
+    self.assertEqual([row['item'] for row in results], [self.named.pk] * 2 + [self.branded.pk] * 2)
+    self.assertGreater(results[1]['rank'], results[2]['rank'])
+
+  def test_renaming_an_item_updates_its_variants(self):
+    self.named.name = 'Juice'
+    self.named.save()
+    self.assertEqual([row['item'] for row in self.search('juic')], [self.named.pk] * 2)
+
+
+class ReorderTests(TestCase):
+
+  def test_suggestions_cover_target_and_recent_sales(self):
+    selling, idle, stocked = make_variant(quantity=132, color='Blue'), make_variant(quantity=0, color='Red'), make_variant(quantity=50, color='Green')
+    ItemVariant.objects.filter(pk__in=[selling.pk, stocked.pk]).update(target_quantity=10)
+    ItemVariant.objects.filter(pk=idle.pk).update(target_quantity=5)
+
+    # 30 sold within the window, 100 before it
+    old, _ = apply_stock_changes('sale', [{'item': selling.pk, 'quantity_change': -100}])
+    moment = timezone.now() - timedelta(days=60)
+    TransactionItem.objects.filter(transaction_id=old.pk).update(datetime_created=moment)
+    Transaction.objects.filter(pk=old.pk).update(datetime_created=moment)
+    apply_stock_changes('sale', [{'item': selling.pk, 'quantity_change': -30}])
+
+    response = self.client.get('/api/items/reorder/', {'window_days': 30, 'cover_days': 14})
+    self.assertEqual(response.status_code, 200)
+    rows = {row['id']: row for row in response.json()['results']}
+    # Largest shortfall first; variants at or above target are left out
+    self.assertEqual(list(rows), [selling.pk, idle.pk])
+    self.assertEqual((rows[selling.pk]['shortfall'], rows[selling.pk]['units_sold']), (8, 30))
+    # Back to target (8) plus 14 days at 1 a day
+    self.assertEqual(rows[selling.pk]['suggested_order'], 22)
+    self.assertEqual((rows[idle.pk]['units_sold'], rows[idle.pk]['suggested_order']), (0, 5))
+
+  def test_bad_parameters(self):
+    self.assertEqual(self.client.get('/api/items/reorder/', {'window_days': 'x'}).status_code, 400)
+    self.assertEqual(self.client.get('/api/items/reorder/', {'window_days': 0}).status_code, 400)
+
+
+class ExportTests(TestCase):
+
+  def export(self, path, **params):
+    response = self.client.get(path, params)
+    self.assertEqual(response.status_code, 200)
+    return b''.join(response.streaming_content).decode()
+
+  def test_transactions_csv(self):
+    variant = make_variant(quantity=10, color='Blue')
+    sale, _ = apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -3}])
+    apply_stock_changes('restock', [{'item': variant.pk, 'quantity_change': 5}])
+
+    rows = list(csv.reader(io.StringIO(self.export('/api/export/transactions.csv'))))
+    self.assertEqual(rows[0], ['transaction_id', 'type', 'datetime_created', 'variant_id', 'sku', 'item_name',
+                               'brand_name', 'category_name', 'quantity_change', 'unit_price_at_sale'])
+    self.assertEqual([(row[1], row[8]) for row in rows[1:]], [('sale', '-3'), ('restock', '5')])
+    self.assertEqual((rows[1][0], rows[1][4], rows[1][5], rows[1][7]), (str(sale.pk), variant.sku, 'Test Pen', 'Test Pens'))
+
+    sales = list(csv.reader(io.StringIO(self.export('/api/export/transactions.csv', type='sale'))))
+    self.assertEqual([row[1] for row in sales[1:]], ['sale'])
+    # A range with nothing in it still gets its header
+    tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+    self.assertEqual(len(list(csv.reader(io.StringIO(self.export('/api/export/transactions.csv', start=tomorrow))))), 1)
+
+  def test_inventory_ndjson_as_of(self):
+    variant = make_variant(quantity=10, color='Blue')
+    before = timezone.now()
+    apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -4}])
+
+    rows = [json.loads(line) for line in self.export('/api/export/inventory.ndjson').splitlines()]
+    self.assertEqual([(row['sku'], row['quantity'], row['attributes']) for row in rows], [(variant.sku, 6, {'color': 'Blue'})])
+    rows = [json.loads(line) for line in self.export('/api/export/inventory.ndjson', as_of=before.isoformat()).splitlines()]
+    self.assertEqual(rows[0]['quantity'], 10)
+
+  def test_unknown_type(self):
+    self.assertEqual(self.client.get('/api/export/transactions.csv', {'type': 'theft'}).status_code, 400)
+
+
+class TransactionFilterTests(TestCase):
+
+  def setUp(self):
+    acme = Brand.objects.create(name='Acme')
+    category = Category.objects.create(name='Acme Pens', attribute_schema=['color'])
+    item = Item.objects.create(name='Acme Pen', brand=acme, category=category)
+    self.blue = ItemVariant.objects.create(item=item, attributes={'color': 'Blue'}, price=Decimal('3.00'), quantity=10)
+    self.red = ItemVariant.objects.create(item=item, attributes={'color': 'Red'}, price=Decimal('3.00'), quantity=10)
+    self.plain = make_variant(quantity=10)
+
+    # Two Acme lines; an Acme line beside an unbranded one; an unbranded line a week ago
+    self.both, _ = apply_stock_changes('sale', [
+      {'item': self.blue.pk, 'quantity_change': -1}, {'item': self.red.pk, 'quantity_change': -1},
+    ])
+    self.mixed, _ = apply_stock_changes('sale', [
+      {'item': self.red.pk, 'quantity_change': -1}, {'item': self.plain.pk, 'quantity_change': -1},
+    ])
+    self.old, _ = apply_stock_changes('restock', [{'item': self.plain.pk, 'quantity_change': 5}])
+    moment = timezone.now() - timedelta(days=7)
+    TransactionItem.objects.filter(transaction_id=self.old.pk).update(datetime_created=moment)
+    Transaction.objects.filter(pk=self.old.pk).update(datetime_created=moment)
+
+  def ids(self, **params):
+    response = self.client.get('/api/transactions/', params)
+    self.assertEqual(response.status_code, 200)
+    return sorted(row['id'] for row in response.json()['results'])
+
+  def test_each_transaction_listed_once(self):
+    self.assertEqual(self.ids(brand='acme'), sorted([self.both.pk, self.mixed.pk]))
+    self.assertEqual(self.ids(category='Acme Pens'), sorted([self.both.pk, self.mixed.pk]))
+    self.assertEqual(self.ids(variant=self.plain.pk), sorted([self.mixed.pk, self.old.pk]))
+    self.assertEqual(self.ids(sku=self.blue.sku), [self.both.pk])
+
+  def test_line_filters_match_the_same_line(self):
+    # `mixed` has an Acme line and a line for `plain`, but no line that is both
+    self.assertEqual(self.ids(brand='Acme', variant=self.plain.pk), [])
+    self.assertEqual(self.ids(brand='Acme', sku=self.red.sku), sorted([self.both.pk, self.mixed.pk]))
+    self.assertEqual(self.ids(category='Test Pens', sku=self.blue.sku), [])
+
+  def test_with_date_range_and_type(self):
+    today = timezone.localdate().isoformat()
+    self.assertEqual(self.ids(variant=self.plain.pk, created_after=today), [self.mixed.pk])
+    self.assertEqual(self.ids(variant=self.plain.pk, created_before=(timezone.localdate() - timedelta(days=1)).isoformat()), [self.old.pk])
+    self.assertEqual(self.ids(variant=self.plain.pk, type='restock'), [self.old.pk])
+    self.assertEqual(self.ids(brand='Acme', created_before=(timezone.localdate() - timedelta(days=1)).isoformat()), [])
+
+
+class BulkCreateTests(TestCase):
+
+  def post(self, rows):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.post('/api/items/', json.dumps(rows), content_type='application/json')
+    return response, len(queries)
+
+  def rows(self, item, colors):
+    return [{'item': item.pk, 'price': '1.25', 'attributes': {'color': color}} for color in colors]
+
+  def test_query_count_does_not_grow_with_the_batch(self):
+    item = make_variant(color='Seed').item
+    small, small_queries = self.post(self.rows(item, ['A', 'B']))
+    large, large_queries = self.post(self.rows(item, [f'C{n}' for n in range(12)]))
+
+    self.assertEqual(small.status_code, 201)
+    self.assertEqual(large.status_code, 201)
+    self.assertEqual(small_queries, large_queries)
+    self.assertEqual(len(large.json()), 12)
+    self.assertEqual(large.json()[0]['item_details']['name'], 'Test Pen')
+    self.assertEqual(VariantListing.objects.filter(item_id=item.pk).count(), 15)
+
+  def test_errors_are_reported_per_row(self):
+    item = make_variant(color='Taken').item
+    response, _ = self.post(self.rows(item, ['Taken', 'New', 'New']))
+    self.assertEqual(response.status_code, 400)
+    errors = response.json()['non_field_errors']
+    self.assertIn('sku', errors[0])
+    self.assertEqual(errors[1], {})
+    self.assertIn('sku', errors[2])
+
+    response, _ = self.post(self.rows(item, ['Other']) + [{'item': 999999, 'price': '1.00', 'attributes': {'color': 'X'}}])
+    self.assertEqual(response.status_code, 400)
+    self.assertIn('item', response.json()['1'])
+    self.assertEqual(ItemVariant.objects.filter(item=item).count(), 1)
+
+
+class ImportTests(TestCase):
+
+  def setUp(self):
+    Category.objects.get_or_create(name='Test Pens', defaults={'attribute_schema': ['color']})
+
+  def run_import(self, text, chunk_size=1000):
+    return import_catalog(io.StringIO(text), 'csv', chunk_size=chunk_size)
+
+  def test_bad_rows_are_reported_by_line(self):
+    report = self.run_import(
+      "brand,category,name,price,color\n"
+      "Acme,Test Pens,Gel,1.50,Blue\n"
+      "Acme,Test Pens,Gel,cheap,Red\n"
+      "Acme,No Such,Gel,1.50,Red\n"
+      "Acme,Test Pens,Gel,-1,Green\n"
+    )
+    self.assertEqual(report['created'], 1)
+    self.assertEqual([error['row'] for error in report['errors']], [3, 4, 5])
+    self.assertIn('price', report['errors'][0]['errors'][0])
+    self.assertIn('No Such', report['errors'][1]['errors'][0])
+
+  def test_duplicate_skus_are_rejected(self):
+    existing = make_variant(color='Red')
+    report = self.run_import(
+      "brand,category,name,price,color\n"
+      f",Test Pens,{existing.item.name},1.50,Red\n"
+      "Acme,Test Pens,Gel,1.50,Blue\n"
+      "Acme,Test Pens,Gel,1.50,Blue\n"
+    )
+    self.assertEqual(report['created'], 1)
+    errors = {error['row']: error['errors'][0] for error in report['errors']}
+    self.assertIn('already exists', errors[2])
+    self.assertIn('earlier in this file', errors[4])
+
+  def test_a_rolled_back_chunk_frees_its_skus(self):
+    # An existing item, so the retried rows get the same SKUs
+    item = make_variant(color='Seed').item
+    rows = f",Test Pens,{item.name},1.50,Blue\n,Test Pens,{item.name},1.50,Red\n"
+    calls = []
+
+    def fail_first_chunk(**kwargs):
+      calls.append(kwargs)
+      if len(calls) == 1:
+        raise IntegrityError("raced")
+
+    with mock.patch('api.importer.refresh_listings', side_effect=fail_first_chunk):
+      report = self.run_import("brand,category,name,price,color\n" + rows + rows, chunk_size=2)
+
+    self.assertEqual(report['created'], 2)
+    self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+    self.assertIn('Could not be saved', report['errors'][0]['errors'][0])
+    self.assertEqual(ItemVariant.objects.filter(item=item).count(), 3)
+
+
+class SalesQueueTests(TestCase):
+
+  def queue(self, events):
+    response = self.client.post('/api/sales/events/', json.dumps({'events': events}), content_type='application/json')
+    self.assertEqual(response.status_code, 202)
+
+  def test_events_are_coalesced_per_variant(self):
+    pen, refill = make_variant(quantity=10, color='Blue'), make_variant(quantity=10, color='Red')
+    self.queue([
+      {'item': pen.pk, 'quantity': 1, 'unit_price_at_sale': '1.00'},
+      {'item': refill.pk, 'quantity': 1},
+      {'item': pen.pk, 'quantity': 2, 'unit_price_at_sale': '2.00'},
+    ])
+
+    flush = flush_sales()
+    self.assertEqual((flush.event_count, flush.line_count, flush.rejected_count), (3, 2, 0))
+    lines = {line.item_id: line for line in TransactionItem.objects.filter(transaction=flush.transaction)}
+    self.assertEqual(lines[pen.pk].quantity_change, -3)
+    self.assertEqual(lines[pen.pk].unit_price_at_sale, Decimal('1.67'))
+    # Unpriced events take the variant's price
+    self.assertEqual(lines[refill.pk].unit_price_at_sale, refill.price)
+    self.assertEqual(ItemVariant.objects.get(pk=pen.pk).quantity, 7)
+    self.assertFalse(SaleEvent.objects.exists())
+    self.assertIsNone(flush_sales())
+
+  def test_short_variants_are_rejected_without_blocking_the_rest(self):
+    pen, short = make_variant(quantity=10, color='Blue'), make_variant(quantity=1, color='Red')
+    self.queue([{'item': short.pk, 'quantity': 1}, {'item': pen.pk, 'quantity': 4}, {'item': short.pk, 'quantity': 1}])
+
+    flush = flush_sales()
+    self.assertEqual((flush.event_count, flush.line_count, flush.rejected_count), (3, 1, 2))
+    self.assertEqual(ItemVariant.objects.get(pk=pen.pk).quantity, 6)
+    self.assertEqual(ItemVariant.objects.get(pk=short.pk).quantity, 1)
+    rejected = SaleEvent.objects.filter(status='rejected')
+    self.assertEqual({event.item_id for event in rejected}, {short.pk})
+    self.assertEqual(rejected.count(), 2)
+    self.assertIsNone(flush_sales())
+
+  def test_flush_triggers_on_size_or_age(self):
+    self.assertTrue(should_flush(500, 0.0, batch_size=500, max_wait=2.0))
+    self.assertFalse(should_flush(10, 0.5, batch_size=500, max_wait=2.0))
+    self.assertTrue(should_flush(10, 2.0, batch_size=500, max_wait=2.0))
+    self.assertFalse(should_flush(0, 60.0, batch_size=500, max_wait=2.0))
+
+    self.assertEqual(queue_state(), (0, 0.0))
+    variant = make_variant()
+    self.queue([{'item': variant.pk, 'quantity': 1}, {'item': variant.pk, 'quantity': 1}])
+    SaleEvent.objects.update(datetime_received=timezone.now() - timedelta(seconds=5))
+    depth, age = queue_state()
+    self.assertEqual(depth, 2)
+    self.assertGreaterEqual(age, 5)
+    self.assertTrue(should_flush(depth, age, batch_size=500, max_wait=2.0))
+
+  def test_queue_endpoint_reports_depth_and_flushes(self):
+    variant = make_variant()
+    self.queue([{'item': variant.pk, 'quantity': 1}] * 3)
+    self.assertEqual(self.client.get('/api/sales/queue/').json()['depth'], 3)
+
+    flush_sales()
+    stats = self.client.get('/api/sales/queue/').json()
+    self.assertEqual(stats['depth'], 0)
+    self.assertEqual(stats['flushes'], 1)
+    self.assertEqual(stats['events'], 3)
+
+
+class HistoryTests(TestCase):
+
+  def test_running_balance_across_cursor_pages(self):
+    variant = make_variant(quantity=0)
+    changes = [20, -3, -5, 12, -1, -7, 4, -2]
+    for change in changes:
+      apply_stock_changes('restock' if change > 0 else 'sale', [{'item': variant.pk, 'quantity_change': change}])
+
+    rows, pages = [], 0
+    url = f'/api/items/{variant.pk}/history/?page_size=3'
+    while url:
+      response = self.client.get(url)
+      self.assertEqual(response.status_code, 200)
+      rows += response.json()['results']
+      url, pages = response.json()['next'], pages + 1
+
+    self.assertEqual(pages, 3)
+    self.assertEqual([row['quantity_change'] for row in rows], changes[::-1])
+    # Newest first: the first balance is the live quantity, and each one follows from the next
+    self.assertEqual(rows[0]['balance'], sum(changes))
+    for newer, older in zip(rows, rows[1:]):
+      self.assertEqual(older['balance'], newer['balance'] - newer['quantity_change'])
+    self.assertEqual(rows[-1]['balance'] - rows[-1]['quantity_change'], 0)
+
+
+class RollupBackfillTests(TestCase):
+
+  def test_archived_months_keep_their_rollups(self):
+    variant = make_variant()
+    # A month with no partition and no lines left: archived
+    archived = SalesRollup.objects.create(variant=variant, day=date(2001, 1, 15), type='sale', units=7)
+    apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': -2}])
+    SalesRollup.objects.exclude(pk=archived.pk).update(units=99)
+
+    backfill_rollups()
+    self.assertEqual(SalesRollup.objects.get(pk=archived.pk).units, 7)
+    rebuilt = SalesRollup.objects.exclude(pk=archived.pk).get(variant=variant)
+    self.assertEqual(rebuilt.units, 2)
+
+
+class PartitionTests(TransactionTestCase):
+  month = date(2001, 1, 1)
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    # Don't leave the test month's partitions behind
+    self.addCleanup(archive_partitions, date(2001, 2, 1), self.directory.name)
+
+  def backdate(self, new_transaction):
+    moment = timezone.make_aware(datetime(2001, 1, 15, 12))
+    TransactionItem.objects.filter(transaction_id=new_transaction.pk).update(datetime_created=moment)
+    Transaction.objects.filter(pk=new_transaction.pk).update(datetime_created=moment)
+
+  def test_create_archive_and_restore_a_month(self):
+    variant = make_variant(quantity=10)
+    for change in (-1, -2):
+      new_transaction, _ = apply_stock_changes('sale', [{'item': variant.pk, 'quantity_change': change}])
+      self.backdate(new_transaction)
+
+    # 1. The backdated rows sit in the default partition until the month gets its own
+    created = ensure_partitions()
+    for table in (Transaction._meta.db_table, TransactionItem._meta.db_table):
+      self.assertIn(partition_name(table, self.month), created)
+      with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {partition_name(table, self.month)}")
+        self.assertEqual(cursor.fetchone()[0], 2)
+
+    # 2. Archiving detaches, writes and drops the month
+    written = archive_partitions(date(2001, 2, 1), self.directory.name)
+    self.assertEqual(len(written), 2)
+    self.assertFalse(Transaction.objects.filter(datetime_created__year=2001).exists())
+    with connection.cursor() as cursor:
+      self.assertNotIn(self.month, attached_months(cursor, Transaction._meta.db_table))
+
+    # 3. Restoring brings the same rows back
+    restored = restore_partitions(self.month, self.directory.name)
+    self.assertEqual(restored, {Transaction._meta.db_table: 2, TransactionItem._meta.db_table: 2})
+    lines = TransactionItem.objects.filter(item=variant, datetime_created__year=2001)
+    self.assertEqual(sorted(lines.values_list('quantity_change', flat=True)), [-2, -1])
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+  """
+  Which alias each kind of request reads from. The test settings mirror any
+  replica onto the primary, so the replica in use is faked here and the alias
+  the router hands out during the request is what gets checked.
+  """
+
+  def setUp(self):
+    self.factory = RequestFactory()
+    for target in ('api.middleware.replica_aliases', 'api.routers.replica_aliases'):
+      patcher = mock.patch(target, return_value=['replica_0'])
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    routers._lag.clear()
+    self.addCleanup(routers._lag.clear)
+
+  def route(self, request, status=200, lag=0.0):
+    routers._lag['replica_0'] = (lag, time.monotonic())
+    seen = {}
+
+    def get_response(request):
+      seen['read'] = routers.ReplicaRouter().db_for_read(ItemVariant)
+      seen['write'] = routers.ReplicaRouter().db_for_write(ItemVariant)
+      return HttpResponse(status=status)
+
+    response = ReplicaRoutingMiddleware(get_response)(request)
+    return seen, response
+
+  def test_safe_reads_of_replica_views_go_to_a_replica(self):
+    seen, _ = self.route(self.factory.get('/api/items/'))
+    self.assertEqual(seen, {'read': 'replica_0', 'write': 'default'})
+
+  def test_views_not_marked_for_replicas_read_the_primary(self):
+    seen, _ = self.route(self.factory.get('/api/brands/'))
+    self.assertIsNone(seen['read'])
+
+  def test_writes_use_the_primary_and_make_the_client_sticky(self):
+    seen, response = self.route(self.factory.post('/api/stock/update/'), status=201)
+    self.assertIsNone(seen['read'])
+    self.assertEqual(seen['write'], 'default')
+    self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    request = self.factory.get('/api/items/')
+    request.COOKIES[REPLICA_STICKY_COOKIE] = response.cookies[REPLICA_STICKY_COOKIE].value
+    seen, _ = self.route(request)
+    self.assertIsNone(seen['read'])
+
+  def test_failed_writes_do_not_make_the_client_sticky(self):
+    _, response = self.route(self.factory.post('/api/stock/update/'), status=400)
+    self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+  def test_lagging_or_unreachable_replicas_are_skipped(self):
+    seen, _ = self.route(self.factory.get('/api/items/'), lag=routers.REPLICA_MAX_LAG_SECONDS + 1)
+    self.assertIsNone(seen['read'])
+    seen, _ = self.route(self.factory.get('/api/items/'), lag=None)
+    self.assertIsNone(seen['read'])
+
+  def test_lag_counts_wal_behind_not_time_since_the_last_write(self):
+    # Quiet primary: nothing left to replay, however old the last replayed transaction
+    self.assertEqual(routers.lag_seconds(True, 0, 3600), 0.0)
+    self.assertEqual(routers.lag_seconds(True, 512, 3600), 0.0)
+    # Behind: as stale as the last transaction it replayed
+    self.assertEqual(routers.lag_seconds(True, routers.REPLICA_MAX_LAG_BYTES + 1, 30), 30.0)
+    self.assertEqual(routers.lag_seconds(True, None, None), float('inf'))
+    self.assertEqual(routers.lag_seconds(False, None, None), 0.0)
+
+
+class CatalogCacheTests(TestCase):
+
+  def setUp(self):
+    caches['default'].clear()
+    self.variant = make_variant(quantity=10)
+
+  def get(self, url, etag=None):
+    return self.client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+  def test_version_bumps_when_the_write_commits(self):
+    version = get_catalog_version()
+    with self.captureOnCommitCallbacks() as callbacks:
+      catalog_changed()
+      self.assertEqual(get_catalog_version(), version)
+    for callback in callbacks:
+      callback()
+    self.assertEqual(get_catalog_version(), version + 1)
+
+    # Rolled back writes never bump it
+    with self.captureOnCommitCallbacks(execute=True):
+      with self.assertRaises(ZeroDivisionError), transaction.atomic():
+        catalog_changed()
+        1 / 0
+    self.assertEqual(get_catalog_version(), version + 1)
+
+  def test_matching_etag_gets_a_304(self):
+    url = f'/api/items/{self.variant.pk}/'
+    first = self.get(url)
+    self.assertEqual(first['X-Cache'], 'MISS')
+    self.assertEqual(self.get(url)['X-Cache'], 'HIT')
+
+    with self.assertNumQueries(0):
+      response = self.get(url, first['ETag'])
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(response['ETag'], first['ETag'])
+
+  def test_stock_updates_and_item_edits_invalidate(self):
+    url = f'/api/items/{self.variant.pk}/'
+    etag = self.get(url)['ETag']
+
+    with self.captureOnCommitCallbacks(execute=True):
+      response = self.client.post(
+        '/api/stock/update/',
+        json.dumps({'type': 'sale', 'line_items': [{'item': self.variant.pk, 'quantity_change': -4}]}),
+        content_type='application/json',
+      )
+    self.assertEqual(response.status_code, 201)
+    response = self.get(url, etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['quantity'], 6)
+    self.assertNotEqual(response['ETag'], etag)
+
+    etag = response['ETag']
+    with self.captureOnCommitCallbacks(execute=True):
+      response = self.client.patch(url, json.dumps({'price': '9.99'}), content_type='application/json')
+    self.assertEqual(response.status_code, 200)
+    response = self.get(url, etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['price'], '9.99')
+
+
+class ReplicaCacheTests(SimpleTestCase):
+
+  def setUp(self):
+    caches['default'].clear()
+    routers._lag.clear()
+    self.addCleanup(routers._lag.clear)
+    self.view = ItemViewSet(basename='itemvariant')
+    self.rendered = 0
+
+  def render(self):
+    self.rendered += 1
+    return Response({'results': []})
+
+  def get_on_replica(self, lag):
+    routers._lag['replica_0'] = (lag, time.monotonic())
+    token = routers.read_alias.set('replica_0')
+    try:
+      return self.view.cached_response(RequestFactory().get('/api/items/'), self.render)
+    finally:
+      routers.read_alias.reset(token)
+
+  def test_caught_up_replica_responses_are_cached_and_tagged(self):
+    first = self.get_on_replica(0.0)
+    second = self.get_on_replica(0.0)
+    self.assertEqual(first['X-Cache'], 'MISS')
+    self.assertEqual(second['X-Cache'], 'HIT')
+    self.assertEqual(second['ETag'], first['ETag'])
+    self.assertEqual(self.rendered, 1)
+
+  def test_lagging_replica_responses_are_not(self):
+    response = self.get_on_replica(2.0)
+    self.assertFalse(response.has_header('ETag'))
+    self.get_on_replica(2.0)
+    self.assertEqual(self.rendered, 2)
+
+
+class ReplicaLagTests(TestCase):
+
+  def test_a_database_that_is_not_replaying_has_no_lag(self):
+    routers._lag.clear()
+    self.addCleanup(routers._lag.clear)
+    self.assertEqual(routers.replica_lag('default'), 0.0)
+
+
+# The runner's client talks to localhost, which DEBUG allows outside the tests
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class BenchmarkCommandTests(TestCase):
+
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.baselines = f'{directory.name}/baselines.json'
+    make_variant()
+
+  def benchmark(self, **options):
+    call_command('benchmark', runs=1, warmup=0, scale='1k', only=['items_list'], baselines=self.baselines, stdout=io.StringIO(), **options)
+
+  def test_missing_baselines_fail(self):
+    with self.assertRaisesMessage(CommandError, 'No 1k baselines'):
+      self.benchmark()
+    # Warned about, when asked to
+    self.benchmark(allow_missing_baselines=True)
+
+  def test_recorded_baselines_are_compared(self):
+    self.benchmark(update_baselines=True)
+    self.benchmark(tolerance=100.0)
@@ -1,6 +1,7 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import PingView, MemoViewSet, BrandViewSet, ItemViewSet, BulkStockUpdateView, TransactionListView
+from .views import PingView, MetricsView, MemoViewSet, BrandViewSet, ItemViewSet, BulkStockUpdateView, TransactionListView, SaleEventIngestView, SaleQueueStatsView, SalesReportView, ExportView
+from .views import AsyncPingView, AsyncItemListView, AsyncItemDetailView, AsyncItemSummaryView, AsyncTransactionListView
 
 router = DefaultRouter()
 router.register(r'memos', MemoViewSet, basename='memo')
@@ -9,8 +10,19 @@ router.register(r'items', ItemViewSet, basename='item')
 
 urlpatterns = [
   path('ping', PingView.as_view(), name="ping"),
+  path('metrics', MetricsView.as_view(), name="metrics"),
   path('', include(router.urls)),
   path('stock/update/', BulkStockUpdateView.as_view(), name="bulk-stock-update"),
   path('transactions/', TransactionListView.as_view(), name="transaction-list"),
+  path('sales/events/', SaleEventIngestView.as_view(), name="sale-event-ingest"),
+  path('sales/queue/', SaleQueueStatsView.as_view(), name="sale-queue-stats"),
+  path('reports/sales/', SalesReportView.as_view(), name="sales-report"),
+  # Native async read paths (for ASGI servers)
+  path('async/ping', AsyncPingView.as_view(), name="async-ping"),
+  path('async/items/', AsyncItemListView.as_view(), name="async-item-list"),
+  path('async/items/summary/', AsyncItemSummaryView.as_view(), name="async-item-summary"),
+  path('async/items/<int:pk>/', AsyncItemDetailView.as_view(), name="async-item-detail"),
+  path('async/transactions/', AsyncTransactionListView.as_view(), name="async-transaction-list"),
+  re_path(r'^export/(?P<dataset>transactions|inventory)\.(?P<file_format>csv|ndjson)$', ExportView.as_view(), name="export"),
   
 ]
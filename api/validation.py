@@ -0,0 +1,119 @@
+import time
+from django.conf import settings
+
+# Seconds a process trusts its cached schema version before re-checking the database
+SCHEMA_REGISTRY_TTL = getattr(settings, 'SCHEMA_REGISTRY_TTL', 60)
+
+
+class CompiledSchema:
+  """
+  A Category.attribute_schema turned into set lookups.
+  """
+  __slots__ = ('category_id', 'version', 'required', 'allowed')
+
+  def __init__(self, category_id, version, keys):
+    self.category_id = category_id
+    self.version = version
+    self.required = tuple(keys or [])
+    self.allowed = frozenset(self.required)
+
+  def errors(self, attributes):
+    if not isinstance(attributes, dict):
+      return ["Attributes must be an object."]
+    errors = [f"Attribute '{key}' is required for this category." for key in self.required if not attributes.get(key)]
+    errors += [f"Attribute '{key}' is not defined for this category." for key in attributes if key not in self.allowed]
+    return errors
+
+
+class SchemaRegistry:
+  """
+  Per-process cache of compiled attribute schemas, one per category: only its
+  current schema version is kept, so edits replace entries instead of piling up.
+
+  A Category save in this process swaps its entry immediately (see signals.py).
+  Other processes pick the new version up once their entry is older than the TTL.
+  """
+
+  def __init__(self, ttl=SCHEMA_REGISTRY_TTL):
+    self.ttl = ttl
+    self._compiled = {}
+    self._checked = {}
+    self._loaded_all = None
+
+  def register(self, category_id, version, keys):
+    schema = self._compiled.get(category_id)
+    if schema is None or schema.version != version:
+      schema = self._compiled[category_id] = CompiledSchema(category_id, version, keys)
+    self._checked[category_id] = time.monotonic()
+    return schema
+
+  def invalidate(self, category_id=None):
+    self._loaded_all = None
+    if category_id is None:
+      self._compiled.clear()
+      self._checked.clear()
+      return
+    self._compiled.pop(category_id, None)
+    self._checked.pop(category_id, None)
+
+  def get(self, category_id):
+    return self.get_many([category_id]).get(category_id)
+
+  def get_many(self, category_ids):
+    """
+    {category_id: CompiledSchema}, loading any missing or stale schemas in one query.
+    """
+    from .models import Category
+
+    now = time.monotonic()
+    stale = {
+      cid for cid in category_ids
+      if cid is not None and (cid not in self._checked or now - self._checked[cid] > self.ttl)
+    }
+    if stale:
+      for row in Category.objects.filter(pk__in=stale).values('id', 'schema_version', 'attribute_schema'):
+        self.register(row['id'], row['schema_version'], row['attribute_schema'])
+
+    return {cid: self._compiled[cid] for cid in category_ids if cid in self._compiled}
+
+  def all(self):
+    """
+    Every category's compiled schema, reloading the full set once per TTL.
+    """
+    from .models import Category
+
+    now = time.monotonic()
+    if self._loaded_all is None or now - self._loaded_all > self.ttl:
+      loaded = set()
+      for row in Category.objects.values('id', 'schema_version', 'attribute_schema'):
+        self.register(row['id'], row['schema_version'], row['attribute_schema'])
+        loaded.add(row['id'])
+      # Deleted categories drop out
+      for cid in set(self._compiled) - loaded:
+        self.invalidate(cid)
+      self._loaded_all = now
+    return list(self._compiled.values())
+
+  def attribute_keys(self):
+    """
+    The attribute keys used by any category, in a stable order.
+    """
+    return sorted({key for schema in self.all() for key in schema.required})
+
+
+schema_registry = SchemaRegistry()
+
+
+def validate_variant_batch(variants):
+  """
+  Validates many variants at once. `variants` is a list of (category_id, attributes).
+  Returns {index: [errors]} for the variants that failed.
+  """
+  schemas = schema_registry.get_many({category_id for category_id, _ in variants})
+  failures = {}
+  for index, (category_id, attributes) in enumerate(variants):
+    schema = schemas.get(category_id)
+    errors = schema.errors(attributes) if schema else []
+    if errors:
+      failures[index] = errors
+  return failures
@@ -1,13 +1,27 @@
-from .generic import PingView, MemoViewSet, BrandViewSet
+from .generic import PingView, MetricsView, MemoViewSet, BrandViewSet
 from .items import ItemViewSet,BulkStockUpdateView
 from .transaction import TransactionListView
+from .sales import SaleEventIngestView, SaleQueueStatsView
+from .reports import SalesReportView
+from .export import ExportView
+from .asynchronous import AsyncPingView, AsyncItemListView, AsyncItemDetailView, AsyncItemSummaryView, AsyncTransactionListView
 
 __all__ = [
   'PingView',
+  'MetricsView',
   'MemoViewSet',
   'BrandViewSet',
   'ItemViewSet',
   'BulkStockUpdateView',
   'TransactionListView',
+  'SaleEventIngestView',
+  'SaleQueueStatsView',
+  'SalesReportView',
+  'ExportView',
+  'AsyncPingView',
+  'AsyncItemListView',
+  'AsyncItemDetailView',
+  'AsyncItemSummaryView',
+  'AsyncTransactionListView',
   
 ]
\ No newline at end of file
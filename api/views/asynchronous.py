@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from ..models import ItemVariant
+from ..pagination import KeysetPagination
+from ..serializers import ListingRows, parse_sparse_fields
+from ..summary import LISTING_KEYS, abuild_summary
+from .items import ItemViewSet
+from .transaction import TransactionListView
+
+# Native async versions of the hot read endpoints, for ASGI servers (uvicorn).
+# Querysets, filters and serializers are shared with the sync DRF views; only
+# the database round trips are awaited, so a request waiting on Postgres doesn't
+# hold a thread. Mounted under /api/async/; the sync endpoints are unchanged.
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+  # Same renderer as the DRF views, so both paths return identical bodies
+  return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _sync_view(view_class, request, action=None, **kwargs):
+  """
+  A configured instance of a sync DRF view, used only to build its queryset and serializers.
+  """
+  view = view_class(request=request, args=(), kwargs=kwargs, format_kwarg=None)
+  view.action = action
+  return view
+
+
+class AsyncView(View):
+  """
+  Wraps the Django request in a DRF Request (for query_params and parsers) and
+  turns DRF exceptions (validation errors, invalid cursors...) into JSON responses.
+  """
+
+  async def dispatch(self, request, *args, **kwargs):
+    try:
+      return await super().dispatch(Request(request), *args, **kwargs)
+    except APIException as e:
+      return _json(e.detail if isinstance(e.detail, (dict, list)) else {'detail': e.detail}, e.status_code)
+
+  def http_method_not_allowed(self, request, *args, **kwargs):
+    response = _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def func():
+      return response
+    return func()
+
+
+async def _paginated(request, queryset, serializer_class, context):
+  paginator = KeysetPagination()
+  page_queryset = paginator.get_page_queryset(queryset, request)
+  rows = paginator.paginate_rows([row async for row in page_queryset])
+  data = serializer_class(rows, many=True, context=context).data
+  return _json({'next': paginator.get_next_link(), 'previous': paginator.get_previous_link(), 'results': data})
+
+
+class AsyncPingView(AsyncView):
+  """
+  Endpoint: GET /api/async/ping
+  """
+
+  async def get(self, request, *args, **kwargs):
+    return _json({"status": "ok", "server": "running"})
+
+
+class AsyncItemListView(AsyncView):
+  """
+  Endpoint: GET /api/async/items/
+  Same filters, ordering, ?as_of= and ?fields= / ?expand= as /api/items/, keyset paginated.
+  """
+  replica_reads = True
+
+  async def get(self, request, *args, **kwargs):
+    view = _sync_view(ItemViewSet, request, action='list')
+    quantity = 'quantity_as_of' if request.query_params.get('as_of') else 'quantity'
+    rows = ListingRows(parse_sparse_fields(request.query_params), quantity=quantity)
+    # Building the filterset may load the attribute schemas, which is sync ORM work
+    queryset = await sync_to_async(lambda: rows.values(view.filter_queryset(view.get_queryset())))()
+
+    paginator = KeysetPagination()
+    page_queryset = paginator.get_page_queryset(queryset, request)
+    page = paginator.paginate_rows([row async for row in page_queryset])
+    # The brand/category lookups are two small sync queries
+    data = await sync_to_async(rows.build)(page)
+    return _json({'next': paginator.get_next_link(), 'previous': paginator.get_previous_link(), 'results': data})
+
+
+class AsyncItemDetailView(AsyncView):
+  """
+  Endpoint: GET /api/async/items/{id}/
+  Accepts ?fields= / ?expand= like /api/items/{id}/.
+  """
+  replica_reads = True
+
+  async def get(self, request, pk, *args, **kwargs):
+    view = _sync_view(ItemViewSet, request, action='retrieve', pk=pk)
+    try:
+      variant = await view.get_queryset().aget(pk=pk)
+    except ItemVariant.DoesNotExist:
+      return _json({'detail': 'No ItemVariant matches the given query.'}, status.HTTP_404_NOT_FOUND)
+    return _json(view.get_serializer(variant).data)
+
+
+class AsyncItemSummaryView(AsyncView):
+  """
+  Endpoint: GET /api/async/items/summary/?path=category_name,brand_name,color&leaves=true
+  Always returns the aggregated tree (the ?mode=aggregate form of /api/items/summary/).
+  """
+  replica_reads = True
+
+  async def get(self, request, *args, **kwargs):
+    params = request.query_params
+    view = _sync_view(ItemViewSet, request, action='summary')
+    queryset = await sync_to_async(lambda: view.filter_queryset(view.get_queryset()))()
+
+    keys = [key for key in params.get('path', 'category_name,brand_name,color').split(',') if key]
+    leaves = params.get('leaves', '').lower() in ('1', 'true', 'yes')
+    quantity = 'quantity_as_of' if params.get('as_of') else 'quantity'
+    return _json(await abuild_summary(queryset, keys, leaves=leaves, quantity=quantity, related_keys=LISTING_KEYS))
+
+
+class AsyncTransactionListView(AsyncView):
+  """
+  Endpoint: GET /api/async/transactions/
+  Same filters, ordering and ?view=compact as /api/transactions/, keyset paginated.
+  """
+  replica_reads = True
+
+  async def get(self, request, *args, **kwargs):
+    view = _sync_view(TransactionListView, request)
+    queryset = view.filter_queryset(view.get_queryset())
+    return await _paginated(request, queryset, view.get_serializer_class(), view.get_serializer_context())
@@ -0,0 +1,36 @@
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.views import APIView
+from ..export import export_stream
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+  """
+  The file type comes from the URL, so a client asking for text/csv shouldn't get a 406.
+  Errors are still rendered with the first renderer (JSON).
+  """
+  def select_parser(self, request, parsers):
+    return parsers[0]
+
+  def select_renderer(self, request, renderers, format_suffix=None):
+    return (renderers[0], renderers[0].media_type)
+
+
+class ExportView(APIView):
+  """
+  Endpoint: GET /api/export/transactions.csv|ndjson?start=&end=&type=
+            GET /api/export/inventory.csv|ndjson?as_of=
+  Streams every matching row; nothing is paginated or held in memory.
+  """
+  content_negotiation_class = IgnoreClientContentNegotiation
+  replica_reads = True
+
+  def get(self, request, dataset, file_format, *args, **kwargs):
+    # Parameters are checked here, before the first byte is sent
+    content_type, chunks = export_stream(dataset, file_format, request.query_params)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{file_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
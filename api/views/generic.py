@@ -1,9 +1,14 @@
+from django.http import HttpResponse
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from ..models import Memo, Brand
 from ..serializers import MemoSerializer, BrandSerializer
+from ..metrics import registry
+from ..cache import CatalogCacheMixin
+from ..listings import AtomicWritesMixin
+from .export import IgnoreClientContentNegotiation
 
 
 class PingView(APIView):
@@ -19,9 +24,20 @@ class PingView(APIView):
     )
 
 
-class BrandViewSet(viewsets.ModelViewSet):
+class MetricsView(APIView):
   """
-  Viewset for viewing and editing Memos
+  Per-route request metrics in the Prometheus text format.
+  """
+  content_negotiation_class = IgnoreClientContentNegotiation
+
+  def get(self, request, *args, **kwargs):
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class BrandViewSet(CatalogCacheMixin, AtomicWritesMixin, viewsets.ModelViewSet):
+  """
+  Viewset for viewing and editing Brands.
+  List and retrieve responses are cached per catalog version.
   """
   serializer_class = BrandSerializer
   queryset = Brand.objects.all().order_by('name')
@@ -1,36 +1,180 @@
-from django.db import transaction
+import io
 from collections import defaultdict
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from ..models import Item, ItemVariant, Transaction, TransactionItem
-from ..serializers import ItemSerializer, ItemVariantSerializer, BulkStockUpdateSerializer
-from ..filters import ItemVariantFilter
-from ..pagination import CustomPageNumberPagination
+from ..models import ItemVariant, VariantListing
+from ..serializers import ItemSerializer, ItemVariantSerializer, ListingRows, BulkStockUpdateSerializer, StockMovementSerializer, parse_sparse_fields
+from ..filters import AliasOrderingFilter, ItemVariantFilter, VariantListingFilter
+from ..listings import AtomicWritesMixin
+from ..pagination import KeysetOrPageNumberPagination, KeysetPagination
+from ..summary import LISTING_KEYS, build_summary
+from ..dates import parse_moment
+from ..snapshots import annotate_quantity_as_of
+from ..stock import InsufficientStockError, apply_stock_changes
+from ..idempotency import idempotent
+from ..cache import CatalogCacheMixin
+from ..importer import READERS, import_catalog
+from ..reorder import DEFAULT_COVER_DAYS, DEFAULT_WINDOW_DAYS, below_target, reorder_rows
+from ..search import DEFAULT_LIMIT, MAX_LIMIT, search_variants
+from ..history import HistoryPagination
 
-class ItemViewSet(viewsets.ModelViewSet):
+class ItemViewSet(CatalogCacheMixin, AtomicWritesMixin, viewsets.ModelViewSet):
   """
   A single ViewSet for creating, listing, and managing all items,
   including Pens and PenRefills.
+  List and retrieve responses are cached per catalog version (see cache.py).
+  List and summary read the flattened VariantListing table (see listings.py).
   """
 
   serializer_class = ItemVariantSerializer
-  queryset = ItemVariant.objects.select_related('item', 'item__brand', 'item__category').all()
-  pagination_class = CustomPageNumberPagination
+  queryset = ItemVariant.objects.select_related('item', 'item__brand', 'item__category').defer('search_vector')
+  pagination_class = KeysetOrPageNumberPagination
+  # GETs may read from a replica (see routers.py)
+  replica_reads = True
 
   http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
 
   filter_backends = [
-    filters.OrderingFilter,    # For sorting (?ordering=...)
+    AliasOrderingFilter,       # For sorting (?ordering=...)
     DjangoFilterBackend,       # For filtering (?name=..., etc.)
   ]
 
-  filterset_class = ItemVariantFilter
-
   ordering_fields = ['item__name', 'price', 'quantity', 'item__brand__name', 'item__category__name']
   ordering = ['item__name']
+  # The same orderings on the listing table's own columns
+  ordering_aliases = {
+    VariantListing: {'item__name': 'item_name', 'item__brand__name': 'brand_name', 'item__category__name': 'category_name'},
+  }
+
+  # Actions served from VariantListing
+  LISTING_ACTIONS = ('list', 'summary')
+
+  def reads_listing(self):
+    return self.action in self.LISTING_ACTIONS
+
+  @property
+  def filterset_class(self):
+    return VariantListingFilter if self.reads_listing() else ItemVariantFilter
+
+  def get_queryset(self):
+    queryset = VariantListing.objects.all() if self.reads_listing() else super().get_queryset()
+
+    # Historical stock: ?as_of=2026-03-01 (date or datetime)
+    as_of = self.request.query_params.get('as_of')
+    if as_of and self.action in ('list', 'summary'):
+      queryset = annotate_quantity_as_of(queryset, parse_moment(as_of, 'as_of', end_of_day=True))
+    return queryset
+
+  def get_serializer(self, *args, **kwargs):
+    # ?fields= / ?expand= trim what reads return
+    if self.request.method == 'GET':
+      kwargs.setdefault('output_fields', parse_sparse_fields(self.request.query_params))
+    return super().get_serializer(*args, **kwargs)
+
+  def list(self, request, *args, **kwargs):
+    return self.cached_response(request, lambda: self.list_rows(request))
+
+  def list_rows(self, request):
+    """
+    The list fast path: rows are built from .values() of the listing table
+    (see ListingRows), with the same output as the serializer and the same
+    filters and paging.
+    """
+    quantity = 'quantity_as_of' if request.query_params.get('as_of') else 'quantity'
+    rows = ListingRows(parse_sparse_fields(request.query_params), quantity=quantity)
+
+    queryset = rows.values(self.filter_queryset(self.get_queryset()))
+    page = self.paginate_queryset(queryset)
+    if page is not None:
+      return self.get_paginated_response(rows.build(page))
+    return Response(rows.build(queryset))
+
+  def create(self, request, *args, **kwargs):
+    """
+    POST a single variant, or a list of variants to create them in one request.
+    """
+    if not isinstance(request.data, list):
+      return super().create(request, *args, **kwargs)
+
+    serializer = self.get_serializer(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    self.perform_create(serializer)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+  @action(detail=False, methods=['post'], url_path='import')
+  def import_catalog(self, request):
+    """
+    Endpoint: POST /api/items/import/ (multipart, field `file`)
+    Streams a CSV or JSONL catalog in chunks and reports per-row errors.
+    The format comes from the file extension or ?file_format=csv|jsonl.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+      return Response({"file": "A CSV or JSONL file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    file_format = request.query_params.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+    if file_format not in READERS:
+      return Response({"file_format": f"Use one of: {', '.join(READERS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    report = import_catalog(stream, file_format)
+    return Response(report, status=status.HTTP_200_OK)
+
+  @action(detail=False, methods=['get'])
+  def search(self, request):
+    """
+    Endpoint: GET /api/items/search/?q=pil g2 bl&limit=20
+    Ranked prefix search over item name, SKU, brand name and attribute values,
+    served by the search vector's GIN index. Returns the top `limit` matches.
+    """
+    text = request.query_params.get('q', '').strip()
+    try:
+      limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+      return Response({"limit": "Must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+    variants = list(search_variants(self.get_queryset(), text, limit))
+    data = self.get_serializer(variants, many=True).data
+    for row, variant in zip(data, variants):
+      row['rank'] = round(variant.rank, 4)
+    return Response({"query": text, "results": data})
+
+  @action(detail=False, methods=['get'])
+  def reorder(self, request):
+    """
+    Endpoint: GET /api/items/reorder/?window_days=30&cover_days=14
+    Variants below their target quantity, largest shortfall first (keyset paginated).
+    `suggested_order` brings a variant back to target plus `cover_days` of its
+    sales rate over the last `window_days`. Accepts the list filters.
+    """
+    try:
+      window_days = int(request.query_params.get('window_days', DEFAULT_WINDOW_DAYS))
+      cover_days = int(request.query_params.get('cover_days', DEFAULT_COVER_DAYS))
+    except ValueError:
+      return Response({"detail": "window_days and cover_days must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+    if window_days < 1 or cover_days < 0:
+      return Response({"detail": "window_days must be at least 1 and cover_days at least 0."}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = below_target(self.filter_queryset(self.get_queryset())).order_by('-shortfall')
+    paginator = KeysetPagination()
+    variants = paginator.paginate_queryset(queryset, request, view=self)
+    return paginator.get_paginated_response(reorder_rows(variants, window_days, cover_days))
+
+  @action(detail=True, methods=['get'])
+  def history(self, request, pk=None):
+    """
+    Endpoint: GET /api/items/{id}/history/?page_size=50
+    The variant's stock movements, newest first, each with its transaction type,
+    timestamp and `balance`, the quantity right after it. Keyset paginated
+    (follow `next`); balances come from a window sum over each page.
+    """
+    variant = self.get_object()
+    paginator = HistoryPagination()
+    movements = paginator.paginate_history(variant.pk, request, view=self)
+    return paginator.get_paginated_response(StockMovementSerializer(movements, many=True).data)
 
   def get_serializer_context(self):
     context = super().get_serializer_context()
@@ -41,15 +185,29 @@ class ItemViewSet(viewsets.ModelViewSet):
   def summary(self, request):
     """
     Endpoint: GET /api/items/summary/?path=category_name,brand_name,color
+    Accepts ?as_of= like the list endpoint.
+
+    With ?mode=aggregate the grouping is done in the database and every node
+    carries count, total_quantity and stock_value. Add ?leaves=true to also
+    list the variants under each leaf group.
     """
     # 1. Get the grouping path from the URL, default to [category, brand, color]
     path_string = request.query_params.get('path', 'category_name,brand_name,color')
     group_keys = path_string.split(',')
 
-    # 2. Fetch and serialize data
     queryset = self.filter_queryset(self.get_queryset())
-    serializer = self.get_serializer(queryset, many=True)
-    flat_data = serializer.data
+
+    if request.query_params.get('mode') == 'aggregate':
+      group_keys = [key for key in group_keys if key]
+      leaves = request.query_params.get('leaves', '').lower() in ('1', 'true', 'yes')
+      quantity = 'quantity_as_of' if request.query_params.get('as_of') else 'quantity'
+      return Response(build_summary(queryset, group_keys, leaves=leaves, quantity=quantity, related_keys=LISTING_KEYS))
+
+    # 2. Fetch the rows (same shape as the serializer's output). The tree reads
+    # item_details and attributes, so ?fields= doesn't apply here
+    quantity = 'quantity_as_of' if request.query_params.get('as_of') else 'quantity'
+    rows = ListingRows(None, quantity=quantity)
+    flat_data = rows.build(rows.values(queryset))
 
     # 3. Dynamic Nesting Logic
     # We use a recursive function to build the tree based on the provided keys
@@ -92,9 +250,17 @@ class BulkStockUpdateView(APIView):
   """
   An endpoint to perform bulk stock updates (add or remove).
   This creates ONE Transaction (batch) and MANY TransactionItems (lines).
+  The quantities are changed with one set-based UPDATE; if any line would go
+  below zero, nothing is applied and every failing line is reported.
+
+  Send an `Idempotency-Key` header to make retries safe: repeats of a
+  successful request get the stored response without touching stock again.
   """
   
   def post(self, request, *args, **kwargs):
+    return idempotent(request, lambda: self.update_stock(request))
+
+  def update_stock(self, request):
     # 1. Validate the whole batch
     serializer = BulkStockUpdateSerializer(data=request.data)
     if not serializer.is_valid():
@@ -104,59 +270,19 @@ class BulkStockUpdateView(APIView):
     line_items_data = batch_data.pop('line_items')
     
     try:
-      # 2. Use one database transaction for the whole operation
-      with transaction.atomic():
-        
-        # --- A. UPDATE ITEM QUANTITIES ---
-        
-        # Lock all items in the request to prevent race conditions
-        item_ids = [line['item'].id for line in line_items_data]
-        items_to_update = Item.objects.select_for_update().filter(id__in=item_ids)
-        item_map = {item.id: item for item in items_to_update}
-
-        # Update quantities in memory first
-        for line_data in line_items_data:
-          item = item_map.get(line_data['item'].id)
-          quantity = line_data['quantity_change']
-
-          if quantity > 0:
-            item.add_stock(quantity)
-          elif quantity < 0:
-            item.remove_stock(abs(quantity))
-        
-        # Now save all changed items
-        # We use bulk_update for high efficiency
-        Item.objects.bulk_update(items_to_update, ['quantity'])
-
-        # --- B. CREATE AUDIT TRAIL ---
-        
-        # 1. Create the parent Transaction (batch)
-        new_transaction = Transaction.objects.create(**batch_data)
-
-        # 2. Create the TransactionItem (line item) objects
-        line_items_to_create = []
-        for line_data in line_items_data:
-          line_items_to_create.append(
-            TransactionItem(
-              transaction=new_transaction,
-              item=line_data['item'],
-              quantity_change=line_data['quantity_change'],
-              unit_price_at_sale=line_data.get('unit_price_at_sale')
-            )
-          )
-        
-        # Save all line items in one efficient query
-        TransactionItem.objects.bulk_create(line_items_to_create)
-      
+      # 2. Lock, check, update and record the batch in one database transaction
+      new_transaction, _ = apply_stock_changes(batch_data['type'], line_items_data)
+
       # 3. If all goes well, return success
       return Response({
         "status": "success",
-        "message": f"Transaction batch created with {len(line_items_to_create)} lines."
+        "message": f"Transaction batch created with {len(line_items_data)} lines.",
+        "transaction": new_transaction.id,
       }, status=status.HTTP_201_CREATED)
 
-    except ValueError as e:
-      # Catch the "Not enough stock" error
-      return Response({"status": "error", "detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except InsufficientStockError as e:
+      # Report every line that couldn't be applied
+      return Response({"status": "error", "detail": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
     
     except Exception as e:
       # Catch any other unexpected errors
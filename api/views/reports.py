@@ -0,0 +1,46 @@
+from datetime import date
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from ..models import Transaction
+from ..rollups import BY, GROUPS, sales_report
+
+
+class SalesReportView(APIView):
+  """
+  Endpoint: GET /api/reports/sales/?group=day|week|month&by=total|variant|brand|category
+  Optional: ?type=sale|restock|adjustment (default sale), ?start=YYYY-MM-DD, ?end=YYYY-MM-DD
+  Reads only the daily rollups, never the raw transaction lines.
+  """
+  replica_reads = True
+
+  def get(self, request, *args, **kwargs):
+    params = request.query_params
+    group = params.get('group', 'day')
+    by = params.get('by', 'total')
+    type = params.get('type', 'sale')
+
+    # 1. Validate the parameters
+    errors = {}
+    if group not in GROUPS:
+      errors['group'] = f"Use one of: {', '.join(GROUPS)}."
+    if by not in BY:
+      errors['by'] = f"Use one of: {', '.join(BY)}."
+    if type not in dict(Transaction.TYPE_CHOICES):
+      errors['type'] = f"Use one of: {', '.join(dict(Transaction.TYPE_CHOICES))}."
+    dates = {}
+    for key in ('start', 'end'):
+      try:
+        dates[key] = date.fromisoformat(params[key]) if params.get(key) else None
+      except ValueError:
+        errors[key] = "Must be a date like 2026-01-31."
+    if errors:
+      return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. Aggregate the rollups
+    return Response({
+      'group': group,
+      'by': by,
+      'type': type,
+      'results': sales_report(group, by, type, dates['start'], dates['end']),
+    })
@@ -0,0 +1,59 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from ..models import ItemVariant, SaleEvent
+from ..serializers import SaleEventSerializer
+from ..sales import queue_stats
+
+
+class SaleEventIngestView(APIView):
+  """
+  Accepts POS sale events and acknowledges them once they are queued.
+  Stock is updated later, in batches, by the `flush_sales` command.
+
+  Body: {"events": [{"item": 12, "quantity": 1, "unit_price_at_sale": "2.29"}, ...]}
+  (a single event object is accepted too)
+  """
+
+  def post(self, request, *args, **kwargs):
+    events = request.data.get('events', [request.data]) if isinstance(request.data, dict) else request.data
+
+    # 1. Validate the events
+    serializer = SaleEventSerializer(data=events, many=True)
+    if not serializer.is_valid():
+      return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if not serializer.validated_data:
+      return Response({"events": "At least one event is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. Check all the variants exist in one query
+    variant_ids = {event['item'] for event in serializer.validated_data}
+    known = set(ItemVariant.objects.filter(pk__in=variant_ids).values_list('pk', flat=True))
+    if variant_ids - known:
+      return Response(
+        {"status": "error", "detail": "Unknown item variants.", "items": sorted(variant_ids - known)},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    # 3. Queue them; once this commits the events are durable
+    SaleEvent.objects.bulk_create([
+      SaleEvent(
+        item_id=event['item'],
+        quantity=event['quantity'],
+        unit_price_at_sale=event.get('unit_price_at_sale'),
+      )
+      for event in serializer.validated_data
+    ])
+
+    return Response({
+      "status": "queued",
+      "queued": len(serializer.validated_data),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+class SaleQueueStatsView(APIView):
+  """
+  Queue depth and recent flush latency of the sales queue.
+  """
+
+  def get(self, request, *args, **kwargs):
+    return Response(queue_stats())
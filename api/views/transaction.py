@@ -1,15 +1,21 @@
+from django.db.models import Prefetch
 from rest_framework import filters
 from rest_framework.generics import ListAPIView
 from django_filters.rest_framework import DjangoFilterBackend
-from ..models import Transaction
-from ..serializers import TransactionSerializer
-from ..pagination import CustomPageNumberPagination
+from ..models import Transaction, TransactionItem
+from ..serializers import TransactionSerializer, CompactTransactionSerializer
+from ..pagination import KeysetOrPageNumberPagination
 from ..filters import TransactionFilter
 
 class TransactionListView(ListAPIView):
-  queryset = Transaction.objects.all()
+  """
+  Lists Transactions with their line items.
+  Lines are prefetched together with their variant, item, brand and category,
+  so a page costs a fixed number of queries. Use ?view=compact for flat lines.
+  """
   serializer_class = TransactionSerializer
-  pagination_class = CustomPageNumberPagination
+  pagination_class = KeysetOrPageNumberPagination
+  replica_reads = True
 
   filter_backends = [
     filters.OrderingFilter,    # For sorting (?ordering=...)
@@ -19,4 +25,24 @@ class TransactionListView(ListAPIView):
   filterset_class = TransactionFilter
 
   ordering_fields = ['datetime_created']
-  ordering = ['datetime_created']
\ No newline at end of file
+  ordering = ['datetime_created']
+
+  def is_compact(self):
+    return self.request.query_params.get('view') == 'compact'
+
+  def get_queryset(self):
+    if self.is_compact():
+      lines = TransactionItem.objects.select_related('item__item').only(
+        'transaction_id', 'quantity_change', 'unit_price_at_sale', 'item__sku', 'item__item__name'
+      )
+    else:
+      lines = TransactionItem.objects.select_related('item__item__brand', 'item__item__category')
+
+    return Transaction.objects.prefetch_related(
+      Prefetch('line_items', queryset=lines.order_by('id'))
+    )
+
+  def get_serializer_class(self):
+    if self.is_compact():
+      return CompactTransactionSerializer
+    return TransactionSerializer
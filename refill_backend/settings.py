@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'refill_backend.urls'
@@ -80,20 +82,56 @@ WSGI_APPLICATION = 'refill_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-tmpPostgres = urlparse(os.getenv("DATABASE_URL"))
-
-DATABASES = {
-    'default': {
+def database_from_url(url):
+    tmpPostgres = urlparse(url)
+    return {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': tmpPostgres.path.replace('/', ''),
         'USER': tmpPostgres.username,
         'PASSWORD': tmpPostgres.password,
         'HOST': tmpPostgres.hostname,
-        'PORT': 5432,
+        'PORT': tmpPostgres.port or 5432,
         'OPTIONS': dict(parse_qsl(tmpPostgres.query)),
     }
+
+DATABASES = {
+    'default': database_from_url(os.getenv("DATABASE_URL")),
 }
 
+# Read replicas: DATABASE_REPLICA_URLS=postgres://...,postgres://...
+# Views marked `replica_reads = True` read from them (see api/routers.py and
+# api/middleware.py). Tests run against the primary only.
+for index, url in enumerate(u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()):
+    DATABASES[f'replica_{index}'] = {
+        **database_from_url(url),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Seconds a client reads from the primary after a write, and the most replica lag tolerated
+# (a replica within REPLICA_MAX_LAG_BYTES of the primary's WAL position counts as current)
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_MAX_LAG_BYTES = int(os.getenv("REPLICA_MAX_LAG_BYTES", 1024 * 1024))
+
+
+# Cache
+# Local memory by default. Set CACHE_URL (e.g. redis://localhost:6379/0) to share
+# the catalog response cache between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.getenv("CACHE_URL"):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv("CACHE_URL"),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators